@@ -13,6 +13,8 @@ from datetime import datetime # Import datetime
 
 from config import Config # Import your Config class
 from .scoring_utils import load_whisper_model # 导入模型加载函数
+from .db_engine import engine_options, configure_engine # 连接池与 SQLite PRAGMA
+from .query_stats import init_request_query_stats # 每个请求的 SQL 查询数/耗时
 
 # --- Instantiate extensions ---
 # Define extension instances at the module level so they can be imported elsewhere if needed
@@ -56,9 +58,13 @@ def load_user(id):
         return None
 
 # --- Application Factory Function ---
-def create_app(config_class=Config):
-    """Creates and configures the Flask application instance using the factory pattern."""
-    app = Flask(__name__, instance_relative_config=True) # Enable instance folder config
+def create_app(config_class=Config, instance_path=None):
+    """Creates and configures the Flask application instance using the factory pattern.
+
+    instance_path overrides the default <project>/instance folder (benchmarks and checks
+    pass a temporary directory so they leave no files in the working tree).
+    """
+    app = Flask(__name__, instance_path=instance_path, instance_relative_config=True) # Enable instance folder config
 
     # Load configuration from the specified config object
     app.config.from_object(config_class)
@@ -92,7 +98,12 @@ def create_app(config_class=Config):
             f"Could not create user recordings base folder '{app.config.get('USER_RECORDINGS_BASE_FOLDER')}': {e}")
 
     # --- Initialize Flask extensions with the 'app' instance ---
+    # 引擎参数 (连接池大小、SQLite 忙等待) 由 Config 生成，须在 db.init_app 创建引擎之前设置
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
     db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine, app.config, app.logger) # SQLite: 每个新连接执行 WAL/busy_timeout 等 PRAGMA
+        init_request_query_stats(app, db.engine) # 查询计数：调试模式下写入响应头，超过阈值时记录警告
     migrate.init_app(app, db) # Migrate needs both app and db
     login.init_app(app)       # Initialize Flask-Login
     csrf.init_app(app)        # Initialize CSRF protection
@@ -132,9 +143,13 @@ def create_app(config_class=Config):
     except Exception as log_setup_error:
          app.logger.error(f"Failed to configure logging: {log_setup_error}", exc_info=True)
 
-    with app.app_context():
-        load_whisper_model(app.config.get('WHISPER_MODEL_SIZE', 'small'))  # 从配置加载模型大小，默认为 base.en
-    app.logger.info("Flask app instance created, configured, and model loaded.")
+    if app.config.get('WHISPER_PRELOAD', False):
+        with app.app_context():
+            load_whisper_model(app.config.get('WHISPER_MODEL_SIZE', 'small'))  # 从配置加载模型大小，默认为 base.en
+        app.logger.info("Flask app instance created, configured, and model loaded.")
+    else:
+        # 不预加载：CLI 命令和只提供测验的 worker 无需加载 torch/whisper，首次评分时再加载
+        app.logger.info("Flask app instance created and configured (Whisper loads lazily on first transcription).")
     # ------------------------
 
     # --- Context Processors (Inject variables into all templates) ---
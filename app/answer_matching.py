@@ -0,0 +1,111 @@
+# app/answer_matching.py
+# 测验答案判定：为每个词条预先构建 "可接受答案集合" (AnswerKey)，提交时只做集合查找。
+#
+# 释义 (chinese_translation) 常见写法如 "n. 书；v. 预订"、"意外的，出乎意料的"、"（在）…期间"、"colour/color"：
+#   - 去掉括号内的注释 (保留去掉括号后的整体作为一种写法) 和词性标记 (n. / vt. / adj. ...)；
+#   - 按 ；;，,、/ 拆分出各个义项，每个义项都是可接受答案；
+#   - 统一全角/半角 (NFKC)、大小写、各种连字符与空白。
+# 英文答案 (english_word，如 "look after sb/sth"、"U.N."、"get on (with sb)") 中的 / , . 和括号都是词条本身的一部分，
+# 不拆义项、不去词性标记，只按 ；; 拆分，括号只去掉括号字符 ("get on with sb")，避免 "sth"、"u" 这类片段被判为正确。
+# 英文答案可选地接受编辑距离为 1 的拼写 (漏一个字母、多一个字母或错一个字母)：
+# 构建时预先生成每个答案 "删去一个字符" 的变体，判定时仍然只是集合查找，复杂度 O(答案长度)。
+import re
+import unicodedata
+
+# 词性标记 (PDF 解析结果与常见词典写法)
+_POS_MARKERS = ('n', 'v', 'vt', 'vi', 'adj', 'adv', 'prep', 'conj', 'pron', 'num', 'art', 'int', 'interj',
+                'aux', 'modal', 'pl', 'abbr')
+_POS_RE = re.compile(r'(?<![A-Za-z])(?:' + '|'.join(sorted(_POS_MARKERS, key=len, reverse=True)) + r')\.', re.IGNORECASE)
+_BRACKET_RE = re.compile(r'[(\[{<（【〔《「][^)\]}>）】〕》」]*[)\]}>）】〕》」]')
+_BRACKET_CHARS_RE = re.compile(r'[()\[\]{}<>（）【】〔〕《》「」]')
+_SENSE_SEPARATORS_RE = re.compile(r'[;；,，、/|]')
+_ENGLISH_SEPARATORS_RE = re.compile(r'[;；]')
+_HYPHENS_RE = re.compile(r'[-‐‑‒–—―_]+')
+_STRIP_CHARS = ' .。!！?？:：;,、\'"‘’“”`~…·'
+
+MIN_FUZZY_LENGTH = 4 # 短于此长度的英文答案不做模糊匹配 (如 "on" / "in" 只差一个字母)
+
+
+def normalize(text):
+    """统一全角/半角、大小写、连字符与空白，去掉首尾标点。用于答案与用户输入。"""
+    if not isinstance(text, str):
+        return ''
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = _HYPHENS_RE.sub(' ', text)
+    text = ' '.join(text.split())
+    return text.strip(_STRIP_CHARS)
+
+
+def split_senses(text, answer_language='cn'):
+    """把一条释义 (answer_language='cn') 或英文词条 ('en') 拆成可接受的答案写法集合 (已 normalize)。"""
+    if not isinstance(text, str) or not text.strip():
+        return set()
+    text = unicodedata.normalize('NFKC', text)
+    if answer_language == 'cn':
+        without_pos = _POS_RE.sub(' ', text)
+        # 去掉括号注释的写法，以及只去掉括号字符的写法 (如 "（在）…期间" 同时接受 "期间" 与 "在期间")
+        variants = (_BRACKET_RE.sub(' ', without_pos), _BRACKET_CHARS_RE.sub('', without_pos))
+        separators = _SENSE_SEPARATORS_RE
+    else:
+        variants = (_BRACKET_CHARS_RE.sub('', text),)
+        separators = _ENGLISH_SEPARATORS_RE
+    answers = set()
+    for variant in variants:
+        for sense in separators.split(variant):
+            sense = normalize(sense.replace('…', ' '))
+            if sense:
+                answers.add(sense)
+    whole = normalize(text)
+    if whole:
+        answers.add(whole) # 原样整体输入也算对
+    return answers
+
+
+class AnswerKey:
+    """一个题目的可接受答案。exact 为精确集合；fuzzy 时附带删除变体，用于编辑距离 1 的集合查找。"""
+    __slots__ = ('exact', 'deletions', 'substitutions')
+
+    def __init__(self, answers, fuzzy=False):
+        self.exact = frozenset(answers)
+        self.deletions = frozenset()
+        self.substitutions = frozenset()
+        if fuzzy:
+            deletions, substitutions = set(), set()
+            for answer in self.exact:
+                if len(answer) < MIN_FUZZY_LENGTH:
+                    continue
+                for i in range(len(answer)):
+                    shorter = answer[:i] + answer[i + 1:]
+                    deletions.add(shorter)
+                    substitutions.add((i, shorter))
+            self.deletions = frozenset(deletions)
+            self.substitutions = frozenset(substitutions)
+
+    def match(self, user_answer):
+        """返回 'exact' / 'fuzzy' / None。"""
+        answer = normalize(user_answer)
+        if not answer:
+            return None
+        if answer in self.exact:
+            return 'exact'
+        if not self.deletions or len(answer) < MIN_FUZZY_LENGTH - 1:
+            return None
+        if answer in self.deletions: # 漏了一个字母
+            return 'fuzzy'
+        for i in range(len(answer)):
+            shorter = answer[:i] + answer[i + 1:]
+            if shorter in self.exact and len(answer) > MIN_FUZZY_LENGTH: # 多了一个字母
+                return 'fuzzy'
+            if (i, shorter) in self.substitutions: # 同一位置错了一个字母
+                return 'fuzzy'
+        return None
+
+
+def build_answer_key(correct_answer, answer_language, fuzzy_english=False):
+    """为一个题目构建 AnswerKey。answer_language: 'en' (cn_to_en，答英文) 或 'cn' (en_to_cn，答中文)。"""
+    return AnswerKey(split_senses(correct_answer, answer_language), fuzzy=fuzzy_english and answer_language == 'en')
+
+
+def answer_language(quiz_type):
+    """测验类型对应的作答语言。"""
+    return 'en' if quiz_type == 'cn_to_en' else 'cn'
@@ -0,0 +1,206 @@
+# app/audio_transcode.py
+# 压缩音频变体：在 wav 旁写入 Opus (Ogg 封装, .opus) 与 MP3 版本，移动网络下的流量约为 wav 的十分之一。
+# 转码调用 ffmpeg (Whisper 本就依赖它)，在后台线程池中执行，请求从不等待转码；
+# 变体比源 wav 旧 (课文重新合成、录音重新上传) 时视为不存在，不会被提供。
+import os
+import shutil
+import threading
+import subprocess
+from functools import lru_cache
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from .media_index import get_media_index
+
+# mimetype: 响应的 Content-Type；accept_types: Accept 头中表示支持该格式的类型；ffmpeg_format/codec_args: 编码参数
+AudioVariant = namedtuple('AudioVariant', ['mimetype', 'accept_types', 'ffmpeg_format', 'codec_args'])
+
+AUDIO_VARIANTS = {
+    '.opus': AudioVariant('audio/ogg; codecs=opus', ('audio/ogg', 'audio/opus'), 'ogg',
+                          ['-c:a', 'libopus', '-b:a', '32k', '-application', 'voip']),
+    '.mp3': AudioVariant('audio/mpeg', ('audio/mpeg', 'audio/mp3'), 'mp3',
+                         ['-c:a', 'libmp3lame', '-b:a', '64k']),
+}
+
+# 原始文件 (wav 及浏览器上传的录音) 的 Content-Type
+SOURCE_MIMETYPES = {
+    '.wav': 'audio/wav',
+    '.webm': 'audio/webm',
+    '.ogg': 'audio/ogg',
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.aac': 'audio/aac',
+}
+
+# --- 后台转码线程池 (懒加载) ---
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = set() # 正在排队/转码的源文件，避免重复提交
+
+
+def variant_extensions():
+    """配置中启用的压缩格式 (按优先级排序)，忽略未知扩展名。"""
+    return [ext for ext in current_app.config.get('AUDIO_VARIANT_EXTENSIONS', []) if ext in AUDIO_VARIANTS]
+
+
+def variant_path(source_path, ext):
+    base, _ = os.path.splitext(source_path)
+    return f"{base}{ext}"
+
+
+def mimetype_for(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in AUDIO_VARIANTS:
+        return AUDIO_VARIANTS[ext].mimetype
+    return SOURCE_MIMETYPES.get(ext, 'application/octet-stream')
+
+
+def fresh_variants(source_path):
+    """返回 {ext: path}，只包含已存在且不早于源文件的变体。"""
+    try:
+        source_mtime = os.stat(source_path).st_mtime
+    except OSError:
+        return {}
+    fresh = {}
+    for ext in variant_extensions():
+        path = variant_path(source_path, ext)
+        try:
+            if os.stat(path).st_mtime >= source_mtime:
+                fresh[ext] = path
+        except OSError:
+            continue
+    return fresh
+
+
+def _explicitly_accepts(accept_mimetypes, accept_types):
+    """Accept 头是否显式 (非通配) 列出了其中某个类型。"""
+    for value, quality in accept_mimetypes:
+        if quality > 0 and value.split(';')[0].strip().lower() in accept_types:
+            return True
+    return False
+
+
+def choose_variant(source_path, accept_mimetypes, fresh=None):
+    """
+    根据 Accept 头选择要发送的文件，返回 (path, mimetype)。
+    fresh 为已知的 {ext: path} 可用变体 (例如来自媒体索引)；省略时检查文件系统。
+
+    客户端显式声明支持的压缩格式优先 (按 AUDIO_VARIANT_EXTENSIONS 顺序)；
+    只有 */* 之类通配时选 MP3 (所有主流浏览器都能播放)；没有可用变体时返回源文件。
+    """
+    if fresh is None:
+        fresh = fresh_variants(source_path)
+    for ext in variant_extensions():
+        if ext in fresh and _explicitly_accepts(accept_mimetypes, AUDIO_VARIANTS[ext].accept_types):
+            return fresh[ext], AUDIO_VARIANTS[ext].mimetype
+    if '.mp3' in fresh and (not accept_mimetypes or accept_mimetypes['audio/mpeg'] > 0): # 无 Accept 头视为都接受
+        return fresh['.mp3'], AUDIO_VARIANTS['.mp3'].mimetype
+    return source_path, mimetype_for(source_path)
+
+
+# === 转码 ===
+
+@lru_cache(maxsize=8)
+def _which(binary):
+    return shutil.which(binary)
+
+
+def _ffmpeg_binary():
+    return _which(current_app.config.get('FFMPEG_BINARY', 'ffmpeg'))
+
+
+def transcoding_available():
+    return bool(current_app.config.get('AUDIO_TRANSCODE_ENABLED', True) and variant_extensions() and _ffmpeg_binary())
+
+
+def transcode_file(source_path, force=False):
+    """同步为 source_path 生成所有缺失或过期的变体，返回新生成的路径列表。"""
+    log = current_app.logger
+    ffmpeg = _ffmpeg_binary()
+    if not ffmpeg:
+        log.warning(f"ffmpeg not found, cannot transcode {source_path}.")
+        return []
+    fresh = {} if force else fresh_variants(source_path)
+    produced = []
+    for ext in variant_extensions():
+        if ext in fresh:
+            continue
+        variant = AUDIO_VARIANTS[ext]
+        target = variant_path(source_path, ext)
+        tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        command = [ffmpeg, '-nostdin', '-y', '-loglevel', 'error', '-i', source_path,
+                   '-vn', '-ac', '1', *variant.codec_args, '-f', variant.ffmpeg_format, tmp_path]
+        try:
+            proc = subprocess.run(command, capture_output=True, text=True,
+                                  timeout=current_app.config.get('AUDIO_TRANSCODE_TIMEOUT', 300))
+            if proc.returncode != 0 or not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+                log.error(f"Transcoding {source_path} to {ext} failed (exit {proc.returncode}): {proc.stderr.strip()[-500:]}")
+                continue
+            os.replace(tmp_path, target) # 原子替换，读者不会看到半个文件
+            get_media_index().record(target)
+            produced.append(target)
+        except (OSError, subprocess.SubprocessError) as e:
+            log.error(f"Transcoding {source_path} to {ext} failed: {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                try: os.remove(tmp_path)
+                except OSError: pass
+    if produced:
+        log.info(f"Transcoded {source_path} -> {', '.join(os.path.basename(p) for p in produced)}")
+    return produced
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = max(1, current_app.config.get('AUDIO_TRANSCODE_WORKERS', 1))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audio-transcode')
+            current_app.logger.info(f"Audio transcode executor started with {workers} worker thread(s).")
+        return _executor
+
+
+def _run_transcode(app, source_path, force):
+    try:
+        with app.app_context():
+            transcode_file(source_path, force=force)
+    except Exception as e:
+        app.logger.error(f"Background transcode of {source_path} failed: {e}", exc_info=True)
+    finally:
+        with _executor_lock:
+            _in_flight.discard(source_path)
+
+
+def schedule_transcode(source_path, force=False):
+    """
+    若 source_path 缺少最新的压缩变体，则提交到后台线程池转码，立即返回。
+    返回是否提交了任务 (转码未启用、无 ffmpeg、变体已是最新或已在排队时返回 False)。
+    """
+    if not transcoding_available():
+        return False
+    if not force and len(fresh_variants(source_path)) == len(variant_extensions()):
+        return False
+    with _executor_lock:
+        if source_path in _in_flight:
+            return False
+        _in_flight.add(source_path)
+    app = current_app._get_current_object()
+    try:
+        _get_executor().submit(_run_transcode, app, source_path, force)
+    except RuntimeError as e: # 解释器退出时线程池已关闭
+        with _executor_lock:
+            _in_flight.discard(source_path)
+        current_app.logger.warning(f"Could not schedule transcode of {source_path}: {e}")
+        return False
+    return True
+
+
+def wait_for_transcodes():
+    """等待所有已提交的转码完成 (CLI 退出前调用)。"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
@@ -0,0 +1,85 @@
+# app/db_engine.py
+# 数据库引擎配置层：根据 Config 生成 SQLALCHEMY_ENGINE_OPTIONS (连接池大小等)，
+# 并为 SQLite 在每个新连接上设置 PRAGMA：
+#   - journal_mode=WAL: 读不再等待写 (读者读快照)，写者之间仍串行；
+#   - busy_timeout: 数据库被锁时等待重试，而不是立即报 "database is locked"；
+#   - synchronous=NORMAL: WAL 模式下只在检查点时 fsync，断电最多丢失最近的事务，不会损坏数据库；
+#   - mmap_size / cache_size: 用内存映射和更大的页缓存减少读系统调用。
+# SQLITE_TUNING=false 时保持 SQLite 默认行为 (DELETE 日志模式)。
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def _is_sqlite(uri):
+    return (uri or '').startswith('sqlite')
+
+
+def _is_memory_sqlite(uri):
+    database = make_url(uri).database
+    return not database or database == ':memory:' or database.startswith('file::memory:')
+
+
+def engine_options(config):
+    """由配置生成 create_engine() 的参数，与 SQLALCHEMY_ENGINE_OPTIONS 中显式给出的参数合并 (后者优先)。"""
+    uri = config.get('SQLALCHEMY_DATABASE_URI', '')
+    options = {}
+    if _is_sqlite(uri):
+        if config.get('SQLITE_TUNING', True):
+            # pysqlite 自身的忙等待 (秒)，与 PRAGMA busy_timeout 保持一致
+            options['connect_args'] = {'timeout': config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000.0}
+        if not _is_memory_sqlite(uri):
+            # 文件数据库使用 QueuePool：每个 worker 进程最多 pool_size + max_overflow 个连接
+            options.update(pool_size=config.get('DB_POOL_SIZE', 5),
+                           max_overflow=config.get('DB_MAX_OVERFLOW', 10),
+                           pool_timeout=config.get('DB_POOL_TIMEOUT', 30))
+    else:
+        options.update(pool_size=config.get('DB_POOL_SIZE', 5),
+                       max_overflow=config.get('DB_MAX_OVERFLOW', 10),
+                       pool_timeout=config.get('DB_POOL_TIMEOUT', 30),
+                       pool_recycle=config.get('DB_POOL_RECYCLE', 1800),
+                       pool_pre_ping=True)
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+
+def sqlite_pragmas(config):
+    """返回 [(pragma, value), ...]，按顺序在每个新连接上执行。"""
+    if not config.get('SQLITE_TUNING', True):
+        return []
+    return [
+        ('journal_mode', config.get('SQLITE_JOURNAL_MODE', 'WAL')),
+        ('busy_timeout', int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('mmap_size', int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+        ('cache_size', -int(config.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))), # 负数表示 KiB
+    ]
+
+
+def configure_engine(engine, config, logger=None):
+    """为 SQLite 引擎注册 connect 事件：每个新的 DBAPI 连接执行一次 PRAGMA。其他数据库不做处理。"""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(config)
+    if not pragmas:
+        return
+    reported = []
+    in_memory = _is_memory_sqlite(engine.url.render_as_string(hide_password=False))
+
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+                if name == 'journal_mode' and not reported:
+                    mode = (cursor.fetchone() or ('?',))[0]
+                    reported.append(mode)
+                    if logger is not None and not in_memory and str(mode).lower() != str(value).lower():
+                        # 如不支持共享内存的网络文件系统无法使用 WAL (内存数据库总是 'memory')
+                        logger.warning(f"SQLite journal_mode={value} requested but database uses '{mode}'.")
+        finally:
+            cursor.close()
+
+    if logger is not None:
+        logger.info("SQLite engine profile: " + ", ".join(f"{name}={value}" for name, value in pragmas)
+                    + f", pool_size={getattr(engine.pool, 'size', lambda: '-')()}")
@@ -0,0 +1,177 @@
+# app/distractor_index.py
+# 选择题 (type=choice) 的干扰项索引：离线为每个词预先算好 top-K 个 "看起来像" 的候选词，
+# /api/quiz 出题时只需从候选中随机取 3 个，每题 O(1)。
+#
+# 候选打分 (越高越像):
+#   - 拼写相似度：字母三元组 (trigram) 的 Jaccard 系数，通过 trigram 倒排表找候选，不与全部词两两比较；
+#   - 长度接近；
+#   - 课程相近 (LESSON_WINDOW 课以内的同词性词也作为候选)；
+#   - 词性相同优先，不足 K 个时才用其他词性补足。
+# 英文或释义与正确答案相同的词不会成为干扰项 (两个方向出题都要能区分)。
+#
+# 构建结果按词汇内容签名保存到 instance/distractor_index.json，多个进程/重启后直接加载；
+# `flask vocab reindex` 会重新构建。
+import os
+import json
+import time
+import heapq
+import random
+import threading
+from collections import defaultdict
+
+from flask import current_app
+
+from .answer_matching import normalize
+from .vocab_index import get_vocab_index
+
+INDEX_FILENAME = 'distractor_index.json'
+TOP_K = 8           # 每个词保存的候选数
+LESSON_WINDOW = 5   # 相邻多少课以内的同词性词作为候选
+MAX_POSTING = 300   # 出现在太多词中的 trigram (如 "ing") 不用于找候选
+
+_distractors = None
+_distractors_lock = threading.Lock()
+
+
+def _pos_key(part_of_speech):
+    return (part_of_speech or '').strip().lower().rstrip('.')
+
+
+def _trigrams(word):
+    padded = f"^{word}$"
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2)) if len(padded) >= 3 else frozenset((padded,))
+
+
+class DistractorIndex:
+    """{vocab_id: (候选 vocab_id, ...)}，按相似度从高到低排列。"""
+
+    def __init__(self, signature, candidates):
+        self.signature = signature
+        self.candidates = candidates
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def pick(self, vocab_index, entry, answer_of, count=3, rng=random):
+        """
+        为 entry 挑选 count 个干扰项的显示文本 (answer_of(VocabEntry) -> 文本)，互不相同且与正确答案不同。
+        候选不足时从同课词汇中随机补足。
+        """
+        correct = normalize(answer_of(entry))
+        seen = {correct}
+        picked = []
+        pool = list(self.candidates.get(entry.id, ()))
+        rng.shuffle(pool)
+        for candidate_id in pool:
+            candidate = vocab_index.get(candidate_id)
+            if candidate is None:
+                continue
+            text = answer_of(candidate)
+            if text and normalize(text) not in seen:
+                seen.add(normalize(text))
+                picked.append(text)
+                if len(picked) == count:
+                    return picked
+        for candidate in vocab_index.sample([entry.lesson_number], count * 3, rng=rng):
+            text = answer_of(candidate)
+            if text and normalize(text) not in seen:
+                seen.add(normalize(text))
+                picked.append(text)
+                if len(picked) == count:
+                    break
+        return picked
+
+
+def build_distractor_index(vocab_index, top_k=TOP_K, lesson_window=LESSON_WINDOW):
+    """由词汇索引构建干扰项索引 (离线/后台使用，几千词约 1 秒)。"""
+    started = time.perf_counter()
+    entries = [lesson.entry(offset) for lesson in vocab_index.lessons.values() for offset in range(len(lesson))]
+    words = {e.id: normalize(e.english_word) for e in entries}
+    translations = {e.id: normalize(e.chinese_translation) for e in entries}
+    grams = {e.id: _trigrams(words[e.id]) for e in entries}
+    by_pos_lesson = defaultdict(list)  # {(词性, 课号): [vocab_id]}
+    by_lesson = defaultdict(list)      # {课号: [vocab_id]}
+    postings = defaultdict(list)       # {trigram: [vocab_id]}
+    for e in entries:
+        by_pos_lesson[(_pos_key(e.part_of_speech), e.lesson_number)].append(e.id)
+        by_lesson[e.lesson_number].append(e.id)
+        for gram in grams[e.id]:
+            postings[gram].append(e.id)
+    info = {e.id: (e.lesson_number, _pos_key(e.part_of_speech)) for e in entries}
+
+    def score(e, other_id):
+        other_lesson, _ = info[other_id]
+        a, b = grams[e.id], grams[other_id]
+        spelling = len(a & b) / len(a | b)
+        la, lb = len(words[e.id]), len(words[other_id])
+        length = 1 - abs(la - lb) / max(la, lb, 1)
+        nearby = 1 / (1 + abs(e.lesson_number - other_lesson))
+        return 0.5 * spelling + 0.25 * length + 0.25 * nearby
+
+    candidates = {}
+    for e in entries:
+        pos = _pos_key(e.part_of_speech)
+        pool = set()
+        for lesson_number in range(e.lesson_number - lesson_window, e.lesson_number + lesson_window + 1):
+            pool.update(by_pos_lesson.get((pos, lesson_number), ()))
+        for gram in grams[e.id]:
+            posting = postings[gram]
+            if len(posting) <= MAX_POSTING:
+                pool.update(other_id for other_id in posting if info[other_id][1] == pos)
+        pool = {other_id for other_id in pool
+                if other_id != e.id and words[other_id] != words[e.id] and translations[other_id] != translations[e.id]}
+        best = heapq.nlargest(top_k, pool, key=lambda other_id: score(e, other_id))
+        if len(best) < top_k:
+            # 同词性候选不足：用相邻课程的其他词性补足 (排在后面)
+            others = {other_id for lesson_number in range(e.lesson_number - lesson_window, e.lesson_number + lesson_window + 1)
+                      for other_id in by_lesson.get(lesson_number, ())
+                      if other_id not in pool and other_id != e.id
+                      and words[other_id] != words[e.id] and translations[other_id] != translations[e.id]}
+            best += heapq.nlargest(top_k - len(best), others, key=lambda other_id: score(e, other_id))
+        candidates[e.id] = tuple(best)
+
+    current_app.logger.info(f"Distractor index built for {len(candidates)} words "
+                            f"({(time.perf_counter() - started) * 1000:.0f} ms).")
+    return DistractorIndex(vocab_index.signature, candidates)
+
+
+def _index_path():
+    return os.path.join(current_app.instance_path, INDEX_FILENAME)
+
+
+def save_distractor_index(distractors):
+    path = _index_path()
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'signature': distractors.signature,
+                   'candidates': {str(k): v for k, v in distractors.candidates.items()}}, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _load_distractor_index(signature):
+    try:
+        with open(_index_path(), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('signature') != signature:
+        return None
+    return DistractorIndex(signature, {int(k): tuple(v) for k, v in data.get('candidates', {}).items()})
+
+
+def get_distractor_index():
+    """返回与当前词汇索引一致的干扰项索引：优先加载已保存的文件，否则构建并保存。"""
+    global _distractors
+    vocab_index = get_vocab_index()
+    with _distractors_lock:
+        if _distractors is None or _distractors.signature != vocab_index.signature:
+            distractors = _load_distractor_index(vocab_index.signature)
+            if distractors is None:
+                distractors = build_distractor_index(vocab_index)
+                try:
+                    save_distractor_index(distractors)
+                except OSError as e:
+                    current_app.logger.warning(f"Could not save distractor index: {e}")
+            _distractors = distractors
+        return _distractors
@@ -0,0 +1,79 @@
+# app/favorites.py
+# 收藏状态的批量读取：每个用户的收藏词汇 id 集合缓存在进程内 (LRU，FAVORITES_CACHE_SIZE 个用户)，
+# 一个页面上任意多个词的收藏状态只需一次查询 (缓存命中时不查询)，替代逐词的 Vocabulary.is_favorited_by 查询。
+#
+# 缓存失效：收藏修改提交后调用 favorites_changed()，丢弃本进程的缓存，并更换 Flask 会话中的版本号——
+# 同一会话的后续请求无论落到哪个 worker 进程，版本号都与旧缓存不符而重新加载。
+# 同一用户在其他设备上的修改最多在 FAVORITES_CACHE_TTL 秒后可见。
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import current_app, session
+
+from . import db
+from .models import UserFavoriteVocabulary
+
+_SESSION_KEY = 'favorites_version'
+
+_cache = OrderedDict() # {user_id: (会话版本号, 加载时间, frozenset(vocabulary_id))}
+_cache_lock = threading.Lock()
+
+
+def _session_version():
+    try:
+        return session.get(_SESSION_KEY)
+    except RuntimeError: # 不在请求上下文中 (CLI、后台线程)
+        return None
+
+
+def favorite_ids(user_id):
+    """返回用户收藏的全部词汇 id (frozenset)。缓存未命中时一次查询 (命中 (user_id, vocabulary_id) 唯一索引)。"""
+    size = current_app.config.get('FAVORITES_CACHE_SIZE', 1024)
+    ttl = current_app.config.get('FAVORITES_CACHE_TTL', 300)
+    version = _session_version()
+    now = time.monotonic()
+    if size > 0:
+        with _cache_lock:
+            entry = _cache.get(user_id)
+            if entry is not None and entry[0] == version and now - entry[1] < ttl:
+                _cache.move_to_end(user_id)
+                return entry[2]
+
+    ids = frozenset(db.session.scalars(
+        db.select(UserFavoriteVocabulary.vocabulary_id).where(UserFavoriteVocabulary.user_id == user_id)))
+    if size > 0:
+        with _cache_lock:
+            _cache[user_id] = (version, now, ids)
+            _cache.move_to_end(user_id)
+            while len(_cache) > size:
+                _cache.popitem(last=False)
+    return ids
+
+
+def favorite_flags(user_id, vocabulary_ids):
+    """
+    返回 {vocabulary_id: 是否已收藏}。启用缓存时由收藏集合直接回答；
+    FAVORITES_CACHE_SIZE=0 (不缓存) 时对这些 id 执行一次 IN 查询。
+    """
+    vocabulary_ids = list(dict.fromkeys(vocabulary_ids))
+    if not vocabulary_ids:
+        return {}
+    if current_app.config.get('FAVORITES_CACHE_SIZE', 1024) > 0:
+        favorites = favorite_ids(user_id)
+    else:
+        favorites = set(db.session.scalars(db.select(UserFavoriteVocabulary.vocabulary_id).where(
+            UserFavoriteVocabulary.user_id == user_id,
+            UserFavoriteVocabulary.vocabulary_id.in_(vocabulary_ids))))
+    return {vocab_id: vocab_id in favorites for vocab_id in vocabulary_ids}
+
+
+def favorites_changed(user_id):
+    """收藏修改提交之后调用：丢弃本进程中该用户的缓存，并更换会话版本号使其他进程中的缓存失效。"""
+    with _cache_lock:
+        _cache.pop(user_id, None)
+    try:
+        session[_SESSION_KEY] = uuid.uuid4().hex[:12]
+    except RuntimeError:
+        pass
@@ -0,0 +1,39 @@
+# app/lazy_imports.py
+# 重量级 ML 依赖 (torch / whisper / librosa / TTS) 的懒加载代理。
+# 只导入 app 的进程 (flask db upgrade、sync-admins、只提供测验的 Web worker) 不再为这些库付出启动时间和内存，
+# 首次访问属性时才真正 import。
+import importlib
+import threading
+
+_import_lock = threading.Lock()
+
+
+class LazyModule:
+    """模块代理：首次访问属性时导入真实模块，之后直接转发。"""
+
+    def __init__(self, module_name):
+        self._module_name = module_name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            with _import_lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._module_name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    @property
+    def is_loaded(self):
+        return self._module is not None
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<LazyModule {self._module_name} ({state})>'
+
+
+def lazy_module(module_name):
+    """返回 module_name 的懒加载代理。"""
+    return LazyModule(module_name)
@@ -0,0 +1,258 @@
+# app/media_index.py
+# 媒体文件索引：记录已存在的预生成课程音频与用户录音 (大小、mtime、格式)，
+# 课程页等热路径直接查内存，不再对 模板 × 扩展名 逐个 os.path.exists。
+#
+# - 首次查询时懒加载扫描目录；上传、生成、转码、删除路径直接更新索引。
+# - 多个 Web worker 各有一份索引，其他进程写入的文件在 MEDIA_INDEX_REFRESH_SECONDS 后由后台重扫发现；
+#   录音相关 API 在索引未命中时会重扫该用户目录，保证刚上传的录音可以立即评分/回放。
+import os
+import re
+import time
+import threading
+from collections import namedtuple
+
+from flask import current_app
+
+MediaEntry = namedtuple('MediaEntry', ['path', 'size', 'mtime', 'format']) # format 为小写扩展名，如 '.wav'
+
+_RECORDING_DIR_RE = re.compile(r'^user_(\d+)$')
+_RECORDING_FILE_RE = re.compile(r'^lesson_(\d+)(\.[A-Za-z0-9]+)$')
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _template_regex(template):
+    """由 PREGENERATED_AUDIO_FILENAME_TEMPLATE (如 'lesson_{lesson_number}.{ext}') 生成匹配文件名的正则。"""
+    pattern = re.escape(template)
+    pattern = pattern.replace(re.escape('{lesson_number}'), r'(?P<lesson>\d+)')
+    pattern = pattern.replace(re.escape('{ext}'), r'(?P<ext>[A-Za-z0-9]+)')
+    return re.compile(f'^{pattern}$')
+
+
+def _entry_from_stat(path, st):
+    return MediaEntry(path, st.st_size, st.st_mtime, os.path.splitext(path)[1].lower())
+
+
+def _unchanged(entry):
+    """索引中的文件是否仍存在且未被改写。"""
+    try:
+        st = os.stat(entry.path)
+    except OSError:
+        return False
+    return st.st_mtime == entry.mtime and st.st_size == entry.size
+
+
+def split_source_and_variants(entries, variant_exts):
+    """
+    从同一课的文件中挑出要提供的源文件 (最新的那个) 及其不早于源文件的压缩变体。
+    返回 (MediaEntry | None, {ext: path})。有 wav 时 .opus/.mp3 视为它的变体而非独立来源。
+    """
+    has_wav = '.wav' in entries
+    sources = [entry for ext, entry in entries.items() if not (has_wav and ext in variant_exts)]
+    if not sources:
+        return None, {}
+    source = max(sources, key=lambda entry: entry.mtime)
+    variants = {}
+    if source.format == '.wav':
+        variants = {ext: entries[ext].path for ext in variant_exts
+                    if ext in entries and entries[ext].mtime >= source.mtime}
+    return source, variants
+
+
+class MediaIndex:
+    """进程内的媒体文件索引。所有方法线程安全。"""
+
+    def __init__(self, pregen_folder, recordings_folder, filename_template, refresh_seconds):
+        self.pregen_folder = os.path.abspath(pregen_folder) if pregen_folder else None
+        self.recordings_folder = os.path.abspath(recordings_folder) if recordings_folder else None
+        self.filename_template = filename_template
+        self.refresh_seconds = refresh_seconds
+        self._pregen_re = _template_regex(filename_template)
+        self._lock = threading.Lock()
+        self._pregen = {}      # {lesson_number: {ext: MediaEntry}}
+        self._recordings = {}  # {(user_id, lesson_number): {ext: MediaEntry}}
+        self._built_at = None
+        self._refreshing = False
+
+    # --- 扫描 ---
+    def _scan_pregenerated(self):
+        pregen = {}
+        if not self.pregen_folder:
+            return pregen
+        try:
+            with os.scandir(self.pregen_folder) as it:
+                for dir_entry in it:
+                    match = self._pregen_re.match(dir_entry.name)
+                    if not match or not dir_entry.is_file():
+                        continue
+                    entry = _entry_from_stat(dir_entry.path, dir_entry.stat())
+                    pregen.setdefault(int(match.group('lesson')), {})[entry.format] = entry
+        except FileNotFoundError:
+            pass
+        return pregen
+
+    def _scan_user_recordings(self, user_folder, user_id, into):
+        try:
+            with os.scandir(user_folder) as it:
+                for dir_entry in it:
+                    match = _RECORDING_FILE_RE.match(dir_entry.name)
+                    if not match or not dir_entry.is_file():
+                        continue
+                    entry = _entry_from_stat(dir_entry.path, dir_entry.stat())
+                    into.setdefault((user_id, int(match.group(1))), {})[entry.format] = entry
+        except FileNotFoundError:
+            pass
+
+    def _scan_recordings(self):
+        recordings = {}
+        if not self.recordings_folder:
+            return recordings
+        try:
+            with os.scandir(self.recordings_folder) as it:
+                for dir_entry in it:
+                    match = _RECORDING_DIR_RE.match(dir_entry.name)
+                    if match and dir_entry.is_dir():
+                        self._scan_user_recordings(dir_entry.path, int(match.group(1)), recordings)
+        except FileNotFoundError:
+            pass
+        return recordings
+
+    def rebuild(self):
+        """重新扫描两个目录并整体替换索引。"""
+        started = time.time()
+        pregen, recordings = self._scan_pregenerated(), self._scan_recordings()
+        with self._lock:
+            self._pregen, self._recordings = pregen, recordings
+            self._built_at = time.time()
+            self._refreshing = False
+        current_app.logger.info(f"Media index rebuilt in {time.time() - started:.3f}s: "
+                                f"{len(pregen)} lesson(s) with audio, {len(recordings)} user recording slot(s).")
+
+    def _background_rebuild(self, app):
+        with app.app_context():
+            try:
+                self.rebuild()
+            except Exception as e:
+                app.logger.error(f"Media index background rebuild failed: {e}", exc_info=True)
+                with self._lock:
+                    self._refreshing = False
+
+    def _ensure_fresh(self):
+        """首次使用时同步构建；超过 refresh_seconds 后在后台重扫，期间继续使用旧数据。"""
+        with self._lock:
+            built_at = self._built_at
+            expired = built_at is not None and self.refresh_seconds and time.time() - built_at > self.refresh_seconds
+            start_refresh = expired and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+        if built_at is None:
+            self.rebuild()
+        elif start_refresh:
+            app = current_app._get_current_object()
+            threading.Thread(target=self._background_rebuild, args=(app,), daemon=True, name='media-index-rebuild').start()
+
+    # --- 定位 ---
+    def _classify(self, path):
+        """返回 ('pregen', lesson_number) / ('recording', (user_id, lesson_number)) / None。"""
+        path = os.path.abspath(path)
+        directory, name = os.path.split(path)
+        if self.pregen_folder and directory == self.pregen_folder:
+            match = self._pregen_re.match(name)
+            if match:
+                return 'pregen', int(match.group('lesson'))
+        if self.recordings_folder and os.path.dirname(directory) == self.recordings_folder:
+            dir_match = _RECORDING_DIR_RE.match(os.path.basename(directory))
+            file_match = _RECORDING_FILE_RE.match(name)
+            if dir_match and file_match:
+                return 'recording', (int(dir_match.group(1)), int(file_match.group(1)))
+        return None
+
+    # --- 更新 (由写入/删除文件的代码调用) ---
+    def record(self, path):
+        """文件已写入 (新建或覆盖)：更新其大小与 mtime。索引尚未构建或路径不属于索引目录时忽略。"""
+        kind = self._classify(path)
+        if kind is None or self._built_at is None:
+            return
+        try:
+            entry = _entry_from_stat(os.path.abspath(path), os.stat(path))
+        except OSError:
+            self.remove(path)
+            return
+        with self._lock:
+            bucket = self._pregen if kind[0] == 'pregen' else self._recordings
+            bucket.setdefault(kind[1], {})[entry.format] = entry
+
+    def remove(self, path):
+        """文件已删除：从索引中移除。"""
+        kind = self._classify(path)
+        if kind is None:
+            return
+        ext = os.path.splitext(path)[1].lower()
+        with self._lock:
+            bucket = self._pregen if kind[0] == 'pregen' else self._recordings
+            entries = bucket.get(kind[1])
+            if entries is not None:
+                entries.pop(ext, None)
+                if not entries:
+                    bucket.pop(kind[1], None)
+
+    def refresh_user(self, user_id):
+        """重扫单个用户的录音目录 (其他进程刚上传、本进程索引尚未看到时使用)。"""
+        if not self.recordings_folder:
+            return
+        self._ensure_fresh()
+        found = {}
+        self._scan_user_recordings(os.path.join(self.recordings_folder, f"user_{user_id}"), user_id, found)
+        with self._lock:
+            for key in [key for key in self._recordings if key[0] == user_id]:
+                del self._recordings[key]
+            self._recordings.update(found)
+
+    def find_recording(self, user_id, lesson_number, variant_exts):
+        """
+        返回 (源录音 MediaEntry | None, {ext: path})。未命中，或命中的文件已被其他进程删除/覆盖
+        (如换成另一种格式重新上传) 时，重扫该用户目录一次。命中时只对源文件做一次 stat。
+        """
+        source, variants = split_source_and_variants(self.recordings(user_id, lesson_number), variant_exts)
+        if source is None or not _unchanged(source):
+            self.refresh_user(user_id)
+            source, variants = split_source_and_variants(self.recordings(user_id, lesson_number), variant_exts)
+        return source, variants
+
+    # --- 查询 (不访问文件系统) ---
+    def pregenerated(self, lesson_number):
+        """返回 {ext: MediaEntry}。"""
+        self._ensure_fresh()
+        with self._lock:
+            return dict(self._pregen.get(lesson_number, {}))
+
+    def recordings(self, user_id, lesson_number):
+        """返回 {ext: MediaEntry}。"""
+        self._ensure_fresh()
+        with self._lock:
+            return dict(self._recordings.get((user_id, lesson_number), {}))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'lessons_with_audio': len(self._pregen),
+                'recording_slots': len(self._recordings),
+                'built_at': self._built_at,
+                'pid': os.getpid(), # 每个进程各有一份索引
+            }
+
+
+def get_media_index():
+    """返回当前应用的媒体索引 (目录配置变化时重建)。"""
+    global _index
+    config = current_app.config
+    pregen_folder = config.get('PREGENERATED_AUDIO_FOLDER')
+    recordings_folder = config.get('USER_RECORDINGS_BASE_FOLDER')
+    template = config.get('PREGENERATED_AUDIO_FILENAME_TEMPLATE', 'lesson_{lesson_number}.{ext}')
+    with _index_lock:
+        if (_index is None or _index.pregen_folder != (os.path.abspath(pregen_folder) if pregen_folder else None)
+                or _index.recordings_folder != (os.path.abspath(recordings_folder) if recordings_folder else None)
+                or _index.filename_template != template):
+            _index = MediaIndex(pregen_folder, recordings_folder, template, config.get('MEDIA_INDEX_REFRESH_SECONDS', 300))
+        return _index
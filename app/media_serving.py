@@ -0,0 +1,103 @@
+# app/media_serving.py
+# 所有音频接口共用的文件发送层：强 ETag、Last-Modified、304 条件请求、Range (206) 以及按资源类型设置 Cache-Control。
+# 可选地把文件传输交给前端代理 (MEDIA_SENDFILE_MODE = 'x-sendfile' 或 'x-accel-redirect')。
+#
+# 缓存策略:
+#   - 带版本号 (?v=<etag>) 且与当前文件一致的预生成音频：public, max-age=1 年, immutable (文件变了 URL 也会变)
+#   - 文件名含内容哈希的静态词汇包 (app/vocab_packs.py)：同上
+#   - 其他公开音频：public, no-cache (每次用 ETag 重新验证，未变化时 304，不重传)
+#   - 用户录音等私有音频：private, no-cache
+import os
+import hashlib
+from urllib.parse import quote
+
+from flask import current_app, request
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+from .audio_transcode import mimetype_for
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def media_etag(path, size, mtime):
+    """由文件名、大小与 mtime 生成强 ETag (不读文件内容)；同时用作 URL 中的版本号。"""
+    return hashlib.sha1(f"{os.path.basename(path)}:{size}:{mtime:.6f}".encode('utf-8')).hexdigest()[:20]
+
+
+def _accel_redirect_uri(path):
+    """按 MEDIA_ACCEL_REDIRECT_MAP [(文件系统前缀, 内部 location 前缀), ...] 把路径映射为 nginx 内部 URI。"""
+    path = os.path.abspath(path)
+    for fs_prefix, uri_prefix in current_app.config.get('MEDIA_ACCEL_REDIRECT_MAP', []):
+        fs_prefix = os.path.join(os.path.abspath(fs_prefix), '')
+        if path.startswith(fs_prefix):
+            relative = os.path.relpath(path, fs_prefix).replace(os.sep, '/')
+            return uri_prefix.rstrip('/') + '/' + quote(relative)
+    return None
+
+
+def _apply_cache_policy(response, immutable, private):
+    cache_control = response.cache_control
+    cache_control.no_cache = None
+    if immutable:
+        cache_control.public = True
+        cache_control.max_age = current_app.config.get('MEDIA_IMMUTABLE_MAX_AGE', IMMUTABLE_MAX_AGE)
+        cache_control.immutable = True
+    else:
+        if private:
+            cache_control.private = True
+        else:
+            cache_control.public = True
+        cache_control.no_cache = True # 允许缓存，但每次使用前需用 ETag 重新验证
+
+
+def send_media(path, mimetype=None, version=None, private=False, vary_accept=False, immutable=False):
+    """
+    发送 path 指向的音频文件 (调用者负责保证路径安全)。
+
+    支持 If-None-Match / If-Modified-Since (304) 与 Range (206)；文件不存在时抛出 NotFound。
+    version: URL 中的版本号 (?v=)，与文件当前 ETag 一致时按 immutable 长期缓存；private: 只允许浏览器缓存。
+    vary_accept: 响应内容取决于 Accept 头 (按 Accept 选择了压缩变体)。
+    immutable: 文件名本身包含内容哈希 (内容变化时文件名也变)，无需 ?v= 也按 immutable 长期缓存。
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        raise NotFound()
+    mimetype = mimetype or mimetype_for(path)
+    etag = media_etag(path, st.st_size, st.st_mtime)
+    immutable = (immutable or (bool(version) and version == etag)) and not private
+    mode = (current_app.config.get('MEDIA_SENDFILE_MODE') or '').lower()
+
+    accel_uri = _accel_redirect_uri(path) if mode == 'x-accel-redirect' else None
+    if accel_uri:
+        # nginx 在内部 location 上自行处理 Range；这里只负责校验器与 304
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = accel_uri
+        response.set_etag(etag)
+        response.last_modified = st.st_mtime
+        response = response.make_conditional(request.environ)
+        if response.status_code == 304:
+            response.headers.pop('X-Accel-Redirect', None)
+    else:
+        response = send_file(
+            path, request.environ, mimetype=mimetype, etag=etag, conditional=True,
+            max_age=current_app.config.get('MEDIA_IMMUTABLE_MAX_AGE', IMMUTABLE_MAX_AGE) if immutable else None,
+            use_x_sendfile=(mode == 'x-sendfile'),
+            response_class=current_app.response_class, _root_path=current_app.root_path,
+        )
+
+    _apply_cache_policy(response, immutable, private)
+    if vary_accept:
+        response.vary.add('Accept')
+    return response
+
+
+def send_media_from_directory(directory, filename, **kwargs):
+    """与 send_from_directory 相同的路径安全检查，然后交给 send_media。"""
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    return send_media(path, **kwargs)
+
@@ -0,0 +1,177 @@
+# app/model_server.py
+# 可选的本地推理进程 (sidecar)：由一个进程持有 Whisper 与 Coqui TTS 模型，
+# 各 Web worker 通过 Unix socket 发送 transcribe / synthesize 请求，自身不加载模型权重。
+#
+# 启动:   flask model-server            (需设置 MODEL_SERVER_SOCKET)
+# 客户端: scoring_utils.transcribe_audio / tts_utils.generate_and_save_audio_if_not_exists
+#         在配置了 MODEL_SERVER_SOCKET 时自动走这里的 ModelServerClient。
+import os
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+from flask import current_app
+
+# --- 协议中的操作名 ---
+OP_PING = 'ping'
+OP_TRANSCRIBE = 'transcribe'
+OP_SYNTHESIZE = 'synthesize'
+
+
+class ModelServerError(RuntimeError):
+    """模型服务不可用，或服务端执行请求失败。"""
+    pass
+
+
+def _get_authkey(config):
+    """连接认证密钥：优先 MODEL_SERVER_AUTHKEY，否则复用 SECRET_KEY。"""
+    key = config.get('MODEL_SERVER_AUTHKEY') or config.get('SECRET_KEY') or ''
+    return key.encode('utf-8') if isinstance(key, str) else key
+
+
+# === 客户端 ===
+
+class ModelServerClient:
+    """模型服务客户端。每次调用使用独立连接，因此可在多线程中共享同一实例。"""
+
+    def __init__(self, socket_path, authkey, timeout=300):
+        self.socket_path = socket_path
+        self.authkey = authkey
+        self.timeout = timeout
+
+    def _call(self, request):
+        try:
+            conn = Client(self.socket_path, family='AF_UNIX', authkey=self.authkey)
+        except (OSError, EOFError, AuthenticationError) as e:
+            raise ModelServerError(f"Cannot connect to model server at {self.socket_path}: {e}") from e
+        try:
+            conn.send(request)
+            if not conn.poll(self.timeout):
+                raise ModelServerError(f"Model server did not answer '{request.get('op')}' within {self.timeout}s")
+            response = conn.recv()
+        except (OSError, EOFError) as e:
+            raise ModelServerError(f"Model server connection failed during '{request.get('op')}': {e}") from e
+        finally:
+            conn.close()
+        if not response.get('ok'):
+            raise ModelServerError(response.get('error') or f"Model server failed '{request.get('op')}'")
+        return response
+
+    def ping(self):
+        return self._call({'op': OP_PING})
+
+    def transcribe(self, audio, **options):
+        """audio 为文件路径或 16 kHz float32 数组；返回识别文本。"""
+        return self._call({'op': OP_TRANSCRIBE, 'audio': audio, 'options': options}).get('text', '')
+
+    def synthesize(self, **tts_kwargs):
+        """参数与 TTS.tts_to_file 相同 (file_path 必须是服务端可写的绝对路径)。返回 file_path。"""
+        return self._call({'op': OP_SYNTHESIZE, 'tts_kwargs': tts_kwargs}).get('file_path')
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def model_server_enabled():
+    """当前应用是否配置为使用外部模型服务。"""
+    return bool(current_app.config.get('MODEL_SERVER_SOCKET'))
+
+
+def get_model_client():
+    """返回 (缓存的) 模型服务客户端；未配置 MODEL_SERVER_SOCKET 时返回 None。"""
+    global _client
+    socket_path = current_app.config.get('MODEL_SERVER_SOCKET')
+    if not socket_path:
+        return None
+    with _client_lock:
+        if _client is None or _client.socket_path != socket_path:
+            _client = ModelServerClient(
+                socket_path,
+                _get_authkey(current_app.config),
+                timeout=current_app.config.get('MODEL_SERVER_TIMEOUT', 300)
+            )
+        return _client
+
+
+# === 服务端 ===
+
+class _ModelHost:
+    """服务端持有的模型。Whisper 与 TTS 各有一把锁，同一模型的推理串行执行。"""
+
+    def __init__(self, app):
+        self.app = app
+        self.whisper_lock = threading.Lock()
+        self.tts_lock = threading.Lock()
+
+    def handle(self, request):
+        op = request.get('op')
+        if op == OP_PING:
+            return {'ok': True, 'pid': os.getpid()}
+        if op == OP_TRANSCRIBE:
+            return self._transcribe(request.get('audio'), request.get('options') or {})
+        if op == OP_SYNTHESIZE:
+            return self._synthesize(request.get('tts_kwargs') or {})
+        return {'ok': False, 'error': f"Unknown op: {op}"}
+
+    def _transcribe(self, audio, options):
+        from . import scoring_utils
+        model = scoring_utils.whisper_model
+        if model is None:
+            return {'ok': False, 'error': 'Whisper model not loaded on model server'}
+        with self.whisper_lock:
+            result = model.transcribe(audio, **options)
+        return {'ok': True, 'text': result.get('text', '')}
+
+    def _synthesize(self, tts_kwargs):
+        from . import tts_utils
+        if not tts_kwargs.get('file_path') or not tts_kwargs.get('text'):
+            return {'ok': False, 'error': "synthesize requires 'text' and 'file_path'"}
+        with self.tts_lock:
+            engine = tts_utils.initialize_tts_model()
+            if engine is None:
+                return {'ok': False, 'error': 'TTS engine failed to initialize on model server'}
+            engine.tts_to_file(**tts_kwargs)
+        return {'ok': True, 'file_path': tts_kwargs['file_path']}
+
+    def serve_connection(self, conn):
+        with self.app.app_context():
+            try:
+                while True:
+                    try:
+                        request = conn.recv()
+                    except EOFError:
+                        break
+                    try:
+                        response = self.handle(request)
+                    except Exception as e:
+                        self.app.logger.error(f"Model server error handling '{request.get('op')}': {e}", exc_info=True)
+                        response = {'ok': False, 'error': str(e)}
+                    conn.send(response)
+            finally:
+                conn.close()
+
+
+def serve(socket_path, preload_tts=False):
+    """在当前 (已带应用上下文的) 进程中运行模型服务，阻塞直到进程退出。"""
+    from . import scoring_utils
+    app = current_app._get_current_object()
+
+    scoring_utils.load_whisper_model(app.config.get('WHISPER_MODEL_SIZE', 'small'), force_local=True)
+    if preload_tts:
+        from . import tts_utils
+        tts_utils.initialize_tts_model()
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path) # 清理上次遗留的 socket 文件
+    host = _ModelHost(app)
+    with Listener(socket_path, family='AF_UNIX', authkey=_get_authkey(app.config)) as listener:
+        os.chmod(socket_path, 0o660)
+        app.logger.info(f"Model server (pid {os.getpid()}) listening on {socket_path}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e: # 认证失败等，不影响后续连接
+                app.logger.warning(f"Model server rejected a connection: {e}")
+                continue
+            threading.Thread(target=host.serve_connection, args=(conn,), daemon=True).start()
@@ -1,10 +1,36 @@
 # app/models.py - Updated with User Favorites Feature
 
 from datetime import datetime
+from collections import Counter
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from . import db # 导入你的 db 实例
 
+def _upsert(model, rows, conflict_columns, update_values):
+    """
+    在当前事务中执行一条多行 "插入，冲突时更新" 语句。
+    SQLite / PostgreSQL 使用 INSERT ... ON CONFLICT (conflict_columns) DO UPDATE，MySQL 使用 ON DUPLICATE KEY UPDATE。
+    update_values(new) 返回 {列名: 新值}，new 代表本应插入的那一行 (excluded / inserted)。
+    数据库不支持时返回 False，由调用者退回逐条处理。
+    """
+    dialect = db.session.get_bind(mapper=model).dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(index_elements=conflict_columns, set_=update_values(stmt.excluded))
+    elif dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(model).values(rows)
+        stmt = stmt.on_duplicate_key_update(**update_values(stmt.inserted))
+    else:
+        return False
+    db.session.execute(stmt)
+    return True
+
+
 # --- New Association Model for User Favorites ---
 class UserFavoriteVocabulary(db.Model):
     """关联表/对象，记录用户收藏的词汇。"""
@@ -15,12 +41,36 @@ class UserFavoriteVocabulary(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True) # 收藏时间
 
     # 添加唯一约束，防止同一用户重复收藏同一词汇
-    __table_args__ = (db.UniqueConstraint('user_id', 'vocabulary_id', name='_user_vocab_favorite_uc'),)
+    # (user_id, timestamp) 复合索引：收藏列表按 (时间, id) 游标分页 (app/pagination.py)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'vocabulary_id', name='_user_vocab_favorite_uc'),
+        db.Index('ix_favorite_user_time', 'user_id', 'timestamp'),
+    )
 
     # 可以选择性地添加关系回指到 User 和 Vocabulary (如果需要在关联对象上操作)
     # user = db.relationship("User", back_populates="favorite_associations")
     # vocabulary = db.relationship("Vocabulary", back_populates="favorited_by_associations")
 
+    @classmethod
+    def apply_changes(cls, user_id, add_ids, remove_ids):
+        """
+        批量收藏 / 取消收藏：一条 DELETE ... IN 与一条 upsert (已收藏的词保留原收藏时间，未收藏的取消操作忽略)。
+        只加入当前事务，由调用者提交 (并调用 favorites.favorites_changed)。
+        """
+        remove_ids = sorted(set(remove_ids))
+        add_ids = sorted(set(add_ids))
+        if remove_ids:
+            db.session.execute(db.delete(cls).where(cls.user_id == user_id, cls.vocabulary_id.in_(remove_ids)))
+        if not add_ids:
+            return
+        when = datetime.utcnow()
+        rows = [{'user_id': user_id, 'vocabulary_id': vocab_id, 'timestamp': when} for vocab_id in add_ids]
+        upserted = _upsert(cls, rows, ['user_id', 'vocabulary_id'], lambda new: {'timestamp': cls.timestamp})
+        if not upserted:
+            existing = set(db.session.scalars(db.select(cls.vocabulary_id).where(
+                cls.user_id == user_id, cls.vocabulary_id.in_(add_ids))))
+            db.session.add_all(cls(**row) for row in rows if row['vocabulary_id'] not in existing)
+
     def __repr__(self):
         return f'<UserFavorite User {self.user_id} Vocab {self.vocabulary_id}>'
 # --- End Association Model ---
@@ -111,14 +161,9 @@ class Vocabulary(db.Model):
     def is_favorited_by(self, user):
         if not user or not user.is_authenticated:
              return False
-         # 使用 SQLAlchemy 的 any() 或 count() 方法在关系上进行高效查询
-        # .any() 检查是否存在至少一个匹配项
-        return db.session.query(UserFavoriteVocabulary.query.filter_by(
-            user_id=user.id,
-            vocabulary_id=self.id
-        ).exists()).scalar()
-        # 或者，如果关系已经加载了一部分:
-        # return any(fav.id == user.id for fav in self.favorited_by_users) # 效率较低如果关系未加载
+        # 查用户的收藏 id 集合 (app/favorites.py，请求间缓存)：模板中逐词调用也不会每个词一次查询
+        from .favorites import favorite_ids
+        return self.id in favorite_ids(user.id)
     # --- 结束新增方法 ---
 
     def __repr__(self):
@@ -136,6 +181,13 @@ class WrongAnswer(db.Model):
     is_marked = db.Column(db.Boolean, default=False, nullable=False, index=True)
     category = db.Column(db.String(50), nullable=True, index=True)
 
+    # 每个用户每个词汇只有一条错题记录，再次答错时累加 incorrect_count (见 record_wrong_answers)
+    # (user_id, timestamp_last_wrong) 复合索引：错题本按 (最后答错时间, id) 游标分页
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'vocabulary_id', name='uq_user_vocab_wrong_answer'),
+        db.Index('ix_wrong_answer_user_last_wrong', 'user_id', 'timestamp_last_wrong'),
+    )
+
     # --- 关系：指向 User ---
     user = db.relationship(
         'User',
@@ -148,6 +200,37 @@ class WrongAnswer(db.Model):
         back_populates='wrong_answer_associations'
     )
 
+    @classmethod
+    def record_wrong_answers(cls, user_id, vocabulary_ids, when=None):
+        """
+        记录答错的词汇：不存在则插入，已存在则 incorrect_count 增加。vocabulary_ids 中同一词出现几次就计几次
+        (一次测验中每个词只出现一次；批量同步多次测验时可能重复)。
+        一条 INSERT ... ON CONFLICT DO UPDATE 语句 (见 _upsert)，不需要先读出已有记录，缩短写锁的持有时间。
+        只加入当前事务，由调用者提交。
+        """
+        counts = Counter(vocabulary_ids)
+        if not counts:
+            return
+        when = when or datetime.utcnow()
+        rows = [{'user_id': user_id, 'vocabulary_id': vocab_id, 'timestamp_first_wrong': when,
+                 'timestamp_last_wrong': when, 'incorrect_count': counts[vocab_id], 'is_marked': False}
+                for vocab_id in sorted(counts)]
+        upserted = _upsert(cls, rows, ['user_id', 'vocabulary_id'], lambda new: {
+            'incorrect_count': db.func.coalesce(cls.incorrect_count, 0) + new.incorrect_count,
+            'timestamp_last_wrong': new.timestamp_last_wrong,
+        })
+        if not upserted:
+            # 其他数据库：逐条读-改-写
+            existing = {wrong.vocabulary_id: wrong for wrong in cls.query.filter(
+                cls.user_id == user_id, cls.vocabulary_id.in_(sorted(counts)))}
+            for row in rows:
+                wrong = existing.get(row['vocabulary_id'])
+                if wrong is None:
+                    db.session.add(cls(**row))
+                else:
+                    wrong.timestamp_last_wrong = when
+                    wrong.incorrect_count = (wrong.incorrect_count or 0) + row['incorrect_count']
+
     def __repr__(self):
         return f'<WrongAnswer User {self.user_id} Vocab {self.vocabulary_id} Marked: {self.is_marked} Cat: {self.category}>'
 
@@ -168,6 +251,9 @@ class QuizAttempt(db.Model):
         back_populates='quiz_attempts'
     )
 
+    # (user_id, timestamp) 复合索引：测试历史按 (时间, id) 游标分页；SQLite 的二级索引隐含 rowid (即 id)，无需再加 id 列
+    __table_args__ = (db.Index('ix_quiz_attempt_user_time', 'user_id', 'timestamp'),)
+
     def __repr__(self):
         return f'<QuizAttempt User {self.user_id} Score {self.score}/{self.total_questions} on {self.timestamp}>'
 
@@ -218,4 +304,283 @@ class PronunciationScore(db.Model):
     __table_args__ = (db.UniqueConstraint('user_id', 'lesson_number', name='uq_user_lesson_pronunciation'),) # 限制每个用户每课只有一个评分
 
     def __repr__(self):
-        return f'<PronunciationScore User {self.user_id} Lesson {self.lesson_number} Score: {self.final_score}>'
\ No newline at end of file
+        return f'<PronunciationScore User {self.user_id} Lesson {self.lesson_number} Score: {self.final_score}>'
+
+class ScoringJob(db.Model):
+    """跟读评分的异步任务记录 (状态保存在数据库中，任意 Web 进程都能查询)。"""
+    __tablename__ = 'scoring_job'
+    id = db.Column(db.String(32), primary_key=True) # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    lesson_number = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True) # queued / running / done / failed
+    result_json = db.Column(db.Text, nullable=True) # evaluate_audio_recording 的结果 (JSON)
+    error = db.Column(db.Text, nullable=True) # 失败原因
+    created_at = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User', backref=db.backref('scoring_jobs', lazy='dynamic'))
+
+    def __repr__(self):
+        return f'<ScoringJob {self.id} User {self.user_id} Lesson {self.lesson_number} Status: {self.status}>'
+
+
+class ReviewSchedule(db.Model):
+    """
+    间隔重复 (SM-2) 复习计划：每个用户 × 词汇一行，记录难度系数、间隔与下次复习时间。
+    测验答错时加入/重置 (record_lapses)，复习评分后由 app/review_scheduler.py 批量更新。
+    """
+    __tablename__ = 'review_schedule'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    vocabulary_id = db.Column(db.Integer, db.ForeignKey('vocabulary.id'), nullable=False, index=True)
+    ease_factor = db.Column(db.Float, nullable=False, default=2.5) # SM-2 难度系数 (EF)，不低于 1.3
+    interval_days = db.Column(db.Float, nullable=False, default=0) # 当前复习间隔 (天)
+    repetitions = db.Column(db.Integer, nullable=False, default=0) # 连续答对 (评分 >= 3) 次数
+    lapses = db.Column(db.Integer, nullable=False, default=0) # 遗忘次数 (复习评分 < 3 或测验中再次答错)
+    due_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) # 下次复习时间
+    last_reviewed_at = db.Column(db.DateTime, nullable=True)
+
+    vocabulary_item = db.relationship('Vocabulary')
+
+    # (user_id, due_at) 复合索引：取到期项目是一次索引范围扫描，无需对用户全部记录排序
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'vocabulary_id', name='uq_user_vocab_review'),
+        db.Index('ix_review_schedule_user_due', 'user_id', 'due_at'),
+    )
+
+    @classmethod
+    def record_lapses(cls, user_id, vocabulary_ids, when=None, ease_penalty=0.2, min_ease=1.3):
+        """
+        测验中答错的词汇：不在复习计划中则加入 (立即到期)；已在计划中则重新开始 (repetitions/间隔清零，
+        立即到期，难度系数降低 ease_penalty)。与 WrongAnswer.record_wrong_answers 一样是一条语句，只加入当前事务。
+        """
+        vocabulary_ids = sorted(set(vocabulary_ids))
+        if not vocabulary_ids:
+            return
+        when = when or datetime.utcnow()
+        rows = [{'user_id': user_id, 'vocabulary_id': vocab_id, 'ease_factor': 2.5, 'interval_days': 0,
+                 'repetitions': 0, 'lapses': 0, 'due_at': when} for vocab_id in vocabulary_ids]
+        lowered_ease = cls.ease_factor - ease_penalty
+        upserted = _upsert(cls, rows, ['user_id', 'vocabulary_id'], lambda new: {
+            'ease_factor': db.case((lowered_ease < min_ease, min_ease), else_=lowered_ease),
+            'interval_days': 0,
+            'repetitions': 0,
+            'lapses': cls.lapses + 1,
+            'due_at': new.due_at,
+        })
+        if not upserted:
+            existing = {item.vocabulary_id: item for item in cls.query.filter(
+                cls.user_id == user_id, cls.vocabulary_id.in_(vocabulary_ids))}
+            for row in rows:
+                item = existing.get(row['vocabulary_id'])
+                if item is None:
+                    db.session.add(cls(**row))
+                else:
+                    item.ease_factor = max(min_ease, item.ease_factor - ease_penalty)
+                    item.interval_days, item.repetitions = 0, 0
+                    item.lapses += 1
+                    item.due_at = when
+
+    def __repr__(self):
+        return f'<ReviewSchedule User {self.user_id} Vocab {self.vocabulary_id} Due: {self.due_at} EF: {self.ease_factor:.2f}>'
+
+
+class SyncedAttempt(db.Model):
+    """
+    离线测验同步 (/api/sync) 的幂等记录：每个用户 × 客户端生成的幂等键一行。
+    (user_id, client_key) 唯一约束兼作查询索引；同一键重放时被识别并跳过，不会重复记分。
+    """
+    __tablename__ = 'synced_attempt'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    client_key = db.Column(db.String(64), nullable=False) # 客户端生成的幂等键 (如 UUID)
+    attempted_at = db.Column(db.DateTime, nullable=True)  # 客户端记录的作答时间
+    synced_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'client_key', name='uq_user_sync_key'),)
+
+    def __repr__(self):
+        return f'<SyncedAttempt User {self.user_id} Key {self.client_key}>'
+
+
+def parse_lessons_attempted(lessons_attempted):
+    """QuizAttempt.lessons_attempted ("1,2,5") -> [1, 2, 5]，忽略无法解析的部分。"""
+    return sorted({int(part) for part in (lessons_attempted or '').split(',') if part.strip().isdigit()})
+
+
+def _later(column, value):
+    """upsert 中取较晚的时间：已有值为空或更早时用新值 (离线同步的作答时间可能早于已记录的时间)。"""
+    return db.case((column > value, column), else_=value)
+
+
+class UserStats(db.Model):
+    """
+    每个用户的预聚合统计：测验次数、答题数、答对数、最近测验时间与跟读评分汇总。
+    提交测验 (/api/submit_quiz、/api/sync) 与跟读评分保存时在同一事务中增量更新 (record_* 方法)，
+    页面直接读一行，无需对 QuizAttempt / PronunciationScore 全表聚合。
+    与明细不一致时 (如直接修改了数据库) 用 `flask stats rebuild` 重新计算 (app/user_stats.py)。
+    """
+    __tablename__ = 'user_stats'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    quiz_count = db.Column(db.Integer, nullable=False, default=0)
+    questions_answered = db.Column(db.Integer, nullable=False, default=0) # 各次测验 total_questions 之和
+    correct_answers = db.Column(db.Integer, nullable=False, default=0)    # 各次测验 score 之和
+    last_quiz_at = db.Column(db.DateTime, nullable=True)
+    pronunciation_lessons = db.Column(db.Integer, nullable=False, default=0)    # 有跟读评分的课数
+    pronunciation_score_sum = db.Column(db.Float, nullable=False, default=0.0)  # 这些课最新评分之和
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    user = db.relationship('User', backref=db.backref('stats', uselist=False))
+
+    __table_args__ = (db.UniqueConstraint('user_id', name='uq_user_stats_user'),)
+
+    @property
+    def accuracy(self):
+        """总正确率 (0-100)；没有答过题时为 None。"""
+        return self.correct_answers * 100.0 / self.questions_answered if self.questions_answered else None
+
+    @property
+    def average_score(self):
+        return self.correct_answers / self.quiz_count if self.quiz_count else None
+
+    @property
+    def average_pronunciation_score(self):
+        return self.pronunciation_score_sum / self.pronunciation_lessons if self.pronunciation_lessons else None
+
+    @classmethod
+    def record_quiz_attempts(cls, user_id, attempts):
+        """
+        把新保存的测验计入统计。attempts: [{'lessons_attempted', 'score', 'total_questions', 'timestamp'}, ...]
+        (与写入 QuizAttempt 的行相同)。用户汇总与各课明细各一条 upsert，只加入当前事务，由调用者提交。
+        """
+        if not attempts:
+            return
+        now = datetime.utcnow()
+        totals = {'quiz_count': 0, 'questions_answered': 0, 'correct_answers': 0, 'last_quiz_at': None}
+        lessons = {}
+        for attempt in attempts:
+            when = attempt.get('timestamp') or now
+            for stats in [totals] + [lessons.setdefault(n, {'quiz_count': 0, 'questions_answered': 0,
+                                                            'correct_answers': 0, 'last_quiz_at': None})
+                                     for n in parse_lessons_attempted(attempt.get('lessons_attempted'))]:
+                stats['quiz_count'] += 1
+                stats['questions_answered'] += attempt['total_questions']
+                stats['correct_answers'] += attempt['score']
+                stats['last_quiz_at'] = max(stats['last_quiz_at'] or when, when)
+
+        upserted = _upsert(cls, [dict(totals, user_id=user_id, pronunciation_lessons=0,
+                                      pronunciation_score_sum=0.0, updated_at=now)], ['user_id'], lambda new: {
+            'quiz_count': cls.quiz_count + new.quiz_count,
+            'questions_answered': cls.questions_answered + new.questions_answered,
+            'correct_answers': cls.correct_answers + new.correct_answers,
+            'last_quiz_at': _later(cls.last_quiz_at, new.last_quiz_at),
+            'updated_at': new.updated_at,
+        })
+        if not upserted:
+            stats = cls.query.filter_by(user_id=user_id).first()
+            if stats is None:
+                db.session.add(cls(user_id=user_id, updated_at=now, **totals))
+            else:
+                stats.quiz_count += totals['quiz_count']
+                stats.questions_answered += totals['questions_answered']
+                stats.correct_answers += totals['correct_answers']
+                stats.last_quiz_at = max(stats.last_quiz_at or totals['last_quiz_at'], totals['last_quiz_at'])
+                stats.updated_at = now
+        UserLessonStats.record_quiz_totals(user_id, lessons)
+
+    @classmethod
+    def record_pronunciation_score(cls, user_id, lesson_number, final_score, previous_score=None):
+        """
+        跟读评分保存后更新统计：previous_score 为该课原来的评分 (没有则 None)，汇总按差值调整。
+        只加入当前事务，由调用者提交。
+        """
+        lesson_delta = (final_score is not None) - (previous_score is not None)
+        score_delta = (final_score or 0.0) - (previous_score or 0.0)
+        now = datetime.utcnow()
+        row = {'user_id': user_id, 'quiz_count': 0, 'questions_answered': 0, 'correct_answers': 0,
+               'pronunciation_lessons': lesson_delta, 'pronunciation_score_sum': score_delta, 'updated_at': now}
+        upserted = _upsert(cls, [row], ['user_id'], lambda new: {
+            'pronunciation_lessons': cls.pronunciation_lessons + new.pronunciation_lessons,
+            'pronunciation_score_sum': cls.pronunciation_score_sum + new.pronunciation_score_sum,
+            'updated_at': new.updated_at,
+        })
+        if not upserted:
+            stats = cls.query.filter_by(user_id=user_id).first()
+            if stats is None:
+                db.session.add(cls(**row))
+            else:
+                stats.pronunciation_lessons += lesson_delta
+                stats.pronunciation_score_sum += score_delta
+                stats.updated_at = now
+        UserLessonStats.record_pronunciation(user_id, lesson_number, final_score)
+
+    def __repr__(self):
+        return f'<UserStats User {self.user_id} Quizzes {self.quiz_count} Correct {self.correct_answers}/{self.questions_answered}>'
+
+
+class UserLessonStats(db.Model):
+    """
+    每个用户 × 课程的预聚合统计 (由 UserStats.record_* 一并维护)。
+    一次测验覆盖多课时，该次测验计入它覆盖的每一课 (QuizAttempt 只记录课号列表，重建时也按此口径)，
+    因此各课的正确率是 "包含该课的测验" 的正确率。
+    """
+    __tablename__ = 'user_lesson_stats'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    lesson_number = db.Column(db.Integer, nullable=False)
+    quiz_count = db.Column(db.Integer, nullable=False, default=0)
+    questions_answered = db.Column(db.Integer, nullable=False, default=0)
+    correct_answers = db.Column(db.Integer, nullable=False, default=0)
+    last_quiz_at = db.Column(db.DateTime, nullable=True)
+    pronunciation_score = db.Column(db.Float, nullable=True) # 该课最新的跟读评分
+
+    # 唯一约束兼作 "按用户取全部课程" 的索引
+    __table_args__ = (db.UniqueConstraint('user_id', 'lesson_number', name='uq_user_lesson_stats'),)
+
+    @property
+    def accuracy(self):
+        return self.correct_answers * 100.0 / self.questions_answered if self.questions_answered else None
+
+    @classmethod
+    def record_quiz_totals(cls, user_id, lessons):
+        """lessons: {课号: {'quiz_count', 'questions_answered', 'correct_answers', 'last_quiz_at'}}，一条 upsert 累加。"""
+        if not lessons:
+            return
+        rows = [dict(lessons[n], user_id=user_id, lesson_number=n) for n in sorted(lessons)]
+        upserted = _upsert(cls, rows, ['user_id', 'lesson_number'], lambda new: {
+            'quiz_count': cls.quiz_count + new.quiz_count,
+            'questions_answered': cls.questions_answered + new.questions_answered,
+            'correct_answers': cls.correct_answers + new.correct_answers,
+            'last_quiz_at': _later(cls.last_quiz_at, new.last_quiz_at),
+        })
+        if not upserted:
+            existing = {stats.lesson_number: stats for stats in cls.query.filter(
+                cls.user_id == user_id, cls.lesson_number.in_(sorted(lessons)))}
+            for row in rows:
+                stats = existing.get(row['lesson_number'])
+                if stats is None:
+                    db.session.add(cls(**row))
+                else:
+                    stats.quiz_count += row['quiz_count']
+                    stats.questions_answered += row['questions_answered']
+                    stats.correct_answers += row['correct_answers']
+                    stats.last_quiz_at = max(stats.last_quiz_at or row['last_quiz_at'], row['last_quiz_at'])
+
+    @classmethod
+    def record_pronunciation(cls, user_id, lesson_number, final_score):
+        row = {'user_id': user_id, 'lesson_number': lesson_number, 'quiz_count': 0, 'questions_answered': 0,
+               'correct_answers': 0, 'pronunciation_score': final_score}
+        upserted = _upsert(cls, [row], ['user_id', 'lesson_number'], lambda new: {
+            'pronunciation_score': new.pronunciation_score,
+        })
+        if not upserted:
+            stats = cls.query.filter_by(user_id=user_id, lesson_number=lesson_number).first()
+            if stats is None:
+                db.session.add(cls(**row))
+            else:
+                stats.pronunciation_score = final_score
+
+    def __repr__(self):
+        return f'<UserLessonStats User {self.user_id} Lesson {self.lesson_number} Correct {self.correct_answers}/{self.questions_answered}>'
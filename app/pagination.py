@@ -0,0 +1,47 @@
+# app/pagination.py
+# 基于游标 (keyset) 的分页：按 (时间, id) 倒序，下一页条件为 "(时间, id) < 上一页最后一行"。
+# 与 OFFSET/COUNT 分页不同，每页都是一次 (user_id, 时间) 复合索引上的范围扫描，翻到多深都一样快，
+# 也不需要统计总数。游标对客户端不透明 (base64)，只用于 "加载更多"。
+#
+# 要求排序列非空 (迁移 f4c2d8a7b915 已回填历史数据中的空时间)。
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}".encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """返回 (timestamp, id)；格式错误时抛出 InvalidCursor。"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        timestamp, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(str(e)) from e
+
+
+def keyset_page(query, timestamp_column, id_column, cursor=None, limit=20, key=None):
+    """
+    对已按用户过滤的 query 取一页 (时间、id 均倒序)。
+    返回 (rows, next_cursor)；没有更多数据时 next_cursor 为 None。
+    key(row) -> (timestamp, id)：query 返回多个实体 (如 (收藏, 词汇) 元组) 时指定如何取排序键。
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(or_(timestamp_column < timestamp,
+                                 and_(timestamp_column == timestamp, id_column < row_id)))
+    rows = query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = key(rows[-1]) if key else (getattr(rows[-1], timestamp_column.key), getattr(rows[-1], id_column.key))
+    return rows, encode_cursor(*last)
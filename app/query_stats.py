@@ -0,0 +1,131 @@
+# app/query_stats.py
+# 每个请求的 SQL 查询统计：在引擎的 before/after_cursor_execute 事件中计数并累计数据库耗时。
+#   - DEBUG 模式 (或 SQL_QUERY_HEADERS=true) 下通过响应头返回：X-DB-Query-Count、X-DB-Query-Time (毫秒)、
+#     Server-Timing (浏览器开发者工具的 Timing 面板可见)；
+#   - 每个请求记录一条 DEBUG 日志，查询数超过 SQL_QUERY_WARN_THRESHOLD 时记录 WARNING (通常是 N+1 查询)；
+#   - count_queries() / assert_query_budget() 供脚本与测试断言某个路由的查询数上限
+#     (见 test/check_query_budget.py)。
+# 计数器按线程保存，后台线程 (评分任务等) 中的查询不会计入请求。
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+
+_local = threading.local()
+
+
+class QueryStats:
+    """一段代码执行期间的查询数与数据库耗时；keep_statements=True 时同时保存 SQL 语句 (用于定位多余的查询)。"""
+    __slots__ = ('count', 'seconds', 'statements')
+
+    def __init__(self, keep_statements=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = [] if keep_statements else None
+
+    @property
+    def milliseconds(self):
+        return self.seconds * 1000.0
+
+    def _record(self, statement, elapsed):
+        self.count += 1
+        self.seconds += elapsed
+        if self.statements is not None:
+            self.statements.append(statement)
+
+
+def _active():
+    return getattr(_local, 'active', ())
+
+
+def _push(stats):
+    _local.active = _active() + (stats,)
+
+
+def _pop(stats):
+    _local.active = tuple(s for s in _active() if s is not stats)
+
+
+@contextmanager
+def count_queries(keep_statements=False):
+    """统计 with 块内 (当前线程) 执行的 SQL：with count_queries() as stats: ...; stats.count"""
+    stats = QueryStats(keep_statements)
+    _push(stats)
+    try:
+        yield stats
+    finally:
+        _pop(stats)
+
+
+def install_query_counter(engine):
+    """在引擎上注册计数事件。没有活动的计数器时只做一次属性查找。"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _active():
+            conn.info.setdefault('query_stats_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('query_stats_started')
+        if not started:
+            return # 计数器在语句执行期间才开始
+        elapsed = time.perf_counter() - started.pop()
+        for stats in _active():
+            stats._record(statement, elapsed)
+
+
+def init_request_query_stats(app, engine):
+    """为每个请求统计查询数，在响应头 (调试模式) 与日志中输出。"""
+    if not app.config.get('SQL_QUERY_STATS', True):
+        return
+    install_query_counter(engine)
+
+    @app.before_request
+    def _start_query_stats():
+        g.query_stats = QueryStats()
+        _push(g.query_stats)
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        _pop(stats)
+        send_headers = app.config.get('SQL_QUERY_HEADERS')
+        if send_headers is None:
+            send_headers = app.debug # 未配置时跟随调试模式 (app.run(debug=True) 在创建 app 之后才设置)
+        if send_headers:
+            response.headers['X-DB-Query-Count'] = str(stats.count)
+            response.headers['X-DB-Query-Time'] = f"{stats.milliseconds:.1f}"
+            response.headers.add('Server-Timing', f'db;dur={stats.milliseconds:.1f};desc="{stats.count} queries"')
+        message = (f"{request.method} {request.path} -> {response.status_code}: "
+                   f"{stats.count} SQL quer{'y' if stats.count == 1 else 'ies'} in {stats.milliseconds:.1f} ms")
+        warn_threshold = app.config.get('SQL_QUERY_WARN_THRESHOLD', 30)
+        if warn_threshold and stats.count > warn_threshold:
+            app.logger.warning(message + f" (more than {warn_threshold}; N+1 query?)")
+        else:
+            app.logger.debug(message)
+        return response
+
+    @app.teardown_request
+    def _discard_query_stats(exc):
+        # 视图抛出异常时 after_request 不会执行
+        stats = g.pop('query_stats', None)
+        if stats is not None:
+            _pop(stats)
+
+
+def assert_query_budget(client, path, max_queries, method='GET', **kwargs):
+    """
+    用 Flask 测试客户端请求 path，断言执行的 SQL 不超过 max_queries 条，返回 (response, stats)。
+    超出时 AssertionError 中列出全部语句。kwargs 原样传给 client.open (如 json=..., query_string=...)。
+    """
+    with count_queries(keep_statements=True) as stats:
+        response = client.open(path, method=method, **kwargs)
+    if stats.count > max_queries:
+        statements = '\n'.join(f"  {n}. {' '.join(statement.split())}" for n, statement in enumerate(stats.statements, 1))
+        raise AssertionError(f"{method} {path} ran {stats.count} SQL queries (budget {max_queries}):\n{statements}")
+    return response, stats
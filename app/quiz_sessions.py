@@ -0,0 +1,116 @@
+# app/quiz_sessions.py
+# 服务端测验会话：/api/quiz 生成题目时把 (题目 id、正确答案、题型、课程) 保存为一条会话记录，
+# 只把 quiz_id 和题面发给浏览器。提交时按 quiz_id 取回记录在内存中评分：
+# 不再二次查询 Vocabulary，正确答案不会提前泄露给客户端，同一测验只能提交一次。
+#
+# 记录以小 JSON 文件保存在 instance/quiz_sessions/ 下，多个 Web worker 进程共享；
+# "只能提交一次" 依靠 os.rename 的原子性：并发提交同一测验时只有一个请求能认领成功。
+import os
+import json
+import time
+import uuid
+import threading
+
+from flask import current_app
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class QuizSessionStore:
+    """基于文件的测验会话存储。所有方法线程/进程安全。"""
+
+    PURGE_INTERVAL = 300 # 秒，两次清理过期会话之间的最小间隔
+
+    def __init__(self, store_dir, ttl_seconds):
+        self.store_dir = store_dir
+        self.ttl_seconds = ttl_seconds
+        self._last_purge = 0.0
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, quiz_id):
+        return os.path.join(self.store_dir, f"{quiz_id}.json")
+
+    @staticmethod
+    def _valid_id(quiz_id):
+        return isinstance(quiz_id, str) and len(quiz_id) == 32 and all(c in '0123456789abcdef' for c in quiz_id)
+
+    def _write(self, path, record):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def create(self, record):
+        """保存会话记录，返回新的 quiz_id。"""
+        quiz_id = uuid.uuid4().hex
+        record = dict(record, created_at=time.time())
+        self._write(self._path(quiz_id), record)
+        self._maybe_purge()
+        return quiz_id
+
+    def claim(self, quiz_id, user_id):
+        """
+        认领 (取出并删除) 一条会话记录，之后同一 quiz_id 无法再次认领。
+        返回 (record, error)：error 为 'not_found' (不存在、已提交或已过期) 或 'forbidden' (不属于该用户)。
+        """
+        if not self._valid_id(quiz_id):
+            return None, 'not_found'
+        path = self._path(quiz_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                owner = json.load(f).get('user_id')
+        except (OSError, ValueError):
+            return None, 'not_found'
+        if owner != user_id:
+            return None, 'forbidden'
+        claimed_path = f"{path}.claimed.{os.getpid()}.{threading.get_ident()}"
+        try:
+            os.rename(path, claimed_path) # 原子操作：并发认领时只有一个成功
+        except OSError:
+            return None, 'not_found'
+        try:
+            with open(claimed_path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        finally:
+            try: os.remove(claimed_path)
+            except OSError: pass
+        if time.time() - record.get('created_at', 0) > self.ttl_seconds:
+            return None, 'not_found'
+        return record, None
+
+    def release(self, quiz_id, record):
+        """提交处理失败时放回记录，允许用户重试。"""
+        try:
+            self._write(self._path(quiz_id), record)
+        except OSError as e:
+            current_app.logger.warning(f"Could not restore quiz session {quiz_id}: {e}")
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        removed = 0
+        for name in os.listdir(self.store_dir):
+            path = os.path.join(self.store_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            current_app.logger.info(f"Purged {removed} expired quiz session(s).")
+
+
+def get_quiz_session_store():
+    """返回当前应用的测验会话存储。"""
+    global _store
+    store_dir = current_app.config.get('QUIZ_SESSION_DIR', 'quiz_sessions')
+    if not os.path.isabs(store_dir):
+        store_dir = os.path.join(current_app.instance_path, store_dir)
+    with _store_lock:
+        if _store is None or _store.store_dir != store_dir:
+            _store = QuizSessionStore(store_dir, current_app.config.get('QUIZ_SESSION_TTL', 2 * 3600))
+        return _store
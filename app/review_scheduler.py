@@ -0,0 +1,85 @@
+# app/review_scheduler.py
+# 错题复习的间隔重复调度 (SM-2)。
+#
+# - 测验答错的词汇通过 ReviewSchedule.record_lapses 进入复习计划 (立即到期)；
+# - /api/review (GET) 取最早到期的 N 个项目：按 (user_id, due_at) 索引范围扫描，不对用户全部记录排序；
+#   错题分类为 "暂不复习" 的词汇不出现 (计划保留，改回其他分类后照常到期)；
+# - /api/review (POST) 提交一组评分 (0-5)：一次 IN 查询读出计划行，内存中计算 SM-2，再一次批量 UPDATE。
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from . import db
+from .models import ReviewSchedule, Vocabulary, WrongAnswer
+
+MIN_EASE = 1.3
+MAX_GRADE = 5
+PASSING_GRADE = 3 # 评分 >= 3 视为记住
+SUSPENDED_CATEGORY = '暂不复习' # 用户在错题本中设为此分类的词汇暂停复习
+
+
+def sm2_next(ease_factor, interval_days, repetitions, grade):
+    """
+    SM-2 算法：根据本次评分 (0-5) 计算新的 (ease_factor, interval_days, repetitions)。
+    评分 < 3：重新开始，1 天后复习；否则间隔依次为 1 天、6 天、上次间隔 × EF。
+    """
+    if grade < PASSING_GRADE:
+        repetitions = 0
+        interval_days = 1
+    else:
+        if repetitions == 0:
+            interval_days = 1
+        elif repetitions == 1:
+            interval_days = 6
+        else:
+            interval_days = round(interval_days * ease_factor, 2)
+        repetitions += 1
+    quality_gap = MAX_GRADE - grade
+    ease_factor = max(MIN_EASE, ease_factor + (0.1 - quality_gap * (0.08 + quality_gap * 0.02)))
+    return round(ease_factor, 4), interval_days, repetitions
+
+
+def due_reviews(user_id, limit, now=None):
+    """返回 (最早到期的至多 limit 行 (计划列 + 词汇列), 到期总数)。"""
+    now = now or datetime.utcnow()
+    suspended = db.session.query(WrongAnswer.id).filter(
+        WrongAnswer.user_id == ReviewSchedule.user_id, WrongAnswer.vocabulary_id == ReviewSchedule.vocabulary_id,
+        WrongAnswer.category == SUSPENDED_CATEGORY).exists() # 命中 (user_id, vocabulary_id) 唯一索引
+    due_filter = (ReviewSchedule.user_id == user_id, ReviewSchedule.due_at <= now, ~suspended)
+    rows = db.session.query(
+        ReviewSchedule.vocabulary_id, ReviewSchedule.due_at, ReviewSchedule.ease_factor,
+        ReviewSchedule.interval_days, ReviewSchedule.repetitions, ReviewSchedule.lapses,
+        Vocabulary.lesson_number, Vocabulary.english_word, Vocabulary.part_of_speech, Vocabulary.chinese_translation,
+    ).join(Vocabulary, Vocabulary.id == ReviewSchedule.vocabulary_id)\
+     .filter(*due_filter).order_by(ReviewSchedule.due_at).limit(limit).all()
+    due_count = db.session.query(db.func.count(ReviewSchedule.id)).filter(*due_filter).scalar()
+    return rows, due_count
+
+
+def apply_reviews(user_id, grades, now=None):
+    """
+    按 {vocabulary_id: grade} 更新复习计划，全部行用一条 executemany UPDATE 写入当前事务 (调用者提交)。
+    返回 (已更新项目的新计划列表, 不在计划中的 vocabulary_id 列表)。
+    """
+    now = now or datetime.utcnow()
+    schedules = db.session.query(
+        ReviewSchedule.id, ReviewSchedule.vocabulary_id, ReviewSchedule.ease_factor,
+        ReviewSchedule.interval_days, ReviewSchedule.repetitions, ReviewSchedule.lapses,
+    ).filter(ReviewSchedule.user_id == user_id, ReviewSchedule.vocabulary_id.in_(list(grades))).all()
+
+    updates, results = [], []
+    for schedule_id, vocab_id, ease_factor, interval_days, repetitions, lapses in schedules:
+        grade = grades[vocab_id]
+        ease_factor, interval_days, repetitions = sm2_next(ease_factor, interval_days, repetitions, grade)
+        due_at = now + timedelta(days=interval_days)
+        updates.append({
+            'id': schedule_id, 'ease_factor': ease_factor, 'interval_days': interval_days,
+            'repetitions': repetitions, 'lapses': lapses + (1 if grade < PASSING_GRADE else 0),
+            'due_at': due_at, 'last_reviewed_at': now,
+        })
+        results.append({'vocabulary_id': vocab_id, 'grade': grade, 'due_at': due_at.isoformat() + 'Z',
+                        'interval_days': interval_days, 'ease_factor': ease_factor, 'repetitions': repetitions})
+    if updates:
+        db.session.execute(update(ReviewSchedule), updates) # 按主键批量更新
+    found = {item['vocabulary_id'] for item in results}
+    return results, [vocab_id for vocab_id in grades if vocab_id not in found]
@@ -2,7 +2,8 @@
 
 import os
 import random
-from datetime import datetime
+import logging
+from datetime import datetime, timedelta, timezone
 from flask import (current_app, render_template, request, jsonify, Blueprint,
                    redirect, url_for, session, flash, abort, send_from_directory)
 # --- 修改这里的导入 ---
@@ -12,16 +13,30 @@ from urllib.parse import urlsplit
 
 # --- Import from local package ---
 from . import db
-from .models import Vocabulary, Lesson, User, QuizAttempt, WrongAnswer, UserFavoriteVocabulary, PronunciationScore
+from .models import Vocabulary, Lesson, User, QuizAttempt, WrongAnswer, UserFavoriteVocabulary, PronunciationScore, ReviewSchedule, SyncedAttempt, UserStats, UserLessonStats
 from .forms import LoginForm, RegistrationForm
 from .pdf_parser import process_nce_pdf
 from .decorators import admin_required, root_admin_required # <-- 从这里只导入你自定义的装饰器
-from .tts_utils import generate_and_save_audio_if_not_exists, get_audio_filename
+from .tts_utils import generate_and_save_audio_if_not_exists, get_audio_filename, SynthesisInProgress
 from flask import jsonify, request, abort, current_app, flash, redirect, url_for
 from flask_login import current_user, login_required
 from sqlalchemy.exc import IntegrityError # <--- 导入 IntegrityError
 from werkzeug.utils import secure_filename # 用于基本的安全检查（虽然我们自己生成文件名）
-from .scoring_utils import evaluate_audio_recording # 导入主评估函数
+from .transcription_cache import get_transcription_cache
+from .audio_transcode import choose_variant, mimetype_for, schedule_transcode, variant_extensions # 压缩音频变体
+from .media_index import get_media_index, split_source_and_variants # 内存中的媒体文件索引
+from .media_serving import media_etag, send_media, send_media_from_directory # ETag/Range/304/Cache-Control
+from werkzeug.exceptions import HTTPException, NotFound
+from .vocab_index import get_vocab_index # 内存词汇索引 (测验抽题)
+from .quiz_sessions import get_quiz_session_store # 服务端测验会话
+from .answer_matching import answer_language, normalize as normalize_answer # 可接受答案集合 (预先构建于词汇索引)
+from .distractor_index import get_distractor_index # 选择题干扰项
+from .vocab_packs import MANIFEST_FILENAME, ensure_vocab_packs, build_vocab_packs, is_pack_filename, vocab_pack_dir # 静态词汇包
+from .weighted_sampling import weak_word_weights # 偏向薄弱词的加权抽题
+from .review_scheduler import due_reviews, apply_reviews, MAX_GRADE # 错题间隔重复复习
+from .scoring_jobs import enqueue_scoring_job, get_job_status, JobQueueFull, JOB_QUEUED # 异步评分任务
+from .pagination import InvalidCursor, keyset_page # 游标分页 (加载更多)
+from .favorites import favorite_flags, favorite_ids, favorites_changed # 收藏状态批量读取 (按用户缓存)
 
 # --- Define allowed categories (can be moved to config.py later) ---
 ALLOWED_WRONG_ANSWER_CATEGORIES = ["重点复习", "易混淆", "拼写困难", "用法模糊", "暂不复习"]
@@ -73,53 +88,42 @@ def view_lesson(lesson_number):
     current_app.logger.info(f"Request received for lesson {lesson_number} by user {current_user.id}")
     lesson_data = Lesson.query.filter_by(lesson_number=lesson_number, source_book=2).first_or_404()
 
-    # --- 查找预生成音频 (逻辑保持不变，使用 PREGENERATED_AUDIO_FOLDER) ---
+    # --- 查找预生成音频与用户录音：查内存中的媒体索引，不访问文件系统 ---
+    media_index = get_media_index()
+    variant_exts = variant_extensions()
+
     pregen_audio_url = None
-    audio_folder = current_app.config.get('PREGENERATED_AUDIO_FOLDER')
-    filename_template = current_app.config.get('PREGENERATED_AUDIO_FILENAME_TEMPLATE', 'lesson_{lesson_number}.{ext}')
-    possible_extensions = current_app.config.get('PREGENERATED_AUDIO_EXTENSIONS', ['.wav'])
-    if audio_folder:
-        for ext in possible_extensions:
-            clean_ext = ext.lstrip('.')
-            try:
-                filename = filename_template.format(lesson_number=lesson_number, ext=clean_ext)
-                absolute_filepath = os.path.join(audio_folder, filename)
-                current_app.logger.debug(f"Checking for pre-generated audio at: {absolute_filepath}")
-                if os.path.exists(absolute_filepath):
-                    pregen_audio_url = url_for('get_pregenerated_audio', lesson_number=lesson_number, filename=filename)
-                    current_app.logger.info(f"Found pre-generated audio file: {filename}, URL: {pregen_audio_url}")
-                    break
-            except KeyError as e: current_app.logger.error(f"Filename template error: {e}"); break
-            except Exception as e: current_app.logger.error(f"Error check pre-gen audio '{filename}': {e}", exc_info=True)
+    pregen_audio_sources = [] # [(url, mimetype)]：压缩变体在前，浏览器按 <source> 顺序选第一个能播放的，wav 兜底
+    if current_app.config.get('PREGENERATED_AUDIO_FOLDER'):
+        pregen_entries = media_index.pregenerated(lesson_number)
+        source, variants = split_source_and_variants(pregen_entries, variant_exts)
+        if source:
+            # URL 带上文件版本号 (ETag)：内容不变时浏览器可长期缓存，重新生成后 URL 随之改变
+            for ext in variants:
+                entry = pregen_entries[ext]
+                variant_filename = os.path.basename(entry.path)
+                pregen_audio_sources.append((url_for('get_pregenerated_audio', lesson_number=lesson_number, filename=variant_filename,
+                                                     v=media_etag(entry.path, entry.size, entry.mtime)),
+                                             mimetype_for(variant_filename)))
+            filename = os.path.basename(source.path)
+            pregen_audio_url = url_for('get_pregenerated_audio', lesson_number=lesson_number, filename=filename,
+                                       v=media_etag(source.path, source.size, source.mtime))
+            pregen_audio_sources.append((pregen_audio_url, mimetype_for(filename)))
+            current_app.logger.debug(f"Found pre-generated audio file: {filename} (+{len(variants)} variant(s)), URL: {pregen_audio_url}")
+            if source.format == '.wav' and len(variants) < len(variant_exts):
+                schedule_transcode(source.path) # 缺少变体时在后台补齐，本次请求不等待
     else: current_app.logger.warning("PREGENERATED_AUDIO_FOLDER not configured.")
-    # --- 结束查找预生成音频 ---
 
-    # --- 修改：检查用户之前的录音（匹配新的目录结构） ---
     user_recording_url = None
-    # 1. 获取基础录音目录
-    base_recordings_folder = current_app.config.get('USER_RECORDINGS_BASE_FOLDER')
-    if base_recordings_folder:
-        # 2. 构建当前用户的专属子目录路径
-        user_specific_folder = os.path.join(base_recordings_folder, f"user_{current_user.id}")
-        current_app.logger.debug(f"Checking for user recording in: {user_specific_folder}")
-
-        # 3. 在用户专属子目录中查找文件
-        user_rec_extensions = ['.webm', '.ogg', '.wav'] # 与上传/获取逻辑一致
-        for ext in user_rec_extensions:
-            # 4. 文件名只包含课程号和扩展名
-            filename = f"lesson_{lesson_number}{ext}"
-            filepath = os.path.join(user_specific_folder, filename) # 检查的绝对路径
-
-            current_app.logger.debug(f"Checking for user recording file at: {filepath}")
-            if os.path.exists(filepath):
-                # 5. 如果文件存在，生成指向 get_user_recording 路由的 URL
-                #    该路由知道如何根据 user_id 和 lesson_number 找到正确的子目录和文件
-                user_recording_url = url_for('get_user_recording', user_id=current_user.id, lesson_number=lesson_number)
-                current_app.logger.info(f"Found previous user recording file: {filename} in user's folder. URL: {user_recording_url}")
-                break # 找到一个就停止
+    if current_app.config.get('USER_RECORDINGS_BASE_FOLDER'):
+        source, _ = split_source_and_variants(media_index.recordings(current_user.id, lesson_number), variant_exts)
+        if source:
+            # 指向 get_user_recording 路由，由它根据 user_id 和 lesson_number 选择具体文件
+            user_recording_url = url_for('get_user_recording', user_id=current_user.id, lesson_number=lesson_number)
+            current_app.logger.debug(f"Found previous user recording file: {os.path.basename(source.path)}. URL: {user_recording_url}")
     else:
         current_app.logger.warning("USER_RECORDINGS_BASE_FOLDER not configured.")
-    # --- 结束修改 ---
+    # --- 结束查找音频 ---
 
     # --- 新增：查找用户之前的评分记录 ---
     previous_score_data = None
@@ -144,6 +148,7 @@ def view_lesson(lesson_number):
                            lesson=lesson_data,
                            current_time=now,
                            audio_url=pregen_audio_url,
+                           audio_sources=pregen_audio_sources,
                            user_recording_audio_url=user_recording_url,
                            previous_score=previous_score_data)  # <--- 传递评分数据
 
@@ -184,12 +189,15 @@ def get_pregenerated_audio(lesson_number, filename):
 
     current_app.logger.debug(f"Attempting to serve file: {safe_filename} from folder: {audio_folder}")
     try:
-        # 使用 send_from_directory 发送文件，它会处理路径拼接和安全问题
-        # 需要提供目录的绝对路径
-        return send_from_directory(audio_folder, safe_filename, as_attachment=False)
-    except FileNotFoundError:
+        # 与 send_from_directory 相同的路径安全检查；支持 Range/ETag/304。
+        # URL 带当前版本号 (?v=，由课程页生成) 时按 immutable 长期缓存
+        return send_media_from_directory(audio_folder, safe_filename, mimetype=mimetype_for(safe_filename),
+                                         version=request.args.get('v'))
+    except (FileNotFoundError, NotFound):
          current_app.logger.error(f"File not found: {safe_filename} in {audio_folder}")
          return jsonify({"error": "Audio file not found"}), 404
+    except HTTPException:
+         raise # 例如 416 Range Not Satisfiable
     except Exception as e:
          current_app.logger.error(f"Error sending file {safe_filename}: {e}", exc_info=True)
          return jsonify({"error": "Error serving file"}), 500
@@ -274,38 +282,81 @@ def register():
 
 # === Learning Features Routes ===
 
+def _list_page_args():
+    """
+    读取 "加载更多" 列表的查询参数：cursor (上一页返回的 next_cursor)、limit、start (已显示的行数，用于序号)。
+    limit 限制在 LIST_MAX_PAGE_SIZE 以内。cursor 格式错误时由 keyset_page 抛出 InvalidCursor。
+    """
+    default_limit = current_app.config.get('LIST_PAGE_SIZE', 50)
+    limit = request.args.get('limit', default_limit, type=int) or default_limit
+    limit = max(1, min(limit, current_app.config.get('LIST_MAX_PAGE_SIZE', 200)))
+    start = max(0, request.args.get('start', 0, type=int) or 0)
+    return request.args.get('cursor') or None, limit, start
+
+
+def _history_page(cursor, limit):
+    return keyset_page(QuizAttempt.query.filter_by(user_id=current_user.id),
+                       QuizAttempt.timestamp, QuizAttempt.id, cursor, limit)
+
+
 @current_app.route('/history')
 @login_required
 def history():
-    """Displays the user's quiz attempt history (paginated)."""
-    page = request.args.get('page', 1, type=int)
-    per_page = current_app.config.get('POSTS_PER_PAGE', 10)
-    attempts = None
+    """Displays the user's quiz attempt history (first page; more rows via /api/history)."""
+    attempts, next_cursor = [], None
+    stats, lesson_stats = None, []
     try:
-        attempts = QuizAttempt.query.filter_by(user_id=current_user.id)\
-                                .order_by(QuizAttempt.timestamp.desc())\
-                                .paginate(page=page, per_page=per_page, error_out=False)
+        attempts, next_cursor = _history_page(None, current_app.config.get('LIST_PAGE_SIZE', 50))
+        # 预聚合统计：一行汇总 + 每课一行 (按唯一约束索引读取)
+        stats = UserStats.query.filter_by(user_id=current_user.id).first()
+        lesson_stats = UserLessonStats.query.filter_by(user_id=current_user.id)\
+                                            .order_by(UserLessonStats.lesson_number).all()
     except Exception as e:
          current_app.logger.error(f"Error fetching history for user {current_user.id}: {e}", exc_info=True)
          flash('无法加载测试历史记录。(Failed to load quiz history.)', 'danger')
 
     now = datetime.utcnow()
-    return render_template('history.html', title='测试历史 (Quiz History)', attempts=attempts, current_time=now)
+    return render_template('history.html', title='测试历史 (Quiz History)', attempts=attempts,
+                           next_cursor=next_cursor, start=0, stats=stats, lesson_stats=lesson_stats,
+                           current_time=now)
+
+
+@current_app.route('/api/history')
+@login_required
+def history_json():
+    """测试历史的下一页 (游标分页)。返回 items、渲染好的表格行 html 和 next_cursor (没有更多时为 null)。"""
+    cursor, limit, start = _list_page_args()
+    try:
+        attempts, next_cursor = _history_page(cursor, limit)
+    except InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+    items = [{'id': a.id, 'timestamp': a.timestamp.isoformat() if a.timestamp else None,
+              'lessons_attempted': a.lessons_attempted, 'score': a.score,
+              'total_questions': a.total_questions, 'quiz_type': a.quiz_type} for a in attempts]
+    html = render_template('partials/history_rows.html', attempts=attempts, start=start)
+    return jsonify({'items': items, 'html': html, 'next_cursor': next_cursor})
+
+
+def _wrong_answers_page(cursor, limit):
+    """返回 (错题记录, next_cursor, 本页中已收藏的词汇 id 集合)。"""
+    query = WrongAnswer.query.filter_by(user_id=current_user.id).options(joinedload(WrongAnswer.vocabulary_item))
+    records, next_cursor = keyset_page(query, WrongAnswer.timestamp_last_wrong, WrongAnswer.id, cursor, limit)
+    flags = favorite_flags(current_user.id, [record.vocabulary_id for record in records])
+    favorited_ids = {vocab_id for vocab_id, is_favorite in flags.items() if is_favorite}
+    return records, next_cursor, favorited_ids
 
 
 @current_app.route('/wrong_answers')
 @login_required
 def wrong_answers():
-    """Displays the user's list of wrong answers (enhanced)."""
+    """Displays the user's list of wrong answers (first page; more rows via /api/wrong_answers)."""
     wrong_answer_records = []
     favorited_ids = set()
+    next_cursor = None
     try:
-        wrong_answer_records = WrongAnswer.query.filter_by(user_id=current_user.id)\
-                                            .options(joinedload(WrongAnswer.vocabulary_item))\
-                                            .order_by(WrongAnswer.timestamp_last_wrong.desc()).all()
-        # Get IDs of favorited vocab for the current user to pass to template
-        favorited_ids = {fav.vocabulary_id for fav in UserFavoriteVocabulary.query.filter_by(user_id=current_user.id).with_entities(UserFavoriteVocabulary.vocabulary_id).all()}
-        current_app.logger.debug(f"User {current_user.id} favorited vocab IDs: {favorited_ids}")
+        wrong_answer_records, next_cursor, favorited_ids = _wrong_answers_page(
+            None, current_app.config.get('LIST_PAGE_SIZE', 50))
+        current_app.logger.debug(f"User {current_user.id} favorited vocab IDs on first page: {favorited_ids}")
     except Exception as e:
         current_app.logger.error(f"Error fetching wrong answers for user {current_user.id}: {e}", exc_info=True)
         flash('加载错题本时发生错误，请稍后重试。(An error occurred loading wrong answers.)', 'danger')
@@ -318,24 +369,49 @@ def wrong_answers():
                            wrong_answers=wrong_answer_records,
                            allowed_categories=ALLOWED_WRONG_ANSWER_CATEGORIES, # Defined globally in this file
                            favorited_ids=favorited_ids, # Pass the set of favorited IDs
+                           next_cursor=next_cursor,
                            current_time=now)
 
 
+@current_app.route('/api/wrong_answers')
+@login_required
+def wrong_answers_json():
+    """错题本的下一页 (游标分页，按最后答错时间倒序)。"""
+    cursor, limit, _ = _list_page_args()
+    try:
+        records, next_cursor, favorited_ids = _wrong_answers_page(cursor, limit)
+    except InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+    items = [{'id': r.id, 'vocabulary_id': r.vocabulary_id, 'english_word': r.vocabulary_item.english_word,
+              'chinese_translation': r.vocabulary_item.chinese_translation,
+              'lesson_number': r.vocabulary_item.lesson_number, 'incorrect_count': r.incorrect_count,
+              'timestamp_last_wrong': r.timestamp_last_wrong.isoformat() if r.timestamp_last_wrong else None,
+              'is_marked': r.is_marked, 'category': r.category,
+              'is_favorite': r.vocabulary_id in favorited_ids} for r in records]
+    html = render_template('partials/wrong_answer_rows.html', wrong_answers=records,
+                           allowed_categories=ALLOWED_WRONG_ANSWER_CATEGORIES, favorited_ids=favorited_ids)
+    return jsonify({'items': items, 'html': html, 'next_cursor': next_cursor})
+
+
+def _favorites_page(cursor, limit):
+    """返回 (词汇列表, next_cursor)，按收藏时间倒序；游标取自收藏记录的 (timestamp, id)。"""
+    query = db.session.query(UserFavoriteVocabulary, Vocabulary)\
+                      .join(Vocabulary, Vocabulary.id == UserFavoriteVocabulary.vocabulary_id)\
+                      .filter(UserFavoriteVocabulary.user_id == current_user.id)
+    rows, next_cursor = keyset_page(query, UserFavoriteVocabulary.timestamp, UserFavoriteVocabulary.id,
+                                    cursor, limit, key=lambda row: (row[0].timestamp, row[0].id))
+    return [vocab for _, vocab in rows], next_cursor
+
+
 # === NEW: Favorites Page Route ===
 @current_app.route('/favorites')
 @login_required
 def view_favorites():
-    """Displays the list of vocabulary items favorited by the current user."""
+    """Displays the vocabulary items favorited by the current user (first page; more via /api/favorites)."""
     favorite_vocab_items = []
+    next_cursor = None
     try:
-        # Use the relationship to get Vocabulary items ordered by when they were favorited
-        favorite_vocab_items = current_user.favorite_vocabularies.join(
-                UserFavoriteVocabulary, Vocabulary.id == UserFavoriteVocabulary.vocabulary_id
-            ).filter(
-                UserFavoriteVocabulary.user_id == current_user.id
-            ).order_by(
-                UserFavoriteVocabulary.timestamp.desc()
-            ).all()
+        favorite_vocab_items, next_cursor = _favorites_page(None, current_app.config.get('LIST_PAGE_SIZE', 50))
         current_app.logger.debug(f"Fetched {len(favorite_vocab_items)} favorites for user {current_user.id}")
     except Exception as e:
         current_app.logger.error(f"Error fetching favorites for user {current_user.id}: {e}", exc_info=True)
@@ -345,15 +421,52 @@ def view_favorites():
     return render_template('favorites.html',
                            title='我的收藏 (My Favorites)',
                            favorites=favorite_vocab_items,
+                           next_cursor=next_cursor,
                            current_time=now)
+
+
+@current_app.route('/api/favorites')
+@login_required
+def favorites_json():
+    """收藏列表的下一页 (游标分页，按收藏时间倒序)。"""
+    cursor, limit, _ = _list_page_args()
+    try:
+        vocab_items, next_cursor = _favorites_page(cursor, limit)
+    except InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+    items = [{'id': v.id, 'english_word': v.english_word, 'chinese_translation': v.chinese_translation,
+              'part_of_speech': v.part_of_speech, 'lesson_number': v.lesson_number} for v in vocab_items]
+    html = render_template('partials/favorite_items.html', favorites=vocab_items)
+    return jsonify({'items': items, 'html': html, 'next_cursor': next_cursor})
 # === End Favorites Page Route ===
 
 
+# === Static Vocabulary Packs (本地组卷) ===
+
+@current_app.route('/vocab-packs/<filename>')
+def serve_vocab_pack(filename):
+    """
+    manifest.json: 当前各课词汇包的文件名 (no-cache，用 ETag 重新验证；词汇已修改时先重新构建)。
+    lesson-<课号>.<内容哈希>.json: 一课的词汇包，内容不变文件名不变，immutable 长期缓存。
+    """
+    if filename == MANIFEST_FILENAME:
+        ensure_vocab_packs()
+        return send_media_from_directory(vocab_pack_dir(), filename, mimetype='application/json')
+    if not is_pack_filename(filename):
+        abort(404)
+    return send_media_from_directory(vocab_pack_dir(), filename, mimetype='application/json', immutable=True)
+
+
 # === API Routes ===
 
 @current_app.route('/api/quiz', methods=['GET'])
 def get_quiz():
-    """API endpoint to generate quiz questions."""
+    """
+    API endpoint to generate quiz questions.
+    type: cn_to_en / en_to_cn (fill in the answer) or choice (English word, pick the Chinese meaning from 4 options).
+    bias: 0-1, for logged-in users weights the draw toward weak words (wrong answers, favorites); 0 = uniform.
+    seed: optional integer making the draw (and choice order) deterministic.
+    """
     # ... (Keep existing get_quiz logic as before) ...
     try:
         lessons_str = request.args.get('lessons')
@@ -366,230 +479,360 @@ def get_quiz():
              num_questions = int(num_questions_str)
              if num_questions <= 0: num_questions = 10
         except ValueError: return jsonify({"error": "Invalid 'lessons' or 'count' format."}), 400
+        try:
+            bias = min(1.0, max(0.0, float(request.args.get('bias', current_app.config.get('QUIZ_DEFAULT_BIAS', 0.0)))))
+            seed = request.args.get('seed')
+            rng = random.Random(int(seed)) if seed not in (None, '') else random.Random()
+        except ValueError: return jsonify({"error": "Invalid 'bias' or 'seed' format."}), 400
+
+        # 直接从内存词汇索引中抽题，不查询数据库、不构造 ORM 对象
+        if quiz_type not in ('cn_to_en', 'en_to_cn', 'choice'): return jsonify({"error": "Invalid 'type' parameter."}), 400
+        if bias > 0 and current_user.is_authenticated:
+            # 一条聚合查询取出薄弱词权重，其余词权重为 1
+            selected_vocab = get_vocab_index().weighted_sample(lesson_numbers, num_questions,
+                                                               weak_word_weights(current_user.id, bias), rng=rng)
+        else:
+            selected_vocab = get_vocab_index().sample(lesson_numbers, num_questions, rng=rng)
+        if not selected_vocab: return jsonify({"error": "No vocabulary found for selected lessons"}), 404
 
-        all_vocab = Vocabulary.query.filter(Vocabulary.lesson_number.in_(lesson_numbers)).all()
-        if not all_vocab: return jsonify({"error": "No vocabulary found for selected lessons"}), 404
-
-        num_questions = min(num_questions, len(all_vocab))
-        selected_vocab = random.sample(all_vocab, num_questions)
-
+        vocab_index = get_vocab_index()
+        distractors = get_distractor_index() if quiz_type == 'choice' else None
         quiz_questions = []
+        session_questions = [] # 每题: [vocab_id, 题面, 词性, 正确答案]
         for item in selected_vocab:
             question = item.chinese_translation if quiz_type == 'cn_to_en' else item.english_word
-            answer = item.english_word if quiz_type == 'cn_to_en' else item.chinese_translation
-            quiz_questions.append({
+            answer = (item.english_word if quiz_type == 'cn_to_en' else item.chinese_translation) or ''
+            public_question = {
                 "id": item.id, "lesson": item.lesson_number, "question": question,
-                "part_of_speech": item.part_of_speech, "correct_answer": answer
+                "part_of_speech": item.part_of_speech
+            }
+            if distractors is not None:
+                # 正确释义 + 3 个预先算好的相似干扰项，顺序随机
+                choices = [answer] + distractors.pick(vocab_index, item, lambda entry: entry.chinese_translation, rng=rng)
+                rng.shuffle(choices)
+                public_question["choices"] = choices
+            quiz_questions.append(public_question)
+            session_questions.append([item.id, question, item.part_of_speech, answer])
+
+        # 正确答案只保存在服务端会话中，客户端提交时带回 quiz_id。
+        # 提交需要登录：未登录时不创建会话 (无法被提交，只会占用磁盘)，quiz_id 为 null
+        quiz_id = None
+        if current_user.is_authenticated:
+            quiz_id = get_quiz_session_store().create({
+                'user_id': current_user.id,
+                'quiz_type': quiz_type,
+                'lessons': sorted(set(lesson_numbers)),
+                'questions': session_questions,
             })
-        return jsonify(quiz_questions)
+        return jsonify({"quiz_id": quiz_id, "quiz_type": quiz_type, "questions": quiz_questions})
     except Exception as e:
         current_app.logger.error(f"Error in /api/quiz generation: {e}", exc_info=True)
         return jsonify({"error": "Internal server error generating quiz."}), 500
 
 
+def _valid_client_key(key):
+    """客户端生成的幂等键 (/api/sync 与本地组卷提交共用)：8-64 位字母、数字、- 或 _。"""
+    return isinstance(key, str) and 8 <= len(key) <= 64 and all(c.isalnum() or c in '-_' for c in key)
+
+
+def _local_quiz_record(quiz_context):
+    """
+    浏览器用静态词汇包组卷 (只支持填空题) 时，按提交的 question_ids 从词汇索引重建测验记录。
+    返回 (record, error)。正确答案以服务端索引为准，不信任客户端。
+    """
+    quiz_type = quiz_context.get('quiz_type')
+    if quiz_type not in ('cn_to_en', 'en_to_cn'):
+        return None, 'Invalid quiz_type for a local quiz.'
+    question_ids = quiz_context.get('question_ids')
+    max_questions = current_app.config.get('QUIZ_LOCAL_MAX_QUESTIONS', 100)
+    if not isinstance(question_ids, list) or not question_ids or len(question_ids) > max_questions:
+        return None, f'A local quiz needs 1-{max_questions} question_ids.'
+    try:
+        lessons = sorted(set(int(n) for n in quiz_context.get('lesson_ids') or []))
+        question_ids = list(dict.fromkeys(int(vocab_id) for vocab_id in question_ids))
+    except (TypeError, ValueError):
+        return None, 'Invalid lesson_ids or question_ids.'
+    vocab_index = get_vocab_index()
+    questions = []
+    for vocab_id in question_ids:
+        item = vocab_index.get(vocab_id)
+        if item is None:
+            continue # 组卷后被删除的词不计分
+        question = item.chinese_translation if quiz_type == 'cn_to_en' else item.english_word
+        answer = (item.english_word if quiz_type == 'cn_to_en' else item.chinese_translation) or ''
+        questions.append([item.id, question, item.part_of_speech, answer])
+    if not questions:
+        return None, 'None of the submitted questions exist any more.'
+    return {'quiz_type': quiz_type, 'lessons': lessons, 'questions': questions}, None
+
+
+def _score_quiz_questions(quiz_type, questions, user_answers, vocab_index, debug_label=None):
+    """
+    按题目记录 [vocab_id, 题面, 词性, 正确答案] 在内存中评分。
+    返回 (得分, 答错的 vocab_id 列表, 答错详情, 拼写容错判对的题目)；debug_label 非空时逐题记录 DEBUG 日志。
+    """
+    score = 0
+    wrong_ids, wrong_details = [], []
+    typo_accepted = [] # 英文拼写差一个字母仍判为正确的题目 (ANSWER_FUZZY_ENGLISH)
+    language = answer_language(quiz_type)
+    for vocab_id, question, part_of_speech, correct_answer in (q[:4] for q in questions):
+        user_answer = user_answers.get(str(vocab_id), '')
+        if not isinstance(user_answer, str):
+            user_answer = ''
+        if quiz_type == 'choice':
+            # 选择题：选中的选项必须就是正确释义 (干扰项可能与正确释义有相同的义项，不能按义项匹配)
+            chosen = normalize_answer(user_answer)
+            match = 'exact' if chosen and chosen == normalize_answer(correct_answer) else None
+        else:
+            match = vocab_index.answer_key(vocab_id, language, correct_answer).match(user_answer)
+        if debug_label:
+            current_app.logger.debug(f"{debug_label}: vocab {vocab_id} answer={user_answer!r} expected={correct_answer!r} match={match}")
+        if match:
+            score += 1
+            if match == 'fuzzy':
+                typo_accepted.append({'vocab_id': vocab_id, 'user_answer': user_answer, 'correct_answer': correct_answer})
+        else:
+            wrong_ids.append(vocab_id)
+            wrong_details.append({
+                'vocab_id': vocab_id,
+                'question': question,
+                'part_of_speech': part_of_speech,
+                'user_answer': user_answer, # Keep original answer for display
+                'correct_answer': correct_answer
+            })
+    return score, wrong_ids, wrong_details, typo_accepted
+
+
 @current_app.route('/api/submit_quiz', methods=['POST'])
 @login_required # Ensure user is logged in
 def submit_quiz_results():
     """
-    Receives quiz results (JSON), scores them server-side, saves attempt and wrong answers.
-    Returns scoring results (JSON). Includes extensive debugging logs.
+    Receives quiz answers (JSON) for a server-side quiz session, scores them against the
+    stored session record, saves the attempt and upserts wrong answers in one short transaction.
+    Each quiz can be submitted once. Practice quizzes built in the browser from the static vocabulary
+    packs (quiz_context.local) are scored against the vocabulary index instead of a session record;
+    their one-time quiz_context.submit_key is recorded in SyncedAttempt, so a replay returns 409.
+    Returns scoring results (JSON).
+    Per-answer details are logged at DEBUG level for a sample of submissions (QUIZ_DEBUG_LOG_SAMPLE_RATE).
     """
-    user_id_for_logs = current_user.id if current_user else 'Unknown'
-    print(f"\n--- submit_quiz_results for User {user_id_for_logs} START ---") # Start marker
+    user_id = current_user.id
+    logger = current_app.logger
+    sample_rate = current_app.config.get('QUIZ_DEBUG_LOG_SAMPLE_RATE', 0.0)
+    log_details = sample_rate > 0 and logger.isEnabledFor(logging.DEBUG) and random.random() < sample_rate
 
     # --- 1. Get and Validate Input Data ---
-    data = request.get_json()
+    data = request.get_json(silent=True)
     if not data or not isinstance(data.get('answers'), dict) or not isinstance(data.get('quiz_context'), dict):
-        print(f"DEBUG User {user_id_for_logs}: Invalid data format received: {data}")
-        current_app.logger.warning(f"Submit quiz from user {user_id_for_logs}: Invalid data format received.")
+        logger.warning(f"Submit quiz from user {user_id}: Invalid data format received.")
         return jsonify({'error': 'Invalid data format received.'}), 400
 
     user_answers = data.get('answers', {})
     quiz_context = data.get('quiz_context', {})
-    print(f"DEBUG User {user_id_for_logs}: Received answers: {user_answers}")
-    print(f"DEBUG User {user_id_for_logs}: Received quiz_context: {quiz_context}")
+    quiz_id = quiz_context.get('quiz_id')
+    store = get_quiz_session_store()
+    if quiz_context.get('local'):
+        # --- 2a. Practice Quiz Built in the Browser from Vocabulary Packs: Rebuild the Record from the Index ---
+        # 题目由客户端提交，每次组卷附带一个一次性幂等键 (与 /api/sync 共用 SyncedAttempt)，同一测验只能提交一次
+        submit_key = quiz_context.get('submit_key')
+        if not _valid_client_key(submit_key):
+            logger.warning(f"Submit local quiz from user {user_id}: missing or invalid submit_key.")
+            return jsonify({'error': 'A local quiz needs a valid submit_key.'}), 400
+        quiz_record, local_error = _local_quiz_record(quiz_context)
+        if local_error:
+            logger.warning(f"Submit local quiz from user {user_id}: {local_error}")
+            return jsonify({'error': local_error}), 400
+        if db.session.query(SyncedAttempt.id).filter_by(user_id=user_id, client_key=submit_key).first() is not None:
+            logger.info(f"User {user_id}: Local quiz {submit_key} already submitted.")
+            return jsonify({'error': '该测验已提交，请重新开始测试。(Quiz already submitted.)'}), 409
+        quiz_id = f"local:{submit_key}"
+    elif not quiz_id:
+        logger.warning(f"Submit quiz from user {user_id}: Missing quiz_id.")
+        return jsonify({'error': '缺少测验编号，请重新开始测试。(Missing quiz_id, please restart the quiz.)'}), 400
+    else:
+        # --- 2. Claim the Server-side Quiz Session (one submission per quiz) ---
+        quiz_record, claim_error = store.claim(quiz_id, user_id)
+        if claim_error == 'forbidden':
+            logger.warning(f"User {user_id} tried to submit quiz {quiz_id} owned by another user.")
+            return jsonify({'error': 'Forbidden'}), 403
+        if quiz_record is None:
+            logger.info(f"User {user_id}: Quiz {quiz_id} not found, already submitted or expired.")
+            return jsonify({'error': '该测验已提交或已过期，请重新开始测试。(Quiz already submitted or expired.)'}), 409
+
+    quiz_type = quiz_record.get('quiz_type', 'cn_to_en')
+    lesson_ids = quiz_record.get('lessons', [])
+    questions = quiz_record.get('questions', [])
+
+    # --- 3. Score in Memory Against the Stored Answers ---
+    total_questions = len(questions)
+    try:
+        score, wrong_answer_ids_to_save, wrong_answer_details_for_response, typo_accepted_for_response = _score_quiz_questions(
+            quiz_type, questions, user_answers, get_vocab_index(),
+            debug_label=f"Quiz {quiz_id} user {user_id}" if log_details else None)
+
+        # --- 4. Save Quiz Attempt and Wrong Answers (no reads inside the write transaction) ---
+        attempt_row = {
+            'user_id': user_id,
+            'lessons_attempted': ",".join(map(str, sorted(set(lesson_ids)))) if lesson_ids else "",
+            'score': score,
+            'total_questions': total_questions,
+            'quiz_type': quiz_type,
+            'timestamp': datetime.utcnow(),
+        }
+        if quiz_context.get('local'):
+            db.session.add(SyncedAttempt(user_id=user_id, client_key=quiz_context['submit_key'],
+                                         attempted_at=attempt_row['timestamp'], synced_at=attempt_row['timestamp']))
+        db.session.add(QuizAttempt(**attempt_row))
+        UserStats.record_quiz_attempts(user_id, [attempt_row]) # 预聚合统计，同一事务
+        WrongAnswer.record_wrong_answers(user_id, wrong_answer_ids_to_save)
+        ReviewSchedule.record_lapses(user_id, wrong_answer_ids_to_save) # 答错的词进入/重置复习计划
 
-    # --- Extract Context Info ---
-    question_ids_str = quiz_context.get('question_ids', [])
-    quiz_type = quiz_context.get('quiz_type', 'cn_to_en') # Default cn_to_en
-    lesson_ids = quiz_context.get('lesson_ids', []) # Keep lesson_ids
+        # --- 5. Commit Database Transaction ---
+        db.session.commit()
+        logger.info(f"User {user_id}: Quiz {quiz_id} results committed. Score: {score}/{total_questions}, "
+                    f"{len(wrong_answer_ids_to_save)} wrong answer(s) recorded.")
+    except Exception as e:
+        # --- Catch any exception during the process ---
+        db.session.rollback() # Rollback any potential DB changes
+        if isinstance(e, IntegrityError) and quiz_context.get('local'):
+            # 同一本地测验被并发提交：另一请求已写入该幂等键
+            logger.info(f"User {user_id}: Quiz {quiz_id} was submitted concurrently.")
+            return jsonify({'error': '该测验已提交，请重新开始测试。(Quiz already submitted.)'}), 409
+        if not quiz_context.get('local'):
+            store.release(quiz_id, quiz_record) # 未保存成功，放回会话以便重试
+        logger.error(f"User {user_id}: Critical error processing quiz {quiz_id} results: {e}", exc_info=True)
+        return jsonify({'error': f'处理测验结果时发生内部错误: {str(e)}'}), 500
 
-    # --- Convert and Validate Question IDs ---
+    # 错题的收藏状态随结果一起返回，结果页无需再逐词查询。
+    # 结果已提交，此处出错不能再走上面的回滚/放回分支 (否则同一测验可重复提交)，只退回为未收藏。
     try:
-        # Ensure question_ids are converted to integers
-        question_ids = [int(qid) for qid in question_ids_str if str(qid).isdigit()]
-        print(f"DEBUG User {user_id_for_logs}: Parsed question_ids: {question_ids}") # Log parsed IDs
-    except (ValueError, TypeError) as e:
-         print(f"DEBUG User {user_id_for_logs}: Invalid question IDs format: {question_ids_str}. Error: {e}")
-         current_app.logger.warning(f"Submit quiz from user {user_id_for_logs}: Invalid question IDs format: {question_ids_str}. Error: {e}")
-         return jsonify({'error': 'Invalid question ID format received.'}), 400
-
-    # --- Check if we have questions to process ---
-    if not question_ids: # Check if the list is empty after parsing
-         print(f"DEBUG User {user_id_for_logs}: No valid question IDs found after parsing/validation.")
-         current_app.logger.warning(f"Submit quiz from user {user_id_for_logs}: No valid question IDs received.")
-         return jsonify({
-             'message': 'No valid questions to process.',
-             'score': 0,
-             'total_questions': 0,
-             'wrong_answers': []
-         }), 200 # Return 0/0 if no questions
-
-    current_app.logger.info(f"Processing quiz submission for user {user_id_for_logs}. Context: {quiz_context}. Answers received for {len(user_answers)} items.")
-
-    # --- 2. Server-side Scoring and Wrong Answer Tracking ---
-    total_questions = len(question_ids) # Base total on the question IDs received
-    score = 0                           # Initialize score
-    wrong_answer_details_for_response = []
-    wrong_answer_ids_to_save = set()
-
-    print(f"DEBUG User {user_id_for_logs}: Initial total_questions based on context: {total_questions}")
+        flags = favorite_flags(user_id, wrong_answer_ids_to_save)
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"User {user_id}: Could not load favorite flags for quiz {quiz_id} results: {e}")
+        flags = {}
+    for detail in wrong_answer_details_for_response:
+        detail['is_favorite'] = flags.get(detail['vocab_id'], False)
+
+    # --- 6. Return Results to Frontend ---
+    return jsonify({
+        'message': '测验结果已成功保存。(Results saved successfully.)',
+        'score': score,
+        'total_questions': total_questions,
+        'wrong_answers': wrong_answer_details_for_response,
+        'typo_accepted': typo_accepted_for_response
+    }), 200
 
+
+def _parse_client_timestamp(value, now, max_age_days):
+    """客户端作答时间：ISO 字符串或毫秒时间戳 (UTC)。超过 max_age_days 天或无法解析时返回 None；未来时间按 now 处理。"""
     try:
-        # --- Fetch Vocabulary Items from Database ---
-        print(f"DEBUG User {user_id_for_logs}: Querying DB for vocab items with IDs: {question_ids}")
-        vocab_items = Vocabulary.query.filter(Vocabulary.id.in_(question_ids)).all()
-        print(f"DEBUG User {user_id_for_logs}: Found {len(vocab_items)} vocab items in DB.")
-        # Optional: Print details of found items if needed for deeper debugging
-        # for item in vocab_items: print(f"  - Found DB item: ID={item.id}, Word='{item.english_word}'")
-
-        # --- Adjust total_questions if DB query returned fewer items ---
-        if len(vocab_items) != len(question_ids):
-             print(f"DEBUG User {user_id_for_logs}: WARNING - Mismatch! Expected {len(question_ids)} questions based on context, but found {len(vocab_items)} in DB.")
-             total_questions = len(vocab_items) # Adjust total to actual items found for scoring
-             print(f"DEBUG User {user_id_for_logs}: Adjusted total_questions to: {total_questions}")
-             if total_questions == 0:
-                 print(f"DEBUG User {user_id_for_logs}: No matching vocab items found in DB. Returning 0/0 score.")
-                 # If no items found, return 0 score now, maybe save attempt later or not
-                 return jsonify({
-                     'message': 'No matching vocabulary found for scoring.',
-                     'score': 0,
-                     'total_questions': 0,
-                     'wrong_answers': []
-                 }), 200 # Still a successful process, just no score
-
-        # --- Build Vocabulary Map for Efficient Lookup ---
-        vocab_map = {item.id: item for item in vocab_items}
-        print(f"DEBUG User {user_id_for_logs}: Built vocab_map with {len(vocab_map)} items.")
-
-        # --- Iterate Through User Answers for Scoring ---
-        print(f"DEBUG User {user_id_for_logs}: Starting scoring loop for {len(user_answers)} submitted answers...")
-        for vocab_id_str, user_answer in user_answers.items():
-            try:
-                vocab_id = int(vocab_id_str)
-                print(f"  - Processing answer for vocab_id: {vocab_id}")
-                if vocab_id in vocab_map:
-                    item = vocab_map[vocab_id]
-                    correct_answer = item.english_word if quiz_type == 'cn_to_en' else item.chinese_translation
-                    user_answer_cleaned = user_answer.strip() if isinstance(user_answer, str) else ""
-
-                    print(f"    User Answer (cleaned): '{user_answer_cleaned}'")
-                    print(f"    Correct Answer:        '{correct_answer}'")
-
-                    # Core Scoring Comparison (case-insensitive)
-                    is_correct = user_answer_cleaned.lower() == correct_answer.lower()
-                    print(f"    Comparison Result: {is_correct}")
-
-                    if is_correct:
-                        score += 1
-                        print(f"    Score increased to: {score}")
-                    else:
-                        wrong_answer_ids_to_save.add(vocab_id)
-                        wrong_answer_details_for_response.append({
-                            'vocab_id': vocab_id,
-                            'question': item.chinese_translation if quiz_type == 'cn_to_en' else item.english_word,
-                            'part_of_speech': item.part_of_speech,
-                            'user_answer': user_answer, # Keep original answer for display
-                            'correct_answer': correct_answer
-                        })
-                        print(f"    Marked as incorrect. wrong_answer_ids_to_save: {wrong_answer_ids_to_save}")
-                else:
-                    # This case means user submitted an answer for an ID that wasn't in the fetched items
-                    print(f"  - WARNING: Submitted answer for vocab_id {vocab_id}, but it was not found in the fetched vocab_map!")
-                    current_app.logger.warning(f"User {user_id_for_logs}: Submitted answer for vocab_id {vocab_id} which was not in the fetched items for this quiz.")
-            except ValueError:
-                 print(f"  - ERROR: Invalid vocab ID format in user answers: '{vocab_id_str}'")
-                 current_app.logger.warning(f"User {user_id_for_logs}: Invalid vocab ID format in user answers: {vocab_id_str}")
-            except Exception as scoring_ex:
-                 print(f"  - ERROR: Exception during scoring loop for vocab_id '{vocab_id_str}': {scoring_ex}")
-                 current_app.logger.error(f"User {user_id_for_logs}: Error scoring question vocab_id={vocab_id_str}: {scoring_ex}", exc_info=True)
-        print(f"DEBUG User {user_id_for_logs}: Scoring loop finished.")
-        print(f"DEBUG User {user_id_for_logs}: Final score before commit: {score}")
-        print(f"DEBUG User {user_id_for_logs}: Final total_questions before commit: {total_questions}") # Based on items found in DB
-
-        # --- 3. Save Quiz Attempt Record ---
-        print(f"DEBUG User {user_id_for_logs}: Preparing to save QuizAttempt...")
-        attempt = QuizAttempt(
-            user_id=current_user.id,
-            lessons_attempted=",".join(map(str, sorted(list(set(lesson_ids))))) if lesson_ids else "",
-            score=score,
-            total_questions=total_questions, # Use the potentially adjusted total_questions
-            quiz_type=quiz_type
-        )
-        db.session.add(attempt)
-        print(f"DEBUG User {user_id_for_logs}: QuizAttempt object created and added to session.")
-
-        # --- 4. Update/Save Wrong Answers ---
-        print(f"DEBUG User {user_id_for_logs}: Preparing to update/save {len(wrong_answer_ids_to_save)} wrong answers...")
-        now = datetime.utcnow()
-        if wrong_answer_ids_to_save:
-            # ... (Keep the existing logic for finding existing wrongs and updating/creating new ones) ...
-             # Query existing wrong answers for these specific vocab IDs for this user
-            existing_wrongs = WrongAnswer.query.filter(
-                WrongAnswer.user_id == current_user.id,
-                WrongAnswer.vocabulary_id.in_(wrong_answer_ids_to_save)
-            ).all()
-            existing_wrongs_map = {wrong.vocabulary_id: wrong for wrong in existing_wrongs}
-            print(f"DEBUG User {user_id_for_logs}: Found {len(existing_wrongs_map)} existing wrong answers to update.")
-
-            for vocab_id in wrong_answer_ids_to_save:
-                if vocab_id in vocab_map: # Ensure vocab data still exists
-                    if vocab_id in existing_wrongs_map:
-                        # Update existing record
-                        wrong_record = existing_wrongs_map[vocab_id]
-                        wrong_record.timestamp_last_wrong = now
-                        wrong_record.incorrect_count = (wrong_record.incorrect_count or 0) + 1
-                        db.session.add(wrong_record) # Add to session for update
-                        print(f"  - Updating existing wrong answer for vocab_id {vocab_id}")
-                    else:
-                        # Create new record
-                        new_wrong = WrongAnswer(
-                            user_id=current_user.id,
-                            vocabulary_id=vocab_id,
-                            timestamp_last_wrong=now,
-                            incorrect_count=1
-                        )
-                        db.session.add(new_wrong)
-                        print(f"  - Creating new wrong answer for vocab_id {vocab_id}")
-                else:
-                     print(f"  - WARNING: Cannot save wrong answer for vocab_id {vocab_id} as it's not in vocab_map.")
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            when = datetime.utcfromtimestamp(value / 1000.0)
+        elif isinstance(value, str):
+            when = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            if when.tzinfo is not None:
+                when = when.astimezone(timezone.utc).replace(tzinfo=None)
         else:
-            print(f"DEBUG User {user_id_for_logs}: No wrong answers to save/update.")
+            return None
+    except (ValueError, OverflowError, OSError):
+        return None
+    if when > now:
+        return now
+    if now - when > timedelta(days=max_age_days):
+        return None
+    return when
 
 
-        # --- 5. Commit Database Transaction ---
-        print(f"DEBUG User {user_id_for_logs}: Attempting db.session.commit()...")
-        db.session.commit()
-        print(f"DEBUG User {user_id_for_logs}: Database commit successful.")
-        current_app.logger.info(f"User {user_id_for_logs}: Quiz results processing complete and committed. Score: {score}/{total_questions}")
+@current_app.route('/api/sync', methods=['POST'])
+@login_required
+def sync_offline_attempts():
+    """
+    批量同步离线记录的测验 (网络中断时浏览器暂存，恢复后一次提交)。
+    请求: {"attempts": [{"key", "timestamp", "quiz_type", "lesson_ids", "question_ids", "answers"}, ...]}
+    key 为客户端生成的幂等键：已同步过的键直接跳过 (status 'duplicate')，重放不会重复记分。
+    全部新记录在一个事务中评分写入：QuizAttempt 一条多行 INSERT，统计、错题与复习计划各用 upsert 更新。
+    只支持填空题 (cn_to_en / en_to_cn)，按服务端词汇索引评分。
+    """
+    user_id = current_user.id
+    logger = current_app.logger
+    data = request.get_json(silent=True)
+    attempts = data.get('attempts') if isinstance(data, dict) else None
+    max_batch = current_app.config.get('SYNC_MAX_BATCH_SIZE', 50)
+    if not isinstance(attempts, list) or not attempts:
+        return jsonify({'error': "Missing 'attempts' list."}), 400
+    if len(attempts) > max_batch:
+        return jsonify({'error': f'At most {max_batch} attempts per sync.'}), 400
 
-        # --- 6. Return Results to Frontend ---
-        print(f"DEBUG User {user_id_for_logs}: Returning score: {score}, total_questions: {total_questions}")
-        return jsonify({
-            'message': '测验结果已成功保存。(Results saved successfully.)',
-            'score': score,
-            'total_questions': total_questions, # Return the potentially adjusted total_questions
-            'wrong_answers': wrong_answer_details_for_response
-        }), 200
+    now = datetime.utcnow()
+    max_age_days = current_app.config.get('SYNC_MAX_AGE_DAYS', 30)
+    results, valid = [], [] # valid: (结果下标, key, 作答时间, 测验记录, 答案)
+    seen_keys = set()
+    for attempt in attempts:
+        key = attempt.get('key') if isinstance(attempt, dict) else None
+        if not _valid_client_key(key):
+            results.append({'key': key if isinstance(key, str) else None, 'status': 'invalid', 'error': 'Invalid key.'})
+            continue
+        if key in seen_keys:
+            results.append({'key': key, 'status': 'duplicate'})
+            continue
+        seen_keys.add(key)
+        when = _parse_client_timestamp(attempt.get('timestamp'), now, max_age_days)
+        record, error = _local_quiz_record(attempt)
+        if when is None:
+            error = error or f'Missing timestamp or older than {max_age_days} days.'
+        if error or not isinstance(attempt.get('answers'), dict):
+            results.append({'key': key, 'status': 'invalid', 'error': error or "Missing 'answers'."})
+            continue
+        results.append({'key': key})
+        valid.append((len(results) - 1, key, when, record, attempt['answers']))
 
+    try:
+        # 1. 幂等检查：一次 IN 查询 (命中 uq_user_sync_key 索引) 找出已同步过的键
+        already_synced = set()
+        if valid:
+            already_synced = {key for (key,) in db.session.query(SyncedAttempt.client_key).filter(
+                SyncedAttempt.user_id == user_id, SyncedAttempt.client_key.in_([item[1] for item in valid]))}
+
+        # 2. 在内存中评分
+        vocab_index = get_vocab_index()
+        attempt_rows, key_rows, wrong_ids = [], [], []
+        latest = None
+        for position, key, when, record, answers in valid:
+            if key in already_synced:
+                results[position]['status'] = 'duplicate'
+                continue
+            score, attempt_wrong_ids, _, _ = _score_quiz_questions(record['quiz_type'], record['questions'], answers, vocab_index)
+            attempt_rows.append({'user_id': user_id, 'lessons_attempted': ",".join(map(str, record['lessons'])),
+                                 'score': score, 'total_questions': len(record['questions']),
+                                 'quiz_type': record['quiz_type'], 'timestamp': when})
+            key_rows.append({'user_id': user_id, 'client_key': key, 'attempted_at': when, 'synced_at': now})
+            wrong_ids.extend(attempt_wrong_ids)
+            latest = max(latest, when) if latest else when
+            results[position].update(status='saved', score=score, total_questions=len(record['questions']))
+
+        # 3. 一个事务内的集合写入：幂等键、测验记录各一条多行 INSERT，统计/错题/复习计划各用 upsert
+        if key_rows:
+            db.session.execute(db.insert(SyncedAttempt), key_rows)
+            db.session.execute(db.insert(QuizAttempt), attempt_rows)
+            UserStats.record_quiz_attempts(user_id, attempt_rows)
+            WrongAnswer.record_wrong_answers(user_id, wrong_ids, when=latest)
+            ReviewSchedule.record_lapses(user_id, wrong_ids, when=now)
+            db.session.commit()
+    except IntegrityError:
+        # 同一批次被并发提交：另一请求已写入部分幂等键，整批回滚，客户端重试时这些键会被识别为 duplicate
+        db.session.rollback()
+        logger.info(f"User {user_id}: concurrent sync detected, asking client to retry.")
+        return jsonify({'error': 'Concurrent sync in progress, please retry.'}), 409
     except Exception as e:
-        # --- Catch any exception during the process ---
-        db.session.rollback() # Rollback any potential DB changes
-        print(f"DEBUG User {user_id_for_logs}: EXCEPTION occurred: {e}")
-        current_app.logger.error(f"User {user_id_for_logs}: Critical error processing quiz results: {e}", exc_info=True)
-        return jsonify({'error': f'处理测验结果时发生内部错误: {str(e)}'}), 500
-    finally:
-        print(f"--- submit_quiz_results for User {user_id_for_logs} END ---") # End marker
+        db.session.rollback()
+        logger.error(f"User {user_id}: Error syncing {len(valid)} offline attempt(s): {e}", exc_info=True)
+        return jsonify({'error': 'Internal server error while syncing.'}), 500
+
+    saved = sum(1 for item in results if item.get('status') == 'saved')
+    duplicates = sum(1 for item in results if item.get('status') == 'duplicate')
+    logger.info(f"User {user_id}: synced {saved} offline attempt(s), {duplicates} duplicate(s), "
+                f"{len(results) - saved - duplicates} invalid.")
+    return jsonify({'results': results, 'saved': saved, 'duplicates': duplicates}), 200
 
 
 @current_app.route('/api/vocabulary/<int:vocabulary_id>/toggle_favorite', methods=['POST'])
@@ -640,6 +883,7 @@ def toggle_favorite(vocabulary_id):
         # 3. 尝试提交更改
         log.debug("[Favorite Toggle] Attempting to commit database changes...")
         db.session.commit()
+        favorites_changed(user_id)
         log.info(f"[Favorite Toggle] Successfully {'unfavorited' if not final_favorite_status else 'favorited'} vocabulary {vocabulary_id} for user {user_id}.")
 
         # 4. 返回成功和最终状态
@@ -648,6 +892,7 @@ def toggle_favorite(vocabulary_id):
     except IntegrityError as ie:
         # 5. 特别处理唯一约束冲突 (很可能是前端重复添加请求导致)
         db.session.rollback() # 必须先回滚失败的事务
+        favorites_changed(user_id) # 另一个请求刚修改过收藏，缓存可能已过时
         log.warning(f"[Favorite Toggle] IntegrityError encountered (likely concurrent add): {ie}")
 
         if action_taken == 'add':
@@ -667,6 +912,86 @@ def toggle_favorite(vocabulary_id):
         log.error(f"[Favorite Toggle] Generic error during favorite toggle for user {user_id}, vocab {vocabulary_id}: {e}", exc_info=True)
         return jsonify({'success': False, 'error': '数据库操作时发生错误。(Database operation failed.)'}), 500
 
+def _vocabulary_id_list(values, field):
+    """校验 JSON / 查询参数中的词汇 id 列表，返回 (ids, error)。"""
+    if values is None:
+        return [], None
+    if not isinstance(values, list):
+        return None, f"'{field}' must be a list of vocabulary ids."
+    try:
+        return list(dict.fromkeys(int(value) for value in values if not isinstance(value, bool))), None
+    except (TypeError, ValueError):
+        return None, f"'{field}' must be a list of vocabulary ids."
+
+
+@current_app.route('/api/favorites/status')
+@login_required
+def favorite_status():
+    """一组词汇的收藏状态：?ids=1,2,3 -> {"favorites": {"1": true, "2": false, ...}}。"""
+    raw_ids = [part for part in request.args.get('ids', '').split(',') if part.strip()]
+    vocab_ids, error = _vocabulary_id_list(raw_ids, 'ids')
+    max_ids = current_app.config.get('FAVORITES_BATCH_MAX', 500)
+    if error:
+        return jsonify({'error': error}), 400
+    if len(vocab_ids) > max_ids:
+        return jsonify({'error': f'At most {max_ids} ids per request.'}), 400
+    flags = favorite_flags(current_user.id, vocab_ids)
+    return jsonify({'favorites': {str(vocab_id): is_favorite for vocab_id, is_favorite in flags.items()}})
+
+
+@current_app.route('/api/favorites/batch', methods=['POST'])
+@login_required
+def batch_update_favorites():
+    """
+    批量收藏 / 取消收藏：{"add": [词汇 id...], "remove": [词汇 id...]}，在一个事务中完成。
+    返回各词的最终状态 {"favorites": {"12": true, "15": false}}；不存在的词汇 id 列在 "missing" 中，不做处理。
+    """
+    log = current_app.logger
+    user_id = current_user.id
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Invalid data format received.'}), 400
+    add_ids, error = _vocabulary_id_list(data.get('add'), 'add')
+    if not error:
+        remove_ids, error = _vocabulary_id_list(data.get('remove'), 'remove')
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    max_ids = current_app.config.get('FAVORITES_BATCH_MAX', 500)
+    if len(add_ids) + len(remove_ids) > max_ids:
+        return jsonify({'success': False, 'error': f'At most {max_ids} changes per request.'}), 400
+    if set(add_ids) & set(remove_ids):
+        return jsonify({'success': False, 'error': 'A vocabulary id cannot be both added and removed.'}), 400
+    if not add_ids and not remove_ids:
+        return jsonify({'success': True, 'favorites': {}, 'missing': []})
+
+    try:
+        missing = []
+        if add_ids:
+            # 一次 IN 查询确认要收藏的词汇存在
+            existing = set(db.session.scalars(db.select(Vocabulary.id).where(Vocabulary.id.in_(add_ids))))
+            missing = [vocab_id for vocab_id in add_ids if vocab_id not in existing]
+            add_ids = [vocab_id for vocab_id in add_ids if vocab_id in existing]
+        UserFavoriteVocabulary.apply_changes(user_id, add_ids, remove_ids)
+        db.session.commit()
+    except IntegrityError as ie:
+        # 词汇在校验之后被删除 (外键冲突)，整批回滚，客户端可重试
+        db.session.rollback()
+        log.warning(f"[Favorite Batch] IntegrityError for user {user_id}: {ie}")
+        return jsonify({'success': False, 'error': 'Vocabulary changed during the update, please retry.'}), 409
+    except Exception as e:
+        db.session.rollback()
+        log.error(f"[Favorite Batch] Error updating favorites for user {user_id}: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': '数据库操作时发生错误。(Database operation failed.)'}), 500
+    finally:
+        favorites_changed(user_id)
+
+    log.info(f"[Favorite Batch] User {user_id}: {len(add_ids)} favorited, {len(remove_ids)} unfavorited, "
+             f"{len(missing)} missing.")
+    favorites = {str(vocab_id): True for vocab_id in add_ids}
+    favorites.update((str(vocab_id), False) for vocab_id in remove_ids + missing)
+    return jsonify({'success': True, 'favorites': favorites, 'missing': missing})
+
+
 # === API Routes for Wrong Answer Enhancements ===
 @current_app.route('/api/wrong_answer/<int:wrong_answer_id>/toggle_mark', methods=['POST'])
 @login_required
@@ -707,6 +1032,75 @@ def set_category_wrong_answer(wrong_answer_id):
         return jsonify({'success': False, 'error': 'DB error'}), 500
 
 
+# === Spaced-repetition Review API ===
+@current_app.route('/api/review', methods=['GET'])
+@login_required
+def get_review_items():
+    """API endpoint returning the user's most overdue review items (oldest due first)."""
+    default_limit = current_app.config.get('REVIEW_BATCH_SIZE', 20)
+    try:
+        limit = int(request.args.get('limit', default_limit))
+    except ValueError:
+        return jsonify({'error': "Invalid 'limit' parameter."}), 400
+    limit = max(1, min(limit, current_app.config.get('REVIEW_MAX_BATCH_SIZE', 100)))
+
+    try:
+        rows, due_count = due_reviews(current_user.id, limit)
+    except Exception as e:
+        current_app.logger.error(f"Error fetching review items for user {current_user.id}: {e}", exc_info=True)
+        return jsonify({'error': '加载复习项目失败。(Failed to load review items.)'}), 500
+
+    items = [{
+        'vocabulary_id': row.vocabulary_id,
+        'lesson': row.lesson_number,
+        'english_word': row.english_word,
+        'part_of_speech': row.part_of_speech,
+        'chinese_translation': row.chinese_translation,
+        'due_at': row.due_at.isoformat() + 'Z',
+        'interval_days': row.interval_days,
+        'ease_factor': row.ease_factor,
+        'repetitions': row.repetitions,
+        'lapses': row.lapses,
+    } for row in rows]
+    return jsonify({'due_count': due_count, 'items': items})
+
+
+@current_app.route('/api/review', methods=['POST'])
+@login_required
+def submit_review():
+    """
+    API endpoint to grade review items: {"reviews": [{"vocabulary_id": 1, "grade": 0-5}, ...]}.
+    All schedule rows are updated in one batch and one transaction.
+    """
+    data = request.get_json(silent=True)
+    reviews = data.get('reviews') if isinstance(data, dict) else None
+    if not isinstance(reviews, list) or not reviews:
+        return jsonify({'error': "Missing 'reviews' list."}), 400
+    if len(reviews) > current_app.config.get('REVIEW_MAX_BATCH_SIZE', 100):
+        return jsonify({'error': 'Too many reviews in one request.'}), 400
+
+    grades = {}
+    for review in reviews:
+        try:
+            vocab_id, grade = int(review['vocabulary_id']), int(review['grade'])
+        except (TypeError, KeyError, ValueError):
+            return jsonify({'error': 'Each review needs integer vocabulary_id and grade.'}), 400
+        if not 0 <= grade <= MAX_GRADE:
+            return jsonify({'error': f'Grade must be between 0 and {MAX_GRADE}.'}), 400
+        grades[vocab_id] = grade # 同一词汇出现多次时以最后一次为准
+
+    try:
+        updated, unknown = apply_reviews(current_user.id, grades)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error saving reviews for user {current_user.id}: {e}", exc_info=True)
+        return jsonify({'error': '保存复习结果失败。(Failed to save reviews.)'}), 500
+
+    current_app.logger.info(f"User {current_user.id}: {len(updated)} review(s) saved, {len(unknown)} unknown item(s).")
+    return jsonify({'updated': updated, 'unknown_vocabulary_ids': unknown})
+
+
 # === Admin Routes ===
 
 @current_app.route('/admin/dashboard')
@@ -730,7 +1124,7 @@ def manage_vocabulary():
         vocab_list = Vocabulary.query.order_by(Vocabulary.lesson_number, Vocabulary.id).all()
         # Admins might also want to see which words *they* favorited on this page
         if current_user.is_authenticated:
-            favorited_ids = {fav.vocabulary_id for fav in UserFavoriteVocabulary.query.filter_by(user_id=current_user.id).with_entities(UserFavoriteVocabulary.vocabulary_id).all()}
+            favorited_ids = favorite_ids(current_user.id)
 
     except Exception as e:
         current_app.logger.error(f"Error fetching vocabulary for management page: {e}", exc_info=True)
@@ -745,6 +1139,17 @@ def manage_vocabulary():
                            current_time=now)
 
 
+@current_app.route('/admin/api/transcription_cache')
+@login_required
+@admin_required
+def transcription_cache_stats():
+    """返回转写缓存的命中/未命中计数 (当前进程) 与磁盘占用。"""
+    cache = get_transcription_cache()
+    if cache is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **cache.stats()}), 200
+
+
 # --- 完善用户管理路由 ---
 @current_app.route('/admin/users')
 @login_required        # 必须登录
@@ -759,6 +1164,7 @@ def manage_users():
     try:
         # 查询所有用户，排除根管理员自己，按用户名排序
         users_list = User.query.filter(User.username != root_username)\
+                              .options(joinedload(User.stats))\
                               .order_by(User.username).all()
         log.debug(f"Fetched {len(users_list)} users for management page.")
     except Exception as e:
@@ -833,6 +1239,10 @@ def process_pdf_route_admin():
         results = process_nce_pdf(pdf_path) # This needs DB interaction
         # ... (Database update logic based on 'results' as shown previously) ...
         log.info("PDF processing finished and DB updated (logic assumed).")
+        try:
+            build_vocab_packs() # 词汇/课程标题可能已变化，立即重建静态词汇包与清单
+        except Exception as pack_error:
+            log.warning(f"Could not rebuild vocabulary packs after PDF processing: {pack_error}", exc_info=True)
         # Return a summary matching JS expectations
         dummy_summary = {
              "lessons_added": 0, "lessons_updated": 0, "lesson_errors": 0,
@@ -858,8 +1268,9 @@ def serve_audio(filename):
     cache_dir = os.path.join(current_app.instance_path, cache_dir_base)
     current_app.logger.debug(f"Attempting to serve audio: {os.path.join(cache_dir, filename)}")
     try:
-        return send_from_directory(cache_dir, filename, as_attachment=False)
-    except FileNotFoundError: abort(404)
+        return send_media_from_directory(cache_dir, filename, mimetype=mimetype_for(filename), private=True)
+    except (FileNotFoundError, NotFound): abort(404)
+    except HTTPException: raise
     except Exception as e:
         current_app.logger.error(f"Error serving audio {filename}: {e}")
         abort(500)
@@ -876,12 +1287,33 @@ def speak_lesson_text(lesson_number):
     if not lesson or not lesson.text_en: return jsonify({"error": "Lesson text not found."}), 404
     audio_filepath = get_audio_filename(lesson_number)
     if not audio_filepath: return jsonify({"error": "Config error for audio path."}), 500
-    generated_path = generate_and_save_audio_if_not_exists(lesson_number, lesson.text_en, 'en')
+    # 同一课的并发请求只合成一次 (锁文件协调)；等待超时则返回 202，客户端按 Retry-After 重试
+    try:
+        generated_path = generate_and_save_audio_if_not_exists(
+            lesson_number, lesson.text_en, 'en',
+            wait_timeout=current_app.config.get('TTS_SINGLE_FLIGHT_WAIT', 20)
+        )
+    except SynthesisInProgress as e:
+        log.info(f"Lesson {lesson_number}: TTS still in progress elsewhere, asking client to retry in {e.retry_after}s.")
+        response = jsonify({"status": "pending", "message": "Audio is being generated, please retry shortly.",
+                            "retry_after": e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 202
     if not generated_path: return jsonify({"error": "Failed to generate/retrieve audio."}), 500
+    # 可用变体查媒体索引 (生成时已 record，新 wav 会使旧变体失效)，不在播放热路径上逐个 stat
+    variant_exts = variant_extensions()
+    source, fresh = split_source_and_variants(get_media_index().pregenerated(lesson_number), variant_exts)
+    if source is None or source.path != os.path.abspath(generated_path):
+        fresh = None # 索引中没有这个文件 (目录配置不一致等)，退回检查文件系统
+        schedule_transcode(generated_path)
+    elif source.format == '.wav' and len(fresh) < len(variant_exts):
+        schedule_transcode(generated_path) # 缺少或过期的变体在后台转码，本次先发送现有文件
     try:
-        directory = os.path.dirname(generated_path)
-        filename = os.path.basename(generated_path)
-        return send_from_directory(directory, filename, mimetype='audio/wav')
+        # 按 Accept 头选择压缩变体 (Opus/MP3)，没有可用变体时发送 wav
+        chosen_path, mimetype = choose_variant(generated_path, request.accept_mimetypes, fresh=fresh)
+        return send_media(chosen_path, mimetype=mimetype, private=True, vary_accept=True)
+    except HTTPException:
+        raise
     except Exception as e:
          log.error(f"Error sending audio file {generated_path}: {e}")
          return jsonify({"error": "Could not send audio file."}), 500
@@ -934,6 +1366,22 @@ def upload_user_recording(lesson_number):
         current_app.logger.info(f"Attempting to save user recording to: {filepath}")
         file.save(filepath) # 保存文件，会覆盖同名文件
         current_app.logger.info(f"User recording saved successfully: {filepath}")
+        # --- 更新媒体索引；同一课其他格式的旧录音 (及其压缩变体) 已被新录音取代，一并删除 ---
+        media_index = get_media_index()
+        for old_entry in media_index.recordings(user_id, lesson_number).values():
+            if os.path.abspath(old_entry.path) == os.path.abspath(filepath):
+                continue
+            try:
+                os.remove(old_entry.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                current_app.logger.warning(f"Could not remove superseded recording {old_entry.path}: {e}")
+                continue
+            media_index.remove(old_entry.path)
+        media_index.record(filepath)
+        if ext.lower() == '.wav':
+            schedule_transcode(filepath) # 浏览器上传的 webm/ogg 已是压缩格式，只转码 wav
         return jsonify({'success': True, 'message': '录音已保存。'}), 200
     except OSError as e:
          current_app.logger.error(f"Could not create directory or save file '{filepath}': {e}", exc_info=True)
@@ -957,21 +1405,14 @@ def get_user_recording(user_id, lesson_number):
     user_specific_folder = os.path.join(base_folder, f"user_{user_id}")
     # -------------------------
 
-    # --- 在用户目录中查找文件 ---
-    possible_extensions = ['.webm', '.ogg', '.wav'] # 与上传逻辑匹配
-    found_file = None
-    for ext in possible_extensions:
-         # 文件名现在只包含课程号和扩展名
-         filename = f"lesson_{lesson_number}{ext}"
-         filepath = os.path.join(user_specific_folder, filename)
-         if os.path.exists(filepath):
-              found_file = filename # 只需要文件名，send_from_directory 需要目录+文件名
-              break
-
-    if found_file:
-         current_app.logger.debug(f"Serving user recording: {found_file} from {user_specific_folder}")
-         # 使用 send_from_directory 发送文件
-         return send_from_directory(user_specific_folder, found_file, as_attachment=False)
+    # --- 从媒体索引中查找录音 (同一课有多个格式时取最新上传的) ---
+    source, variants = get_media_index().find_recording(user_id, lesson_number, variant_extensions())
+
+    if source:
+         current_app.logger.debug(f"Serving user recording: {source.path}")
+         # wav 录音按 Accept 头选择压缩变体；录音会被重新上传覆盖，只允许浏览器缓存并每次用 ETag 验证
+         chosen_path, mimetype = choose_variant(source.path, request.accept_mimetypes, variants)
+         return send_media(chosen_path, mimetype=mimetype, private=True, vary_accept=True)
     else:
          current_app.logger.warning(f"User recording not found for user {user_id}, lesson {lesson_number} in {user_specific_folder}")
          return jsonify({"error": "Recording not found"}), 404
@@ -981,83 +1422,49 @@ def get_user_recording(user_id, lesson_number):
 @current_app.route('/api/lesson/<int:lesson_number>/process_recording', methods=['POST']) # 保持 POST
 @login_required
 def process_user_recording(lesson_number):
-    """处理指定课程的用户录音，进行 STT 和评分，并将结果存入数据库。"""
+    """为指定课程的用户录音提交异步评分任务 (STT + 评分 + 入库)，立即返回 job id。"""
     user_id = current_user.id
     current_app.logger.info(f"Processing recording request for lesson {lesson_number}, user {user_id}")
 
     # --- 1. 找到录音文件 (逻辑不变) ---
     base_folder = current_app.config.get('USER_RECORDINGS_BASE_FOLDER')
     if not base_folder: return jsonify({'success': False, 'error': '录音文件夹未配置'}), 500
-    user_specific_folder = os.path.join(base_folder, f"user_{user_id}")
-    possible_extensions = current_app.config.get('PREGENERATED_AUDIO_EXTENSIONS', []) + ['.webm', '.ogg', '.wav', '.mp3', '.m4a', '.aac']
-    found_filepath = None; filename_only = None
-    for ext in set(possible_extensions):
-         filename = f"lesson_{lesson_number}{ext}"
-         filepath = os.path.join(user_specific_folder, filename)
-         if os.path.exists(filepath): found_filepath = filepath; filename_only = filename; break
-    if not found_filepath: return jsonify({'success': False, 'error': '找不到对应的录音文件'}), 404
+    source, _ = get_media_index().find_recording(user_id, lesson_number, variant_extensions()) # 取最新上传的录音
+    if not source: return jsonify({'success': False, 'error': '找不到对应的录音文件'}), 404
+    found_filepath = source.path
 
     # --- 2. 获取标准课文 (逻辑不变) ---
     lesson = Lesson.query.filter_by(lesson_number=lesson_number, source_book=2).first()
     if not lesson or not lesson.text_en: return jsonify({'success': False, 'error': '找不到标准课文'}), 404
     standard_text = lesson.text_en
 
-    # --- 3. 调用评分模块 (逻辑不变) ---
-    try:
-        evaluation_result = evaluate_audio_recording(found_filepath, standard_text)
-    except FileNotFoundError as e: return jsonify({'success': False, 'error': f'评估失败：找不到文件 - {e}'}), 404
-    except ValueError as e: return jsonify({'success': False, 'error': f'评估失败：输入无效 - {e}'}), 400
-    except Exception as e: current_app.logger.error(f"Crit err processing {found_filepath}: {e}", exc_info=True); return jsonify({'success': False, 'error': f'处理或评分时发生内部错误'}), 500
-
-    # --- 4. 保存/更新评分记录到数据库 ---
+    # --- 3. 评分任务入队 (Whisper 转写在后台线程池中执行，不占用请求线程) ---
     try:
-        # 查找是否已存在该用户该课程的评分记录
-        score_record = PronunciationScore.query.filter_by(user_id=user_id, lesson_number=lesson_number).first()
-
-        if score_record:
-            # 如果存在，则更新记录
-            current_app.logger.info(f"Updating existing score record for user {user_id}, lesson {lesson_number}")
-            score_record.final_score = evaluation_result.get('final_score')
-            score_record.accuracy_score = evaluation_result.get('accuracy')
-            score_record.fluency_score = evaluation_result.get('fluency_score')
-            score_record.speed_score = evaluation_result.get('speed_score') # 需要评分函数返回
-            score_record.recognized_text = evaluation_result.get('recognized_text')
-            score_record.wer = evaluation_result.get('wer')
-            score_record.speech_rate_wps = evaluation_result.get('speech_rate_wps')
-            score_record.timestamp = datetime.utcnow() # 更新时间戳
-        else:
-            # 如果不存在，则创建新记录
-            current_app.logger.info(f"Creating new score record for user {user_id}, lesson {lesson_number}")
-            score_record = PronunciationScore(
-                user_id=user_id,
-                lesson_number=lesson_number,
-                final_score = evaluation_result.get('final_score'),
-                accuracy_score = evaluation_result.get('accuracy'),
-                fluency_score = evaluation_result.get('fluency_score'),
-                speed_score = evaluation_result.get('speed_score'),
-                recognized_text = evaluation_result.get('recognized_text'),
-                wer = evaluation_result.get('wer'),
-                speech_rate_wps = evaluation_result.get('speech_rate_wps'),
-                # timestamp 使用 default
-            )
-            db.session.add(score_record)
-
-        db.session.commit()
-        current_app.logger.info("Pronunciation score saved/updated successfully.")
-
+        job_id = enqueue_scoring_job(user_id, lesson_number, found_filepath, standard_text)
+    except JobQueueFull as e:
+        current_app.logger.warning(f"Scoring queue full, rejecting request from user {user_id}: {e}")
+        return jsonify({'success': False, 'error': '评分任务繁忙，请稍后重试。'}), 503
     except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f"Error saving pronunciation score to DB: {e}", exc_info=True)
-        # 虽然评分计算成功了，但保存失败，也需要告知前端
-        return jsonify({
-            'success': False, # 标记操作未完全成功
-            'error': '评分计算完成，但保存结果时出错。',
-            **evaluation_result # 仍然返回评分结果供查看
-            }), 500 # 返回服务器错误
+        current_app.logger.error(f"Failed to enqueue scoring job for {found_filepath}: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': '提交评分任务时发生内部错误'}), 500
 
-    # --- 5. 返回包含详细结果的 JSON ---
+    # --- 4. 立即返回 job id，前端轮询 /api/jobs/<job_id> 获取结果 ---
     return jsonify({
         'success': True,
-        'message': '评分完成并已保存。(Scoring complete and saved)',
-        **evaluation_result
-    }), 200
\ No newline at end of file
+        'message': '评分任务已提交。(Scoring job queued)',
+        'job_id': job_id,
+        'status': JOB_QUEUED,
+        'status_url': url_for('get_scoring_job', job_id=job_id)
+    }), 202
+
+
+@current_app.route('/api/jobs/<job_id>')
+@login_required
+def get_scoring_job(job_id):
+    """查询评分任务状态：queued / running / done / failed，完成时附带评分结果。"""
+    job_status = get_job_status(job_id)
+    if job_status is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    if job_status['user_id'] != current_user.id and not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    return jsonify({'success': True, **job_status}), 200
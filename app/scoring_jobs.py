@@ -0,0 +1,174 @@
+# app/scoring_jobs.py
+# 跟读评分异步任务：请求线程只负责入队，Whisper 转写与评分在有界线程池中执行。
+import json
+import uuid
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from . import db
+from .models import ScoringJob, PronunciationScore, UserStats
+from .scoring_utils import evaluate_audio_recording
+
+# --- 任务状态 ---
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# --- 进程内线程池 (懒加载) ---
+_executor = None
+_executor_lock = threading.Lock()
+_pending_count = 0 # 本进程中排队 + 执行中的任务数
+
+
+class JobQueueFull(Exception):
+    """排队任务数已达 SCORING_JOB_QUEUE_MAX 上限。"""
+    pass
+
+
+def _get_executor():
+    """按配置创建 (或返回已有的) 评分线程池。"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = max(1, current_app.config.get('SCORING_JOB_WORKERS', 1))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scoring-job')
+            current_app.logger.info(f"Scoring job executor started with {workers} worker thread(s).")
+        return _executor
+
+
+def save_pronunciation_score(user_id, lesson_number, evaluation_result):
+    """保存/更新用户对某课的评分记录 (每个用户每课只保留一条)，并更新预聚合统计。调用者负责 commit。"""
+    score_record = PronunciationScore.query.filter_by(user_id=user_id, lesson_number=lesson_number).first()
+    previous_score = score_record.final_score if score_record else None
+    if score_record:
+        current_app.logger.info(f"Updating existing score record for user {user_id}, lesson {lesson_number}")
+        score_record.timestamp = datetime.utcnow() # 更新时间戳
+    else:
+        current_app.logger.info(f"Creating new score record for user {user_id}, lesson {lesson_number}")
+        score_record = PronunciationScore(user_id=user_id, lesson_number=lesson_number)
+        db.session.add(score_record)
+    score_record.final_score = evaluation_result.get('final_score')
+    score_record.accuracy_score = evaluation_result.get('accuracy')
+    score_record.fluency_score = evaluation_result.get('fluency_score')
+    score_record.speed_score = evaluation_result.get('speed_score') # 需要评分函数返回
+    score_record.recognized_text = evaluation_result.get('recognized_text')
+    score_record.wer = evaluation_result.get('wer')
+    score_record.speech_rate_wps = evaluation_result.get('speech_rate_wps')
+    UserStats.record_pronunciation_score(user_id, lesson_number, score_record.final_score, previous_score)
+    return score_record
+
+
+def enqueue_scoring_job(user_id, lesson_number, audio_path, reference_text):
+    """创建评分任务记录并提交到线程池，立即返回 job id。队列已满时抛出 JobQueueFull。"""
+    global _pending_count
+    queue_max = current_app.config.get('SCORING_JOB_QUEUE_MAX', 16)
+    with _executor_lock:
+        if _pending_count >= queue_max:
+            raise JobQueueFull(f"Scoring queue is full ({_pending_count}/{queue_max}).")
+        _pending_count += 1
+
+    try:
+        job = ScoringJob(id=uuid.uuid4().hex, user_id=user_id, lesson_number=lesson_number, status=JOB_QUEUED)
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+        app = current_app._get_current_object()
+        _get_executor().submit(_run_scoring_job, app, job_id, user_id, lesson_number, audio_path, reference_text)
+    except Exception:
+        db.session.rollback()
+        with _executor_lock:
+            _pending_count -= 1
+        raise
+
+    current_app.logger.info(f"Enqueued scoring job {job_id} for user {user_id}, lesson {lesson_number}: {audio_path}")
+    return job_id
+
+
+def _run_scoring_job(app, job_id, user_id, lesson_number, audio_path, reference_text):
+    """在工作线程中执行评分并写入 PronunciationScore，结果/错误记录到 ScoringJob。"""
+    global _pending_count
+    with app.app_context():
+        log = app.logger
+        try:
+            job = db.session.get(ScoringJob, job_id)
+            if job is None:
+                log.error(f"Scoring job {job_id} vanished before it could run.")
+                return
+            job.status = JOB_RUNNING
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+
+            try:
+                evaluation_result = evaluate_audio_recording(audio_path, reference_text)
+            except FileNotFoundError as e:
+                _mark_failed(job, f'评估失败：找不到文件 - {e}')
+                return
+            except ValueError as e:
+                _mark_failed(job, f'评估失败：输入无效 - {e}')
+                return
+            except Exception as e:
+                log.error(f"Crit err processing {audio_path} (job {job_id}): {e}", exc_info=True)
+                _mark_failed(job, '处理或评分时发生内部错误')
+                return
+
+            try:
+                save_pronunciation_score(user_id, lesson_number, evaluation_result)
+                job.status = JOB_DONE
+                job.result_json = json.dumps(evaluation_result, ensure_ascii=False)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                log.info(f"Scoring job {job_id} done. Pronunciation score saved/updated successfully.")
+            except Exception as e:
+                db.session.rollback()
+                log.error(f"Error saving pronunciation score to DB (job {job_id}): {e}", exc_info=True)
+                job = db.session.get(ScoringJob, job_id)
+                if job is not None:
+                    # 评分计算成功但保存失败，仍返回评分结果供查看
+                    job.result_json = json.dumps(evaluation_result, ensure_ascii=False)
+                    _mark_failed(job, '评分计算完成，但保存结果时出错。')
+        except Exception as e:
+            db.session.rollback()
+            log.error(f"Unexpected error in scoring job {job_id}: {e}", exc_info=True)
+        finally:
+            db.session.remove()
+            with _executor_lock:
+                _pending_count -= 1
+
+
+def _mark_failed(job, message):
+    job.status = JOB_FAILED
+    job.error = message
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    current_app.logger.warning(f"Scoring job {job.id} failed: {message}")
+
+
+def get_job_status(job_id):
+    """返回任务状态字典；任务不存在时返回 None。超时未完成的任务报告为 failed。"""
+    job = db.session.get(ScoringJob, job_id)
+    if job is None:
+        return None
+
+    status = job.status
+    error = job.error
+    if status in (JOB_QUEUED, JOB_RUNNING):
+        timeout = current_app.config.get('SCORING_JOB_TIMEOUT', 600)
+        if job.created_at and datetime.utcnow() - job.created_at > timedelta(seconds=timeout):
+            # 所在进程可能已退出 (重启/崩溃)，不再等待
+            status = JOB_FAILED
+            error = '评分任务超时，请重试。'
+
+    return {
+        'job_id': job.id,
+        'user_id': job.user_id,
+        'lesson_number': job.lesson_number,
+        'status': status,
+        'result': json.loads(job.result_json) if job.result_json else None,
+        'error': error,
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M:%S') + ' UTC' if job.created_at else None,
+        'finished_at': job.finished_at.strftime('%Y-%m-%d %H:%M:%S') + ' UTC' if job.finished_at else None,
+    }
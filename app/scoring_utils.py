@@ -1,35 +1,77 @@
 # app/scoring_utils.py
 import os
-import whisper
-import librosa
-import soundfile as sf
 import re
+import threading
 import numpy as np # librosa.effects.split 返回 numpy 数组
-from jiwer import wer
 import logging # 使用 Flask 的 logger
+from .lazy_imports import lazy_module
+
+# --- 重量级依赖懒加载 (首次使用时才 import torch/whisper/librosa) ---
+whisper = lazy_module('whisper')
+librosa = lazy_module('librosa')
+jiwer = lazy_module('jiwer')
 
 # --- 全局模型变量 ---
 whisper_model = None
+_whisper_load_lock = threading.Lock()
+
+# --- 音频解码参数 ---
+# Whisper 与 librosa 分析统一使用 16 kHz 单声道 float32，录音只解码一次
+SAMPLE_RATE = 16000
 
 # --- 日志记录器 ---
 # 获取 Flask 应用的 logger (在函数中通过 current_app 获取)
 # logger = logging.getLogger(__name__) # 如果想用独立 logger
 from flask import current_app # 导入 current_app
+from .model_server import model_server_enabled, get_model_client
+from .transcription_cache import get_transcription_cache
 
 # --- 模型加载函数 (可以在 app/__init__.py 中调用) ---
-def load_whisper_model(model_name):
-    """加载 Whisper 模型"""
+def load_whisper_model(model_name, force_local=False):
+    """加载 Whisper 模型。配置了 MODEL_SERVER_SOCKET 时由模型服务持有模型，本进程不加载 (force_local 除外)。"""
     global whisper_model
-    if whisper_model is None:
-        try:
-            # 自动检测设备 (GPU 或 CPU)
-            whisper_model = whisper.load_model(model_name)
-            current_app.logger.info(f"Whisper model '{model_name}' loaded successfully.")
-        except Exception as e:
-            current_app.logger.error(f"Failed to load Whisper model '{model_name}': {e}", exc_info=True)
-            whisper_model = None # 标记加载失败
+    if not force_local and model_server_enabled():
+        current_app.logger.info(f"MODEL_SERVER_SOCKET is set; Whisper '{model_name}' is served by the model server, not loaded in this process.")
+        return None
+    with _whisper_load_lock: # 评分线程可能同时触发首次加载
+        if whisper_model is None:
+            try:
+                # 自动检测设备 (GPU 或 CPU)
+                whisper_model = whisper.load_model(model_name)
+                current_app.logger.info(f"Whisper model '{model_name}' loaded successfully.")
+            except Exception as e:
+                current_app.logger.error(f"Failed to load Whisper model '{model_name}': {e}", exc_info=True)
+                whisper_model = None # 标记加载失败
     return whisper_model
 
+# --- 音频解码 (每个录音只解码一次) ---
+def load_audio(audio_path, sr=SAMPLE_RATE):
+    """通过 ffmpeg 将音频文件解码为单声道 float32 数组 (默认 16 kHz)，供各评分阶段共享。"""
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError(f"Audio file not found at {audio_path}")
+    if sr == SAMPLE_RATE:
+        # whisper.load_audio 直接调用 ffmpeg 重采样，支持 webm/ogg 等浏览器录音格式
+        audio = whisper.load_audio(audio_path)
+    else:
+        audio, _ = librosa.load(audio_path, sr=sr, mono=True)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+def _as_waveform(audio, sr=SAMPLE_RATE):
+    """接受文件路径或已解码的数组，返回 float32 数组 (兼容旧的按路径调用方式)。"""
+    if isinstance(audio, np.ndarray):
+        return audio
+    return load_audio(audio, sr=sr)
+
+def _describe_audio(audio):
+    """日志中使用的音频描述 (路径或数组长度)。"""
+    if isinstance(audio, np.ndarray):
+        return f"<waveform {len(audio)} samples>"
+    return str(audio)
+
+def get_audio_duration(audio, sr=SAMPLE_RATE):
+    """由采样点数计算时长 (秒)，不再重新读取文件。"""
+    return len(audio) / float(sr) if sr else 0.0
+
 # --- 文本标准化 ---
 def normalize_text(text):
     """对文本进行标准化处理，用于评分比较。"""
@@ -41,29 +83,70 @@ def normalize_text(text):
     return text
 
 # --- 音频转文本 ---
-def transcribe_audio(audio_path):
-    """使用加载的 Whisper 模型将音频转为文本。"""
+# temperature=0.0 使输出更具确定性; fp16=False for CPU stability
+WHISPER_DECODE_OPTIONS = {'language': 'en', 'temperature': 0.0, 'fp16': False}
+
+def transcription_cache_key(audio):
+    """返回 (转写缓存, 缓存键)；缓存关闭时为 (None, None)。audio 为文件路径时按文件字节计算，无需先解码。"""
+    cache = get_transcription_cache()
+    if cache is None:
+        return None, None
+    model_name = current_app.config.get('WHISPER_MODEL_SIZE', 'small')
+    return cache, cache.make_key(audio, model_name, WHISPER_DECODE_OPTIONS)
+
+def transcribe_audio(audio, cache_key=None):
+    """使用加载的 Whisper 模型将音频转为文本。
+
+    audio 可以是文件路径，也可以是 load_audio() 返回的 16 kHz float32 数组；
+    传入数组时 Whisper 不会再次调用 ffmpeg 解码。配置了模型服务时转发给服务端执行。
+    cache_key 为 transcription_cache_key(录音路径) 的结果时，按源文件而不是解码后的数组查找缓存。
+    """
+    # 先查转写缓存 (在加载模型之前)：同一录音 + 模型 + 解码参数命中时完全跳过推理
+    if cache_key is not None:
+        cache = get_transcription_cache()
+    elif isinstance(audio, np.ndarray) or os.path.exists(audio):
+        cache, cache_key = transcription_cache_key(audio)
+    else:
+        cache = None
+    if cache is not None:
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            current_app.logger.info(f"Transcription cache hit for {_describe_audio(audio)}: {cached_text}")
+            return cached_text
+
+    recognized_text = _run_whisper(audio)
+    if cache is not None:
+        cache.put(cache_key, recognized_text)
+    return recognized_text
+
+def _run_whisper(audio):
+    """不经缓存直接转写 (本进程模型或模型服务)。"""
     global whisper_model
-    if whisper_model is None:
+    client = get_model_client()
+    if client is None and whisper_model is None:
+        # 未在启动时预加载 (WHISPER_PRELOAD=false)，首次转写时加载
+        load_whisper_model(current_app.config.get('WHISPER_MODEL_SIZE', 'small'))
+    if client is None and whisper_model is None:
         current_app.logger.error("Whisper model is not loaded. Cannot transcribe.")
         raise ValueError("Whisper model not loaded") # 抛出异常让调用者处理
 
+    audio_desc = _describe_audio(audio)
     try:
         # 检查音频文件是否存在且可读
-        if not os.path.exists(audio_path):
-             raise FileNotFoundError(f"Audio file not found at {audio_path}")
-
-        # 可以选择性地添加音频检查（16kHz, Mono），但 Whisper 内部通常能处理
-        # check_audio(audio_path) # 如果需要
-
-        current_app.logger.info(f"Transcribing audio file: {audio_path}")
-        # temperature=0.0 使输出更具确定性
-        result = whisper_model.transcribe(audio_path, language='en', temperature=0.0, fp16=False) # fp16=False for CPU stability
-        recognized_text = result.get('text', '') # 获取文本，如果 key 不存在则返回空字符串
+        if not isinstance(audio, np.ndarray) and not os.path.exists(audio):
+             raise FileNotFoundError(f"Audio file not found at {audio}")
+
+        if client is not None:
+            current_app.logger.info(f"Transcribing audio via model server: {audio_desc}")
+            recognized_text = client.transcribe(audio, **WHISPER_DECODE_OPTIONS)
+        else:
+            current_app.logger.info(f"Transcribing audio: {audio_desc}")
+            result = whisper_model.transcribe(audio, **WHISPER_DECODE_OPTIONS)
+            recognized_text = result.get('text', '') # 获取文本，如果 key 不存在则返回空字符串
         current_app.logger.info(f"Transcription result: {recognized_text}")
         return recognized_text
     except Exception as e:
-        current_app.logger.error(f"Whisper transcription failed for {audio_path}: {e}", exc_info=True)
+        current_app.logger.error(f"Whisper transcription failed for {audio_desc}: {e}", exc_info=True)
         raise # 重新抛出异常，让调用者知道出错了
 
 # --- 计算准确率 (基于 1 - WER) ---
@@ -82,7 +165,7 @@ def calculate_accuracy_score(reference_text, transcribed_text):
         return 0.0 # 准确率为 0
 
     try:
-        error_rate = wer(norm_reference, norm_transcribed)
+        error_rate = jiwer.wer(norm_reference, norm_transcribed)
         current_app.logger.info(f"WER calculation: {error_rate:.4f}")
         # 准确率 = 1 - 错误率。WER 可能 > 1，所以用 max(0, ...) 限制最低为 0
         accuracy = max(0.0, 1.0 - error_rate)
@@ -92,19 +175,22 @@ def calculate_accuracy_score(reference_text, transcribed_text):
         return 0.0 # 计算出错时返回 0
 
 # --- 计算语速 (WPS) ---
-def calculate_speech_rate_wps(audio_path, transcribed_text):
-    """计算语速 (Words Per Second)。"""
+def calculate_speech_rate_wps(audio, transcribed_text, sr=SAMPLE_RATE):
+    """计算语速 (Words Per Second)。audio 为已解码数组 (或文件路径)，时长由采样点数得出。"""
     try:
-        y, sr = librosa.load(audio_path, sr=16000)
-        duration = librosa.get_duration(y=y, sr=sr)
+        y = _as_waveform(audio, sr=sr)
+        duration = get_audio_duration(y, sr)
         current_app.logger.info(f"[INFO] Audio Duration: {duration:.2f} seconds")
-        word_count = len(transcribed_text.split())
-        speech_rate = word_count / duration if duration > 0 else 0
-        return round(speech_rate, 2)
+        return speech_rate_from_duration(transcribed_text, duration)
     except Exception as e:
-        current_app.logger.error(f"Error calculating speech rate for {audio_path}: {e}", exc_info=True)
+        current_app.logger.error(f"Error calculating speech rate for {_describe_audio(audio)}: {e}", exc_info=True)
         return 0.0
 
+def speech_rate_from_duration(transcribed_text, duration):
+    """由识别文本的词数与录音时长 (秒) 计算语速 (WPS)。"""
+    word_count = len(transcribed_text.split())
+    return round(word_count / duration, 2) if duration > 0 else 0
+
 # --- 语速打分 ---
 def rate_speech_speed_score(wps: float) -> float:
     """根据 WPS 评估语速，给出一个 0-100 的分数。"""
@@ -123,13 +209,15 @@ def rate_speech_speed_score(wps: float) -> float:
         else: score = 100 - (wps - ideal_max) * (100 - min_score) / (upper_bound_wps - ideal_max); return round(max(min_score, score), 2)
 
 # --- 计算流畅度分数 ---
-def calculate_fluency_score(audio_path: str, sr: int = 16000, top_db: int = 30, long_pause_threshold: float = 1.5, penalty_per_long_pause: int = 15) -> float:
-    """计算流畅度分数 (0-100)，基于说话密度和长停顿惩罚。"""
+def calculate_fluency_score(audio, sr: int = SAMPLE_RATE, top_db: int = 30, long_pause_threshold: float = 1.5, penalty_per_long_pause: int = 15) -> float:
+    """计算流畅度分数 (0-100)，基于说话密度和长停顿惩罚。audio 为已解码数组 (或文件路径)。"""
+    audio_desc = _describe_audio(audio)
     try:
-        y, current_sr = librosa.load(audio_path, sr=sr)
-        if len(y) == 0: current_app.logger.warning(f"Fluency: Audio empty: {audio_path}"); return 0.0
-        total_duration = librosa.get_duration(y=y, sr=current_sr)
-        if total_duration == 0: current_app.logger.warning(f"Fluency: Zero duration: {audio_path}"); return 0.0
+        y = _as_waveform(audio, sr=sr)
+        current_sr = sr
+        if len(y) == 0: current_app.logger.warning(f"Fluency: Audio empty: {audio_desc}"); return 0.0
+        total_duration = get_audio_duration(y, current_sr)
+        if total_duration == 0: current_app.logger.warning(f"Fluency: Zero duration: {audio_desc}"); return 0.0
 
         intervals = librosa.effects.split(y, top_db=top_db) # 查找非静音片段
 
@@ -148,11 +236,11 @@ def calculate_fluency_score(audio_path: str, sr: int = 16000, top_db: int = 30,
         final_score = base_score - (long_pause_count * penalty_per_long_pause)
         final_score = max(0.0, min(100.0, final_score)) # Clip score to 0-100
 
-        current_app.logger.info(f"Fluency score for {audio_path}: {final_score:.2f} (Ratio: {speaking_ratio:.2f}, Long Pauses: {long_pause_count})")
+        current_app.logger.info(f"Fluency score for {audio_desc}: {final_score:.2f} (Ratio: {speaking_ratio:.2f}, Long Pauses: {long_pause_count})")
         return round(final_score, 2)
 
     except Exception as e:
-        current_app.logger.error(f"Error calculating fluency for {audio_path}: {e}", exc_info=True)
+        current_app.logger.error(f"Error calculating fluency for {audio_desc}: {e}", exc_info=True)
         return 0.0
 
 # --- 计算最终总分 ---
@@ -181,13 +269,25 @@ def evaluate_audio_recording(audio_path, reference_text):
     if not reference_text:
          raise ValueError("Reference text cannot be empty for evaluation.")
 
-    # 1. 转文本
-    transcribed_text = transcribe_audio(audio_path) # 内部会检查模型是否加载
+    # 0. 先按录音文件的字节查转写缓存：条目带有时长与流畅度时无需解码，也无需加载 Whisper
+    cache, cache_key = transcription_cache_key(audio_path)
+    entry = cache.get_entry(cache_key) if cache is not None else None
+    if entry is not None and 'duration' in entry and 'fluency_score' in entry:
+        current_app.logger.info(f"Transcription cache hit for {audio_path}, skipping decode.")
+        transcribed_text, duration, fluency_score = entry['text'], entry['duration'], entry['fluency_score']
+    else:
+        # 解码一次 (16 kHz mono float32)，后续各阶段共享同一数组
+        audio = load_audio(audio_path)
+        # 1. 转文本 (只有文本的旧条目直接复用其文本)
+        transcribed_text = entry['text'] if entry is not None else _run_whisper(audio)
+        duration = get_audio_duration(audio)
+        fluency_score = calculate_fluency_score(audio)
+        if cache is not None:
+            cache.put(cache_key, transcribed_text, duration=duration, fluency_score=fluency_score)
 
     # 2. 计算各项指标
     accuracy = calculate_accuracy_score(reference_text, transcribed_text)
-    speech_rate = calculate_speech_rate_wps(audio_path, transcribed_text)
-    fluency_score = calculate_fluency_score(audio_path)
+    speech_rate = speech_rate_from_duration(transcribed_text, duration)
 
     # 3. 计算总分
     final_score = calculate_final_score(accuracy, speech_rate, fluency_score)
@@ -9,9 +9,12 @@
 // --- Global Quiz State Variables ---
 // These variables hold information about the currently active quiz session
 // Initialize quizContext with a complete structure to avoid errors when checking properties
-let currentQuizData = null; // Stores the array of question objects received from API {id, lesson, question, part_of_speech, correct_answer}
+let currentQuizData = null; // Stores the array of question objects received from API {id, lesson, question, part_of_speech, choices?}
 let userAnswers = {};       // Stores user's input keyed by vocabulary ID { vocab_id: "user's answer" }
-let quizContext = {         // Stores info about the quiz { lesson_ids: [], quiz_type: "", question_ids: [] }
+let quizContext = {         // Stores info about the quiz { quiz_id: "", lesson_ids: [], quiz_type: "", question_ids: [] }
+    quiz_id: "",         // Server-side quiz session id returned by /api/quiz
+    local: false,        // true when built in the browser from vocabulary packs (no quiz_id)
+    submit_key: "",      // one-time key of a local quiz (server rejects a second submission)
     lesson_ids: [],
     quiz_type: "",
     question_ids: [] // Ensure question_ids is always an array
@@ -141,6 +144,9 @@ function resetQuizStateVariables() {
      userAnswers = {};
      // Reset quizContext to its initial structure
      quizContext = {
+         quiz_id: "",
+         local: false,
+         submit_key: "",  // One-time key of a local quiz
          lesson_ids: [],
          quiz_type: "",
          question_ids: []
@@ -216,6 +222,33 @@ function displayQuestions(questionsToDisplay) { // <--- Accepts parameter
         // Add lesson number to the prompt
         questionLabel.innerHTML = `题目 ${index + 1} (L${question.lesson}): ${question.question}${posText}:`;
 
+        // Multiple-choice question (type=choice): one radio button per option, value is the option text
+        if (Array.isArray(question.choices) && question.choices.length > 0) {
+            questionLabel.removeAttribute('for');
+            cardBody.appendChild(questionLabel);
+            question.choices.forEach((choice, choiceIndex) => {
+                const optionDiv = document.createElement('div');
+                optionDiv.classList.add('form-check');
+                const radio = document.createElement('input');
+                radio.setAttribute('type', 'radio');
+                radio.setAttribute('id', `${inputId}-${choiceIndex}`);
+                radio.setAttribute('name', inputId);
+                radio.setAttribute('data-vocab-id', question.id);
+                radio.value = choice;
+                radio.classList.add('form-check-input');
+                const optionLabel = document.createElement('label');
+                optionLabel.setAttribute('for', `${inputId}-${choiceIndex}`);
+                optionLabel.classList.add('form-check-label');
+                optionLabel.textContent = choice;
+                optionDiv.appendChild(radio);
+                optionDiv.appendChild(optionLabel);
+                cardBody.appendChild(optionDiv);
+            });
+            questionDiv.appendChild(cardBody);
+            questionsContainer.appendChild(questionDiv);
+            return;
+        }
+
         const answerInput = document.createElement('input');
         answerInput.setAttribute('type', 'text');
         answerInput.setAttribute('id', inputId);
@@ -285,6 +318,12 @@ function collectAnswers() {
             userAnswers[vocabId] = input.value.trim();
         }
     });
+    // Multiple-choice questions: the checked option's text is the answer (unanswered questions stay empty)
+    questionsContainer.querySelectorAll('input[type="radio"][data-vocab-id]').forEach(radio => {
+        const vocabId = radio.dataset.vocabId;
+        if (!(vocabId in userAnswers)) userAnswers[vocabId] = '';
+        if (radio.checked) userAnswers[vocabId] = radio.value;
+    });
     console.log("quiz_logic.js: Answers collected for", Object.keys(userAnswers).length, "questions.");
 }
 
@@ -304,7 +343,7 @@ async function submitQuiz() {
     // --- 1. Disable UI Elements Immediately ---
     if (submitQuizBtn) submitQuizBtn.disabled = true;
     if (questionsContainer) {
-        questionsContainer.querySelectorAll('input[type="text"]').forEach(input => {
+        questionsContainer.querySelectorAll('input[data-vocab-id]').forEach(input => {
             input.disabled = true; // Prevent further input during submission
         });
     }
@@ -338,7 +377,7 @@ async function submitQuiz() {
         // Re-enable UI because submission was blocked before API call
         if (submitQuizBtn) submitQuizBtn.disabled = false;
         if (questionsContainer) {
-             questionsContainer.querySelectorAll('input[type="text"]').forEach(input => {
+             questionsContainer.querySelectorAll('input[data-vocab-id]').forEach(input => {
                  input.disabled = false;
              });
          }
@@ -392,11 +431,22 @@ async function submitQuiz() {
 
     // --- 8. Perform API Call ---
     try {
-        const response = await fetch('/api/submit_quiz', {
-            method: 'POST', // *** Ensure method is POST ***
-            headers: headers,
-            body: JSON.stringify(payload)
-        });
+        let response;
+        try {
+            response = await fetch('/api/submit_quiz', {
+                method: 'POST', // *** Ensure method is POST ***
+                headers: headers,
+                body: JSON.stringify(payload)
+            });
+        } catch (networkError) {
+            // Network unreachable: keep fill-in quizzes in the offline queue, synced later via /api/sync
+            if (queueOfflineAttempt(window.quizContext, userAnswers)) {
+                showLoading(false);
+                showError("网络不可用，本次答案已保存在本机，联网后会自动同步。(Offline: answers saved locally and will sync later.)");
+                return;
+            }
+            throw networkError;
+        }
 
         // Hide loading indicator once response is received
         showLoading(false);
@@ -439,7 +489,7 @@ async function submitQuiz() {
         // Re-enable UI elements on error
         if (submitQuizBtn) submitQuizBtn.disabled = false;
         if (questionsContainer) {
-            questionsContainer.querySelectorAll('input[type="text"]').forEach(input => {
+            questionsContainer.querySelectorAll('input[data-vocab-id]').forEach(input => {
                 input.disabled = false;
             });
         }
@@ -512,6 +562,7 @@ function displayResults(results) {
                   <span class="text-danger small">你的答案: ${item.user_answer !== null && item.user_answer !== '' ? item.user_answer : '<em>(未作答)</em>'}</span><br>
                   <span class="text-success small">正确答案: ${item.correct_answer}</span>
                 </div>
+                ${item.vocab_id ? favoriteButtonHtml(item.vocab_id, item.is_favorite === true) : ''}
                 `;
             incorrectListUl.appendChild(li);
         });
@@ -524,6 +575,16 @@ function displayResults(results) {
         incorrectListUl.appendChild(li);
     }
 
+    // Answers accepted despite a one-letter typo (server option ANSWER_FUZZY_ENGLISH): show the correct spelling
+    if (Array.isArray(results.typo_accepted)) {
+        results.typo_accepted.forEach(item => {
+            const li = document.createElement('li');
+            li.classList.add('list-group-item', 'text-warning', 'small');
+            li.textContent = `拼写接近，已判为正确: ${item.user_answer} → ${item.correct_answer}`;
+            incorrectListUl.appendChild(li);
+        });
+    }
+
     // Ensure the restart button is visible and enabled in the results area
     const restartBtn = resultsArea.querySelector('#restart-quiz-btn'); // Get the button *within* the results area
     if (restartBtn) {
@@ -594,107 +655,253 @@ function resetQuizUI() {
 }
 
 
-// --- Favorite Toggle Handler Function (Keep if needed) ---
-// This function is attached via event delegation in DOMContentLoaded
-async function handleFavoriteToggle(event) {
-    // event.target is the element that was clicked
-    // .closest('.favorite-toggle-btn') finds the nearest ancestor (or self) with the class 'favorite-toggle-btn'
-    const toggleButton = event.target.closest('.favorite-toggle-btn');
+// --- Favorite Toggles (batched via /api/favorites/batch) ---
+// Star clicks update the button immediately and are queued; after a short pause all queued changes
+// are sent in one request (one transaction on the server). Clicking the same star twice before the
+// flush cancels out. Pending changes are flushed with keepalive when the page is hidden.
+const FAVORITE_FLUSH_DELAY_MS = 400;
+const pendingFavorites = new Map(); // vocabId -> { original, desired }
+let favoriteFlushTimer = null;
+let favoriteFlushChain = Promise.resolve(); // Batches are sent one after another, in click order
+
+/** Updates every star button for a vocabulary item on the page. */
+function setFavoriteButtons(vocabId, isFavorite) {
+    document.querySelectorAll(`.favorite-toggle-btn[data-vocab-id="${vocabId}"]`).forEach(button => {
+        button.dataset.isFavorite = isFavorite ? 'true' : 'false';
+        button.title = isFavorite ? '从收藏中移除 (Remove from Favorites)' : '添加到收藏 (Add to Favorites)';
+        const icon = button.querySelector('i.bi');
+        if (icon) {
+            icon.classList.toggle('bi-star-fill', isFavorite);
+            icon.classList.toggle('bi-star', !isFavorite);
+            icon.classList.toggle('text-warning', isFavorite);
+        }
+    });
+}
 
-    if (!toggleButton) {
-        // If the click wasn't on or inside a favorite toggle button, do nothing
-        return;
-    }
+/** Star button markup for lists built in JS (e.g. quiz results). */
+function favoriteButtonHtml(vocabId, isFavorite) {
+    return `<button type="button" class="btn btn-link p-1 favorite-toggle-btn" data-vocab-id="${vocabId}"
+                    data-is-favorite="${isFavorite ? 'true' : 'false'}"
+                    title="${isFavorite ? '从收藏中移除 (Remove from Favorites)' : '添加到收藏 (Add to Favorites)'}">
+                <i class="bi ${isFavorite ? 'bi-star-fill text-warning' : 'bi-star'} fs-5"></i>
+            </button>`;
+}
 
-    event.preventDefault(); // Prevent default action (e.g., navigating if it's a link)
+// This function is attached via event delegation in DOMContentLoaded
+function handleFavoriteToggle(event) {
+    const toggleButton = event.target.closest('.favorite-toggle-btn');
+    if (!toggleButton) return;
+    event.preventDefault();
 
-    const vocabId = toggleButton.dataset.vocabId; // Assuming vocab ID is stored in data-vocab-id
+    const vocabId = toggleButton.dataset.vocabId;
     if (!vocabId) {
         console.warn("Favorite toggle button missing data-vocab-id attribute.");
-        // Optionally show an error to the user
-        // showError("无法获取词汇ID。"); // Requires showError to be accessible
         return;
     }
+    const desired = toggleButton.dataset.isFavorite !== 'true';
+    const pending = pendingFavorites.get(vocabId);
+    const original = pending ? pending.original : !desired;
+    if (desired === original) {
+        pendingFavorites.delete(vocabId); // Toggled back before the flush: nothing to send
+    } else {
+        pendingFavorites.set(vocabId, { original: original, desired: desired });
+    }
+    setFavoriteButtons(vocabId, desired);
 
-    console.log(`Toggling favorite for vocab ID: ${vocabId}`);
+    clearTimeout(favoriteFlushTimer);
+    favoriteFlushTimer = setTimeout(() => flushFavoriteChanges(), FAVORITE_FLUSH_DELAY_MS);
+}
 
-    // Optimistic UI Update (Optional but good for responsiveness)
-    // toggleButton.classList.toggle('favorited'); // Toggle a class for styling
-    // toggleButton.querySelector('i.bi').classList.toggle('bi-star').classList.toggle('bi-star-fill'); // Toggle icon
+/** Sends all queued favorite changes in one request. */
+function flushFavoriteChanges(keepalive = false) {
+    clearTimeout(favoriteFlushTimer);
+    favoriteFlushTimer = null;
+    if (!pendingFavorites.size) return favoriteFlushChain;
+    const batch = new Map(pendingFavorites);
+    pendingFavorites.clear();
+    favoriteFlushChain = favoriteFlushChain.then(() => sendFavoriteBatch(batch, keepalive));
+    return favoriteFlushChain;
+}
 
-    // Send request to backend API to toggle favorite status
-    const url = `/api/vocab/${vocabId}/favorite`;
+async function sendFavoriteBatch(batch, keepalive) {
+    const add = [], remove = [];
+    batch.forEach((change, vocabId) => (change.desired ? add : remove).push(parseInt(vocabId, 10)));
     const csrfToken = document.querySelector('meta[name="csrf-token"]')?.getAttribute('content');
-
+    const headers = { 'Content-Type': 'application/json', 'Accept': 'application/json' };
+    if (csrfToken) headers['X-CSRFToken'] = csrfToken;
     try {
-        // Indicate loading or pending state on the button if desired
-        // toggleButton.disabled = true;
-
-        const response = await fetch(url, {
-            method: 'POST', // Assuming POST for toggling state
-            headers: {
-                'X-CSRFToken': csrfToken, // Include CSRF token
-                'Accept': 'application/json'
-            }
+        const response = await fetch('/api/favorites/batch', {
+            method: 'POST', headers: headers, keepalive: keepalive, body: JSON.stringify({ add: add, remove: remove })
         });
-
-        if (!response.ok) {
-             let errorMsg = `Toggle favorite failed (${response.status})`;
-             try { const errorData = await response.json(); errorMsg = errorData.error || errorMsg; } catch(e) {}
-             throw new Error(errorMsg);
+        const data = await response.json();
+        if (!response.ok || !data.success) throw new Error(data.error || `Server error: ${response.status}`);
+        console.log(`quiz_logic.js: Favorites saved: ${add.length} added, ${remove.length} removed.`);
+        // Apply the server's final state unless the user clicked the star again in the meantime
+        Object.entries(data.favorites || {}).forEach(([vocabId, isFavorite]) => {
+            if (!pendingFavorites.has(vocabId)) setFavoriteButtons(vocabId, isFavorite);
+        });
+        document.dispatchEvent(new CustomEvent('favorites:changed', { detail: data.favorites || {} }));
+    } catch (error) {
+        console.error("quiz_logic.js: Error saving favorites:", error);
+        batch.forEach((change, vocabId) => {
+            if (!pendingFavorites.has(vocabId)) setFavoriteButtons(vocabId, change.original);
+        });
+        if (typeof window.quizLogic !== 'undefined' && typeof window.quizLogic.showError === 'function') {
+            window.quizLogic.showError(`收藏操作失败: ${error.message}`);
+        } else {
+            alert(`收藏操作失败: ${error.message}`);
         }
+    }
+}
 
-        const result = await response.json(); // Expecting a JSON response, maybe with the new state { is_favorited: true/false }
-        console.log(`Favorite toggle successful for ${vocabId}:`, result);
-
-        // Update UI based on backend response (more reliable than optimistic update)
-        // Assuming the result includes the new favorite status
-        const isFavorited = result.is_favorited;
-        if (isFavorited !== undefined) {
-             // Remove both potential classes first
-             toggleButton.classList.remove('favorited', 'not-favorited');
-             toggleButton.classList.add(isFavorited ? 'favorited' : 'not-favorited');
-
-             // Find the icon within the button
-             const icon = toggleButton.querySelector('i.bi');
-             if(icon) {
-                  icon.classList.remove('bi-star', 'bi-star-fill');
-                  icon.classList.add(isFavorited ? 'bi-star-fill' : 'bi-star');
-                  // Optional: Change icon color via class (e.g., text-warning for favorited)
-                  // icon.classList.remove('text-warning');
-                  // if(isFavorited) icon.classList.add('text-warning');
-             }
+window.addEventListener('pagehide', () => flushFavoriteChanges(true));
 
-        } else {
-            console.warn("Backend response for favorite toggle did not include 'is_favorited' status.");
-            // If backend doesn't return status, you might need to just toggle based on previous state or re-fetch data
-        }
 
-        // Optionally show a temporary success message
-        // if (typeof window.quizLogic !== 'undefined' && typeof window.quizLogic.showError === 'function') {
-        //      window.quizLogic.showError(isFavorited ? '已收藏' : '已取消收藏'); // Reuse showError or create a showSuccess
-        // }
+// --- Offline Attempt Queue (synced via /api/sync) ---
+// Fill-in quizzes that could not be submitted are stored in localStorage with a client-generated
+// idempotency key and the time they were answered. The queue is flushed on page load and when the
+// browser comes back online; replays of an already-synced key are ignored by the server.
+const OFFLINE_QUEUE_KEY = 'autoenglish.offlineAttempts';
+const SYNC_BATCH_SIZE = 50; // Matches SYNC_MAX_BATCH_SIZE on the server
+let offlineSyncInProgress = false;
+
+function readOfflineQueue() {
+    try {
+        const queue = JSON.parse(localStorage.getItem(OFFLINE_QUEUE_KEY) || '[]');
+        return Array.isArray(queue) ? queue : [];
+    } catch (e) {
+        return [];
+    }
+}
 
+function writeOfflineQueue(queue) {
+    try {
+        if (queue.length) localStorage.setItem(OFFLINE_QUEUE_KEY, JSON.stringify(queue));
+        else localStorage.removeItem(OFFLINE_QUEUE_KEY);
+        return true;
+    } catch (e) {
+        console.warn("quiz_logic.js: Could not write offline queue:", e);
+        return false;
+    }
+}
 
-    } catch (error) {
-        console.error(`Error toggling favorite for vocab ID ${vocabId}:`, error);
-         // Revert optimistic update if it failed (if you did one)
-         // toggleButton.classList.toggle('favorited'); // Toggle back
-         // toggleButton.querySelector('i.bi').classList.toggle('bi-star').classList.toggle('bi-star-fill'); // Toggle icon back
-
-        // Show error message to the user
-         if (typeof window.quizLogic !== 'undefined' && typeof window.quizLogic.showError === 'function') {
-              window.quizLogic.showError(`收藏操作失败: ${error.message}`);
-         } else {
-             alert(`收藏操作失败: ${error.message}`);
-         }
+function newIdempotencyKey() {
+    if (window.crypto && typeof window.crypto.randomUUID === 'function') return window.crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+}
 
+/** Queues the current quiz for later sync. Returns false for quiz types the server cannot score offline. */
+function queueOfflineAttempt(context, answers) {
+    if (!context || (context.quiz_type !== 'cn_to_en' && context.quiz_type !== 'en_to_cn')) return false;
+    const queue = readOfflineQueue();
+    queue.push({
+        key: context.submit_key || newIdempotencyKey(), // A local quiz keeps its one-time key, so it is scored once
+        timestamp: Date.now(),
+        quiz_type: context.quiz_type,
+        lesson_ids: context.lesson_ids || [],
+        question_ids: context.question_ids || [],
+        answers: answers || {}
+    });
+    return writeOfflineQueue(queue);
+}
+
+/** Sends queued attempts in batches; entries the server saved, skipped as duplicate or rejected are dropped. */
+async function flushOfflineQueue() {
+    if (offlineSyncInProgress || !navigator.onLine) return;
+    let queue = readOfflineQueue();
+    if (!queue.length) return;
+    offlineSyncInProgress = true;
+    const csrfToken = document.querySelector('meta[name="csrf-token"]')?.getAttribute('content');
+    const headers = { 'Content-Type': 'application/json', 'Accept': 'application/json' };
+    if (csrfToken) headers['X-CSRFToken'] = csrfToken;
+    try {
+        while (queue.length) {
+            const batch = queue.slice(0, SYNC_BATCH_SIZE);
+            const response = await fetch('/api/sync', { method: 'POST', headers: headers, body: JSON.stringify({ attempts: batch }) });
+            if (!response.ok) {
+                console.warn(`quiz_logic.js: Offline sync failed (${response.status}), will retry later.`);
+                break;
+            }
+            const result = await response.json();
+            const done = new Set((result.results || []).filter(item => item.status).map(item => item.key));
+            queue = readOfflineQueue().filter(item => !done.has(item.key)); // Re-read: another tab may have queued more
+            writeOfflineQueue(queue);
+            console.log(`quiz_logic.js: Synced offline attempts: ${result.saved} saved, ${result.duplicates} duplicate(s).`);
+            if (batch.every(item => !done.has(item.key))) break; // No progress, avoid looping
+        }
+    } catch (error) {
+        console.warn("quiz_logic.js: Offline sync deferred:", error);
     } finally {
-        // Re-enable the button
-        // toggleButton.disabled = false;
+        offlineSyncInProgress = false;
     }
 }
 
+window.addEventListener('online', flushOfflineQueue);
+document.addEventListener('DOMContentLoaded', flushOfflineQueue);
+
+
+// --- Local Practice Quizzes from Static Vocabulary Packs ---
+// /vocab-packs/manifest.json lists one pack per lesson with a content-hash filename. Packs are cached by the
+// browser as immutable, so after the first load a practice quiz is built without contacting the server;
+// only the submission goes to /api/submit_quiz (quiz_context.local = true, scored server-side).
+let vocabManifestPromise = null;   // One manifest request per page load
+const vocabPackCache = {};         // { filename: Promise<pack> }
+
+function loadVocabManifest() {
+    if (!vocabManifestPromise) {
+        vocabManifestPromise = fetch('/vocab-packs/manifest.json', { cache: 'no-cache' }) // Revalidated with ETag (304)
+            .then(response => {
+                if (!response.ok) throw new Error(`词汇清单加载失败 (${response.status})`);
+                return response.json();
+            })
+            .catch(error => { vocabManifestPromise = null; throw error; });
+    }
+    return vocabManifestPromise;
+}
+
+function loadVocabPack(filename) {
+    if (!vocabPackCache[filename]) {
+        vocabPackCache[filename] = fetch(`/vocab-packs/${filename}`)
+            .then(response => {
+                if (!response.ok) throw new Error(`词汇包加载失败 (${response.status})`);
+                return response.json();
+            })
+            .catch(error => { delete vocabPackCache[filename]; throw error; });
+    }
+    return vocabPackCache[filename];
+}
+
+/**
+ * Builds a fill-in quiz (cn_to_en / en_to_cn) for the given lessons from the vocabulary packs.
+ * Returns { quiz_type, questions, submit_key } in the same shape as /api/quiz, with a one-time submit_key
+ * (recorded by the server on submission, so the quiz can only be scored once) instead of a quiz_id.
+ */
+async function buildLocalQuiz(lessonNumbers, count, quizType) {
+    if (quizType !== 'cn_to_en' && quizType !== 'en_to_cn') {
+        throw new Error(`Local quizzes do not support type ${quizType}`);
+    }
+    const manifest = await loadVocabManifest();
+    const files = lessonNumbers.map(n => manifest.lessons[String(n)]).filter(Boolean).map(entry => entry.file);
+    const packs = await Promise.all(files.map(loadVocabPack));
+    const pool = [];
+    packs.forEach(pack => pack.words.forEach(([id, englishWord, partOfSpeech, translation]) => {
+        pool.push({ id: id, lesson: pack.lesson, english_word: englishWord, part_of_speech: partOfSpeech, chinese_translation: translation });
+    }));
+    // Partial Fisher-Yates shuffle: only the first `count` positions are needed
+    const k = Math.min(count, pool.length);
+    for (let i = 0; i < k; i++) {
+        const j = i + Math.floor(Math.random() * (pool.length - i));
+        [pool[i], pool[j]] = [pool[j], pool[i]];
+    }
+    const questions = pool.slice(0, k).map(item => ({
+        id: item.id,
+        lesson: item.lesson,
+        question: quizType === 'cn_to_en' ? item.chinese_translation : item.english_word,
+        part_of_speech: item.part_of_speech
+    }));
+    return { quiz_type: quizType, questions: questions, submit_key: newIdempotencyKey() };
+}
+
 
 // --- Expose necessary functions to the global window.quizLogic object ---
 // This allows page-specific scripts (in scripts_extra) to call these core functions.
@@ -705,9 +912,64 @@ window.quizLogic = {
     hideError: hideError,
     displayQuestions: displayQuestions, // Accepts data parameter now
     resetQuizUI: resetQuizUI,           // Needed by restart buttons
+    buildLocalQuiz: buildLocalQuiz,     // Practice quiz from cached vocabulary packs
+    flushOfflineQueue: flushOfflineQueue, // Sync quizzes answered while offline
 
     // Note: submitQuiz is NOT exposed here because its listener is attached
     // directly to the button by quiz_logic.js itself.
     // handleFavoriteToggle is attached via delegation, also not needed here.
 };
-console.log("quiz_logic.js: Core functions exposed on window.quizLogic");
\ No newline at end of file
+console.log("quiz_logic.js: Core functions exposed on window.quizLogic");
+
+// --- "Load More" Lists (keyset pagination: history, wrong answers, favorites) ---
+
+/**
+ * Wires a `[data-load-more]` container: fetches `data-url?cursor=...` when scrolled into view
+ * (or when its button is clicked) and appends the returned `html` to `data-target`.
+ */
+function initLoadMore(container) {
+    const target = document.getElementById(container.dataset.target);
+    const button = container.querySelector('button');
+    if (!target || !button) return;
+    let loading = false;
+    let observer = null;
+
+    async function loadMore() {
+        const cursor = container.dataset.cursor;
+        if (loading || !cursor) return;
+        loading = true;
+        button.disabled = true;
+        try {
+            const params = new URLSearchParams({ cursor: cursor, start: container.dataset.start || '0' });
+            const response = await fetch(`${container.dataset.url}?${params}`, { headers: { 'Accept': 'application/json' } });
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || `Server error: ${response.status}`);
+            target.insertAdjacentHTML('beforeend', data.html);
+            container.dataset.start = (parseInt(container.dataset.start || '0', 10) + data.items.length).toString();
+            container.dataset.cursor = data.next_cursor || '';
+            button.textContent = '加载更多 (Load more)';
+            if (!data.next_cursor) {
+                if (observer) observer.disconnect();
+                container.classList.add('d-none');
+            }
+        } catch (error) {
+            console.error("quiz_logic.js: Failed to load more rows:", error);
+            button.textContent = '加载失败，点击重试 (Retry)';
+        } finally {
+            loading = false;
+            button.disabled = false;
+        }
+    }
+
+    button.addEventListener('click', loadMore);
+    if ('IntersectionObserver' in window) {
+        observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) loadMore();
+        }, { rootMargin: '200px' });
+        observer.observe(container);
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('[data-load-more]').forEach(initLoadMore);
+});
@@ -0,0 +1,162 @@
+# app/transcription_cache.py
+# 转写结果磁盘缓存：同一段录音 (相同音频字节 + 模型 + 解码参数) 只跑一次 Whisper。
+# 评分时以录音文件的字节为键、在 ffmpeg 解码之前查找；条目同时保存时长与流畅度分数，命中时整个评分无需解码。
+# 缓存位于 instance 目录下，超过容量上限时按最近使用时间 (LRU) 淘汰。
+import os
+import json
+import hashlib
+import threading
+
+import numpy as np
+from flask import current_app
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class TranscriptionCache:
+    """以 JSON 文件保存转写结果，文件 mtime 作为最近使用时间，用于 LRU 淘汰。"""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = self._scan_total_bytes()
+
+    # --- 缓存键 ---
+    @staticmethod
+    def make_key(audio, model_name, options):
+        """音频内容哈希 + 模型名 + 解码参数 → 缓存键。audio 可为文件路径或已解码数组。"""
+        digest = hashlib.sha256()
+        if isinstance(audio, np.ndarray):
+            digest.update(b'pcm:')
+            digest.update(np.ascontiguousarray(audio).tobytes())
+        else:
+            digest.update(b'file:')
+            with open(audio, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        digest.update(f"|model={model_name}|".encode('utf-8'))
+        digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    # --- 读写 ---
+    def get_entry(self, key):
+        """命中时返回条目 {'text': ..., 及 put() 时附带的指标} 并刷新其最近使用时间；未命中返回 None。"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path, None) # LRU: 更新最近使用时间
+        except (OSError, ValueError):
+            entry = None
+        if not isinstance(entry, dict) or entry.get('text') is None:
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def get(self, key):
+        """命中时返回识别文本；未命中返回 None。"""
+        entry = self.get_entry(key)
+        return entry['text'] if entry is not None else None
+
+    def put(self, key, text, **metrics):
+        """保存识别文本；metrics 为同一录音的其他分析结果 (如 duration、fluency_score)，一并写入条目。"""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        payload = json.dumps(dict(metrics, text=text), ensure_ascii=False)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, path) # 原子替换，避免并发读到半个文件
+        except OSError as e:
+            current_app.logger.warning(f"Could not write transcription cache entry {path}: {e}")
+            try: os.remove(tmp_path)
+            except OSError: pass
+            return
+        with self._lock:
+            self._total_bytes += len(payload.encode('utf-8')) - replaced
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    # --- 淘汰 ---
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_total_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """删除最久未使用的条目，直到总大小回到上限的 90% 以下 (其他进程的写入也一并统计)。"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._total_bytes = total
+        if removed:
+            current_app.logger.info(f"Transcription cache evicted {removed} entries, now {total} bytes.")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'pid': os.getpid(), # 计数器按进程统计
+            }
+
+
+def get_transcription_cache():
+    """返回当前应用的转写缓存；TRANSCRIPTION_CACHE_ENABLED 关闭时返回 None。"""
+    global _cache
+    if not current_app.config.get('TRANSCRIPTION_CACHE_ENABLED', True):
+        return None
+    cache_dir = current_app.config.get('TRANSCRIPTION_CACHE_DIR', 'transcription_cache')
+    if not os.path.isabs(cache_dir):
+        cache_dir = os.path.join(current_app.instance_path, cache_dir)
+    with _cache_lock:
+        if _cache is None or _cache.cache_dir != cache_dir:
+            try:
+                _cache = TranscriptionCache(cache_dir, current_app.config.get('TRANSCRIPTION_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+            except OSError as e:
+                current_app.logger.error(f"Could not create transcription cache directory '{cache_dir}': {e}")
+                return None
+        return _cache
@@ -0,0 +1,90 @@
+# app/tts_batch.py
+# `flask audio generate --workers N` 使用的并行合成工具：
+# 每个子进程各自创建应用和 TTS 引擎，torch 线程数按 worker 数均分；单个 worker 崩溃不会中断其他课程。
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# --- 子进程状态 ---
+_worker_app = None
+
+
+def threads_per_worker(workers):
+    """按 worker 数均分 CPU 核心，每个 worker 至少 1 个 torch 线程。"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def init_worker(num_threads):
+    """子进程初始化：限制 torch 线程数并创建应用 (TTS 引擎在首次合成时懒加载，每个进程一份)。"""
+    global _worker_app
+    # 必须在 torch 首次导入前设置，才能约束 OpenMP/MKL 线程池
+    os.environ['OMP_NUM_THREADS'] = str(num_threads)
+    os.environ['MKL_NUM_THREADS'] = str(num_threads)
+    from . import create_app
+    from .tts_utils import torch
+    _worker_app = create_app()
+    try:
+        torch.set_num_threads(num_threads)
+    except Exception as e:
+        _worker_app.logger.warning(f"Could not set torch thread count to {num_threads}: {e}")
+
+
+def synthesize_lesson(lesson_number, text, language, force):
+    """在子进程中合成一课音频，返回 (lesson_number, 输出路径或 None, 耗时秒数)。"""
+    from .tts_utils import generate_and_save_audio_if_not_exists
+    start = time.time()
+    with _worker_app.app_context():
+        path = generate_and_save_audio_if_not_exists(lesson_number=lesson_number, text=text, language=language, force=force)
+    return lesson_number, path, time.time() - start
+
+
+def _collect(futures, on_result):
+    """等待 futures 完成并调用 on_result；返回因进程池崩溃而未完成的 [(lesson_number, text, 异常), ...]。"""
+    crashed = []
+    for future in as_completed(futures):
+        lesson_number, text = futures[future]
+        try:
+            _, path, elapsed = future.result()
+            on_result(lesson_number, path, elapsed, None)
+        except BrokenProcessPool as e:
+            crashed.append((lesson_number, text, e))
+        except Exception as e:
+            on_result(lesson_number, None, 0.0, str(e))
+    return crashed
+
+
+def run_parallel(jobs, workers, language, force, on_result, max_attempts=2):
+    """
+    并行合成 jobs = [(lesson_number, text), ...]。
+
+    每完成一课调用 on_result(lesson_number, path, elapsed, error)。
+    某个 worker 进程崩溃 (BrokenProcessPool) 时，同一进程池中所有未完成的课程都会失败，无法区分是哪一课导致的；
+    这些课程逐课在各自的单进程池中重试 (同时最多 workers 个)，只有单独运行时的崩溃才计入该课程，
+    单独重试 max_attempts 次仍崩溃才报告失败，其余课程不受影响。
+    """
+    num_threads = threads_per_worker(workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(num_threads,)) as pool:
+        futures = {pool.submit(synthesize_lesson, lesson_number, text, language, force): (lesson_number, text)
+                   for lesson_number, text in jobs}
+        pending = [(lesson_number, text) for lesson_number, text, _ in _collect(futures, on_result)]
+
+    attempts = {lesson_number: 0 for lesson_number, _ in pending}
+    while pending:
+        retry = []
+        for start in range(0, len(pending), workers):
+            batch = pending[start:start + workers]
+            pools = [ProcessPoolExecutor(max_workers=1, initializer=init_worker, initargs=(num_threads,)) for _ in batch]
+            try:
+                futures = {pool.submit(synthesize_lesson, lesson_number, text, language, force): (lesson_number, text)
+                           for pool, (lesson_number, text) in zip(pools, batch)}
+                for lesson_number, text, e in _collect(futures, on_result):
+                    attempts[lesson_number] += 1
+                    if attempts[lesson_number] < max_attempts:
+                        retry.append((lesson_number, text))
+                    else:
+                        on_result(lesson_number, None, 0.0, f"worker process crashed: {e}")
+            finally:
+                for pool in pools:
+                    pool.shutdown()
+        pending = retry
@@ -1,19 +1,30 @@
 # app/tts_utils.py
-from TTS.api import TTS as APITTS
-import torch
 import os
+import re
+import json
+import wave
+import hashlib
 import logging
 import time
+import threading
+from contextlib import contextmanager
 from flask import current_app
+from .lazy_imports import lazy_module
+from .model_server import get_model_client
+from .media_index import get_media_index
+
+# --- 重量级依赖懒加载 (首次合成时才 import TTS/torch) ---
+tts_api = lazy_module('TTS.api')
+torch = lazy_module('torch')
 
 log = logging.getLogger(__name__)
-tts_engine_instance: APITTS | None = None
+tts_engine_instance = None # TTS.api.TTS | None
 
 # --- 从配置读取默认值 ---
 # 注意: 默认值在这里设置意义不大，因为主要依赖 Flask Config
 DEFAULT_TTS_MODEL = "tts_models/en/ljspeech/tacotron2-DDC"
 
-def initialize_tts_model() -> APITTS | None:
+def initialize_tts_model():
     """(懒加载) 初始化并返回 TTS API 类的实例 (Tacotron2 + Vocoder)。"""
     global tts_engine_instance
     if tts_engine_instance is not None:
@@ -30,7 +41,7 @@ def initialize_tts_model() -> APITTS | None:
         log.info(f"Target device: {device}")
 
         # --- 使用 TTS API 类初始化 (包含声码器) ---
-        tts_engine = APITTS(
+        tts_engine = tts_api.TTS(
             model_name=model_name,
             progress_bar=True
         )
@@ -45,34 +56,251 @@ def initialize_tts_model() -> APITTS | None:
         tts_engine_instance = None
         return None
 
-def get_audio_filename(lesson_number: int) -> str | None:
-    """生成并确保音频缓存目录存在，返回标准音频文件路径。(保持不变)"""
+def get_audio_cache_dir() -> str | None:
+    """返回 (并确保存在) TTS 音频缓存目录。"""
     cache_dir_base = current_app.config.get('TTS_AUDIO_CACHE_DIR')
     if not cache_dir_base:
         log.error("TTS_AUDIO_CACHE_DIR is not set in Flask config.")
         return None
+    if not os.path.isabs(cache_dir_base):
+         cache_dir = os.path.join(current_app.instance_path, cache_dir_base)
+    else:
+         cache_dir = cache_dir_base
     try:
-        if not os.path.isabs(cache_dir_base):
-             cache_dir = os.path.join(current_app.instance_path, cache_dir_base)
-        else:
-             cache_dir = cache_dir_base
         os.makedirs(cache_dir, exist_ok=True)
         log.debug(f"Ensured TTS audio cache directory exists: {cache_dir}")
     except OSError as e:
         log.error(f"Could not create or access TTS audio cache directory '{cache_dir}': {e}")
         return None
+    return cache_dir
+
+
+def get_audio_filename(lesson_number: int) -> str | None:
+    """生成并确保音频缓存目录存在，返回标准音频文件路径。(保持不变)"""
+    cache_dir = get_audio_cache_dir()
+    if not cache_dir:
+        return None
     filename = f"lesson_{lesson_number}.wav"
     full_path = os.path.join(cache_dir, filename)
     return full_path
 
 
-def generate_and_save_audio_if_not_exists(lesson_number: int, text: str, language: str = None, force: bool = False) -> str | None:
+# --- 句子级音频缓存 ---
+# 课文按句拆分，每句合成的音频以 (句子文本, 模型, 语言) 的哈希命名缓存在 <cache_dir>/sentences/ 下，
+# 课程音频由各句拼接而成。修改课文后只需重新合成改动过的句子。
+SENTENCE_CLIP_SUBDIR = 'sentences'
+SENTENCE_GAP_SECONDS = 0.3 # 句间静音
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+|(?<=[.!?]["\'”’])\s+|\n+')
+
+
+def split_sentences(text: str) -> list[str]:
+    """将课文拆分为句子 (按 .?! 之后的空白及换行)，去掉空句。"""
+    if not text:
+        return []
+    return [part.strip() for part in _SENTENCE_SPLIT_RE.split(text) if part and part.strip()]
+
+
+def _clip_key(sentence: str, model_name: str, language: str | None) -> str:
+    return hashlib.sha1(f"{model_name}\0{language or ''}\0{sentence}".encode('utf-8')).hexdigest()
+
+
+def get_sentence_clip_path(sentence: str, language: str = None) -> str | None:
+    """返回某句话的缓存音频路径 (不保证已生成)。"""
+    cache_dir = get_audio_cache_dir()
+    if not cache_dir:
+        return None
+    clip_dir = os.path.join(cache_dir, SENTENCE_CLIP_SUBDIR)
+    try:
+        os.makedirs(clip_dir, exist_ok=True)
+    except OSError as e:
+        log.error(f"Could not create sentence clip directory '{clip_dir}': {e}")
+        return None
+    model_name = current_app.config.get('TTS_MODEL', DEFAULT_TTS_MODEL)
+    return os.path.join(clip_dir, f"{_clip_key(sentence, model_name, language)}.wav")
+
+
+def _manifest_path(output_filepath: str) -> str:
+    base, _ = os.path.splitext(output_filepath)
+    return f"{base}.manifest.json"
+
+
+def _lesson_signature(text: str, language: str | None) -> str:
+    """课程音频签名：由各句的 clip key 决定，文本、模型或语言改变时签名随之改变。"""
+    model_name = current_app.config.get('TTS_MODEL', DEFAULT_TTS_MODEL)
+    keys = [_clip_key(sentence, model_name, language) for sentence in split_sentences(text)]
+    return hashlib.sha1('|'.join(keys).encode('utf-8')).hexdigest()
+
+
+def _adopt_legacy_audio(lesson_number: int, output_filepath: str, text: str, language: str | None):
+    """为没有 manifest 的旧版课程音频写入当前课文的签名 (没有句子片段可复用，clips 为空)。"""
+    try:
+        _write_manifest(output_filepath, {
+            'signature': _lesson_signature(text, language),
+            'model': current_app.config.get('TTS_MODEL', DEFAULT_TTS_MODEL),
+            'language': language,
+            'clips': [],
+            'legacy': True,
+        })
+        log.info(f"Lesson {lesson_number}: Adopted legacy audio {output_filepath} (manifest written for the current text).")
+    except OSError as e:
+        log.warning(f"Lesson {lesson_number}: Could not write manifest for legacy audio {output_filepath}: {e}")
+
+
+def is_lesson_audio_stale(lesson_number: int, text: str, language: str = None) -> bool:
+    """
+    课程音频是否需要(重新)生成：文件不存在，或 manifest 记录的签名与当前课文不符。
+    旧版整课合成的文件没有 manifest：视为与当前课文一致并补写 manifest (采纳)，此后课文的修改即可被发现。
+    """
+    output_filepath = get_audio_filename(lesson_number)
+    if not output_filepath or not os.path.exists(output_filepath):
+        return True
+    try:
+        with open(_manifest_path(output_filepath), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        _adopt_legacy_audio(lesson_number, output_filepath, text, language)
+        return False
+    except (OSError, ValueError):
+        return True
+    return manifest.get('signature') != _lesson_signature(text, language)
+
+
+def _tmp_clip_path(clip_path: str) -> str:
+    # 不同课程可能含相同句子，临时文件名带上进程与线程 id，避免互相覆盖
+    return f"{clip_path}.{os.getpid()}.{threading.get_ident()}.tmp.wav"
+
+
+def _concatenate_wavs(clip_paths: list[str], output_filepath: str, gap_seconds: float = SENTENCE_GAP_SECONDS):
+    """按顺序拼接 PCM WAV 片段 (句间插入静音)，先写临时文件再原子替换。"""
+    tmp_path = f"{output_filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    params = None
+    silence = b''
+    try:
+        with wave.open(tmp_path, 'wb') as out:
+            for index, clip_path in enumerate(clip_paths):
+                with wave.open(clip_path, 'rb') as clip:
+                    clip_format = (clip.getnchannels(), clip.getsampwidth(), clip.getframerate())
+                    if params is None:
+                        params = clip_format
+                        out.setnchannels(params[0]); out.setsampwidth(params[1]); out.setframerate(params[2])
+                        silence = b'\x00' * (int(params[2] * gap_seconds) * params[0] * params[1])
+                    elif clip_format != params:
+                        raise ValueError(f"Clip {clip_path} format {clip_format} differs from {params}")
+                    if index > 0:
+                        out.writeframes(silence)
+                    out.writeframes(clip.readframes(clip.getnframes()))
+        os.replace(tmp_path, output_filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            try: os.remove(tmp_path)
+            except OSError: pass
+
+
+# --- 单飞 (single-flight) 合成 ---
+# 多名学生同时打开同一课且尚无缓存时，只允许一个请求/进程合成该课音频，其余请求等待其结果。
+# 用 O_CREAT|O_EXCL 创建的锁文件 <lesson>.wav.lock 协调，线程与进程之间均有效 (不依赖 fcntl，Windows 同样可用)。
+# 持有者每合成完一句刷新锁文件 mtime；超过 TTS_LOCK_STALE_SECONDS 未刷新的锁视为持有者已崩溃，可被接管。
+SINGLE_FLIGHT_POLL_SECONDS = 0.25
+SYNTHESIS_RETRY_AFTER_SECONDS = 5 # 等待超时时建议客户端的重试间隔
+
+
+class SynthesisInProgress(Exception):
+    """同一课的音频正由其他请求合成，等待超过 wait_timeout。"""
+
+    def __init__(self, lesson_number: int, retry_after: int = SYNTHESIS_RETRY_AFTER_SECONDS):
+        super().__init__(f"Lesson {lesson_number}: audio synthesis already in progress")
+        self.lesson_number = lesson_number
+        self.retry_after = retry_after
+
+
+def _break_stale_lock(lock_path: str, stale: os.stat_result):
+    """
+    删除过期锁。先把它原子地改名为本线程独有的文件名，多个等待者中只有一个能改名成功；
+    改名后再核对 inode/mtime，若拿到的已是新持有者的锁 (检查与改名之间被释放并重新获取)，则把它放回原处。
     """
-    Generates TTS audio for the given text and saves it if it doesn't exist or if forced.
+    stale_path = f"{lock_path}.{os.getpid()}.{threading.get_ident()}.stale"
+    try:
+        os.rename(lock_path, stale_path)
+    except OSError:
+        return # 其他等待者已处理，或持有者刚释放
+    try:
+        st = os.stat(stale_path)
+        if (st.st_ino, st.st_mtime_ns) != (stale.st_ino, stale.st_mtime_ns):
+            try:
+                os.link(stale_path, lock_path) # 不覆盖此间新建的锁
+            except OSError:
+                pass
+            return
+        log.warning(f"Removed stale TTS lock {lock_path} (not refreshed for {time.time() - stale.st_mtime:.0f}s).")
+    finally:
+        try: os.remove(stale_path)
+        except OSError: pass
+
+
+def _try_acquire_lock(lock_path: str, stale_after: float) -> bool:
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            st = os.stat(lock_path)
+        except OSError:
+            return False # 刚被释放，下一轮再试
+        if time.time() - st.st_mtime > stale_after:
+            _break_stale_lock(lock_path, st)
+        return False
+    with os.fdopen(fd, 'w') as f:
+        f.write(f"{os.getpid()}:{threading.get_ident()}\n")
+    return True
+
+
+def _refresh_lock(lock_path: str):
+    """持有者的心跳：刷新锁文件 mtime，避免长时间合成被误判为过期锁。"""
+    try:
+        os.utime(lock_path, None)
+    except OSError:
+        pass
+
+
+@contextmanager
+def _lesson_single_flight(lesson_number: int, output_filepath: str, wait_timeout: float | None):
+    """获取课程音频的锁文件；wait_timeout 秒内拿不到则抛出 SynthesisInProgress (None 表示一直等待)。"""
+    lock_path = f"{output_filepath}.lock"
+    stale_after = current_app.config.get('TTS_LOCK_STALE_SECONDS', 600)
+    deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+    waiting = False
+    while not _try_acquire_lock(lock_path, stale_after):
+        if not waiting:
+            log.info(f"Lesson {lesson_number}: Audio is being synthesized by another request, waiting...")
+            waiting = True
+        if deadline is not None and time.monotonic() >= deadline:
+            raise SynthesisInProgress(lesson_number)
+        time.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+    try:
+        yield lock_path
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError as e:
+            log.warning(f"Lesson {lesson_number}: Could not release TTS lock {lock_path}: {e}")
+
+
+def _write_manifest(output_filepath: str, manifest: dict):
+    manifest_path = _manifest_path(output_filepath)
+    tmp_path = f"{manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
 
-    This version uses the configured TTS engine (initialized lazily if needed),
-    handles file existence checks, force regeneration, error handling,
-    and conditional parameter passing for single vs. multi-lingual models.
+
+def generate_and_save_audio_if_not_exists(lesson_number: int, text: str, language: str = None, force: bool = False,
+                                        wait_timeout: float | None = None) -> str | None:
+    """
+    Generates TTS audio for the given text and saves it if it doesn't exist, is stale, or if forced.
+
+    The text is split into sentences; each sentence clip is cached by a hash of
+    (sentence, model, language) and the lesson file is assembled by concatenating
+    the clips, so editing one sentence only re-synthesizes that sentence. A small
+    manifest next to the lesson file records which clips it was built from.
 
     Args:
         lesson_number (int): The lesson number, used for naming the output file.
@@ -80,50 +308,64 @@ def generate_and_save_audio_if_not_exists(lesson_number: int, text: str, languag
         language (str, optional): The language code (e.g., 'en', 'zh-cn').
                                    Required for multi-lingual models like XTTS.
                                    Should be None or omitted for single-language models.
-        force (bool, optional): If True, delete the existing audio file before generating.
-                                Defaults to False.
+        force (bool, optional): If True, rebuild the lesson file and re-synthesize every
+                                sentence clip, ignoring the caches. Defaults to False.
+        wait_timeout (float, optional): Seconds to wait while another caller is synthesizing
+                                        the same lesson. None (default) waits indefinitely.
 
     Returns:
         str | None: The absolute path to the saved audio file on success, otherwise None.
+
+    Raises:
+        SynthesisInProgress: If wait_timeout elapsed while another caller held the lesson lock.
     """
     output_filepath = get_audio_filename(lesson_number)
     if not output_filepath:
         log.error(f"Lesson {lesson_number}: Could not determine output filepath. Check TTS_AUDIO_CACHE_DIR config.")
         return None # Cannot proceed without a valid path
 
-    # --- Handle Force Regeneration ---
-    if force and os.path.exists(output_filepath):
-        log.info(f"Lesson {lesson_number}: Force flag is set. Attempting to remove existing file: {output_filepath}")
-        try:
-            os.remove(output_filepath)
-            log.info(f"Lesson {lesson_number}: Successfully removed existing file.")
-        except OSError as e:
-            log.error(f"Lesson {lesson_number}: Could not remove existing file {output_filepath} despite force flag: {e}")
-            # Depending on desired behavior, you might stop here or continue
-            # return None # Option: Stop if force removal fails
-    # --------------------------------
-
-    # --- Check if File Exists (after potential force removal) ---
-    if os.path.exists(output_filepath):
+    # --- Check if File Exists and matches the current text ---
+    if not force and not is_lesson_audio_stale(lesson_number, text, language):
         log.info(f"Lesson {lesson_number}: Audio file found in cache, skipping generation: {output_filepath}")
         return output_filepath
     # ---------------------------------------------------------
 
-    log.info(f"Lesson {lesson_number}: Audio file not found or forced regeneration. Starting synthesis...")
+    with _lesson_single_flight(lesson_number, output_filepath, wait_timeout) as lock_path:
+        # 等锁期间可能已由其他请求生成完毕
+        if not force and not is_lesson_audio_stale(lesson_number, text, language):
+            log.info(f"Lesson {lesson_number}: Audio was generated by a concurrent request: {output_filepath}")
+            return output_filepath
+        return _synthesize_lesson_audio(lesson_number, text, language, force, output_filepath, lock_path)
 
-    # --- Get or Initialize TTS Engine ---
-    tts_engine = initialize_tts_model() # Lazy initialization
-    if tts_engine is None:
-        log.error(f"Lesson {lesson_number}: Cannot generate audio, TTS engine failed to initialize.")
-        return None
-    # ---------------------------------
 
+def _synthesize_lesson_audio(lesson_number: int, text: str, language: str | None, force: bool,
+                             output_filepath: str, lock_path: str) -> str | None:
+    """持有课程锁时执行实际合成：补齐缺失的句子片段，拼接并写入 manifest。"""
     # --- Validate Input Text ---
-    if not text or not text.strip():
+    sentences = split_sentences(text)
+    if not sentences:
         log.warning(f"Lesson {lesson_number}: No text provided or text is empty. Cannot generate audio.")
         return None # Cannot synthesize empty text
     # -------------------------
 
+    clip_paths = [get_sentence_clip_path(sentence, language) for sentence in sentences]
+    if not all(clip_paths):
+        log.error(f"Lesson {lesson_number}: Could not determine sentence clip paths. Check TTS_AUDIO_CACHE_DIR config.")
+        return None
+    missing = [(sentence, clip_path) for sentence, clip_path in zip(sentences, clip_paths)
+               if force or not os.path.exists(clip_path)]
+    log.info(f"Lesson {lesson_number}: Audio missing, stale or forced. {len(missing)}/{len(sentences)} sentence clip(s) need synthesis.")
+
+    # --- Get or Initialize TTS Engine (or use the shared model server) ---
+    model_client = get_model_client()
+    tts_engine = None
+    if missing and model_client is None:
+        tts_engine = initialize_tts_model() # Lazy initialization
+        if tts_engine is None:
+            log.error(f"Lesson {lesson_number}: Cannot generate audio, TTS engine failed to initialize.")
+            return None
+    # ---------------------------------
+
     # --- Determine Model Type for Parameter Handling ---
     # Check based on model name in config or loaded engine property
     model_name_from_config = current_app.config.get('TTS_MODEL', '')
@@ -131,47 +373,60 @@ def generate_and_save_audio_if_not_exists(lesson_number: int, text: str, languag
                       'xtts' in model_name_from_config.lower() or \
                       (hasattr(tts_engine, 'is_multi_lingual') and tts_engine.is_multi_lingual)
 
+    if is_multilingual and not language:
+        log.error(f"Lesson {lesson_number}: Multi-lingual model requires 'language' parameter, but none provided.")
+        return None # Stop if language is missing for multi-lingual model
+
     log.info(f"Lesson {lesson_number}: Synthesizing (model type: {'Multi-lingual' if is_multilingual else 'Single-language'}, length: {len(text)} chars)")
     start_time = time.time()
+    tts_kwargs = {}
 
-    # --- Prepare arguments for tts_to_file ---
-    tts_kwargs = {
-        "text": text,
-        "file_path": output_filepath,
-        # Add parameters common to most models if needed, e.g., speaker control if model supports it
-    }
-
-    if is_multilingual:
-        if language:
-            tts_kwargs["language"] = language
-            tts_kwargs["split_sentences"] = True # Generally good for XTTS
-            log.debug(f"Lesson {lesson_number}: Passing 'language={language}' and 'split_sentences=True' to multi-lingual model.")
-        else:
-            log.error(f"Lesson {lesson_number}: Multi-lingual model requires 'language' parameter, but none provided.")
-            return None # Stop if language is missing for multi-lingual model
-    else:
-        # For single-language models (like Tacotron2, VITS LJSpeech), DO NOT pass 'language'
-        # 'split_sentences' might also not be supported or beneficial
-        log.debug(f"Lesson {lesson_number}: Not passing 'language' or 'split_sentences' to single-language model.")
-    # ------------------------------------------
-
-    # --- Perform TTS Synthesis ---
+    # --- Perform TTS Synthesis (only the sentences without a cached clip) ---
     try:
-        log.debug(f"Lesson {lesson_number}: Calling tts_to_file with args: {tts_kwargs}")
-        tts_engine.tts_to_file(**tts_kwargs)
-
-        # --- Verify Output File ---
-        if not os.path.exists(output_filepath) or os.path.getsize(output_filepath) == 0:
-             log.error(f"Lesson {lesson_number}: TTS call succeeded but output file is missing or empty: {output_filepath}")
-             # Attempt cleanup just in case an empty file was created
-             if os.path.exists(output_filepath):
-                 try: os.remove(output_filepath)
-                 except OSError: pass
-             return None # Generation failed if file isn't valid
-        # ------------------------
+        for sentence, clip_path in missing:
+            tmp_clip_path = _tmp_clip_path(clip_path)
+            # --- Prepare arguments for tts_to_file ---
+            tts_kwargs = {
+                "text": sentence,
+                "file_path": tmp_clip_path,
+            }
+            if is_multilingual:
+                # 已按句拆分，无需模型再拆
+                tts_kwargs["language"] = language
+                tts_kwargs["split_sentences"] = False
+            # For single-language models (like Tacotron2, VITS LJSpeech), DO NOT pass 'language'
+
+            if model_client is not None:
+                log.debug(f"Lesson {lesson_number}: Sending synthesize request to model server with args: {tts_kwargs}")
+                model_client.synthesize(**tts_kwargs)
+            else:
+                log.debug(f"Lesson {lesson_number}: Calling tts_to_file with args: {tts_kwargs}")
+                tts_engine.tts_to_file(**tts_kwargs)
+
+            # --- Verify Output File ---
+            if not os.path.exists(tmp_clip_path) or os.path.getsize(tmp_clip_path) == 0:
+                log.error(f"Lesson {lesson_number}: TTS call succeeded but clip is missing or empty for sentence: {sentence!r}")
+                if os.path.exists(tmp_clip_path):
+                    try: os.remove(tmp_clip_path)
+                    except OSError: pass
+                return None # Generation failed if file isn't valid
+            os.replace(tmp_clip_path, clip_path)
+            _refresh_lock(lock_path)
+            # ------------------------
+
+        # --- Assemble lesson file from clips and record the manifest ---
+        _concatenate_wavs(clip_paths, output_filepath)
+        _write_manifest(output_filepath, {
+            'signature': _lesson_signature(text, language),
+            'model': current_app.config.get('TTS_MODEL', DEFAULT_TTS_MODEL),
+            'language': language,
+            'clips': [os.path.basename(path) for path in clip_paths],
+        })
+        get_media_index().record(output_filepath)
 
         total_time = time.time() - start_time
-        log.info(f"Lesson {lesson_number}: Successfully generated and saved audio in {total_time:.2f}s to {output_filepath}.")
+        log.info(f"Lesson {lesson_number}: Successfully generated and saved audio in {total_time:.2f}s "
+                 f"({len(missing)} synthesized, {len(sentences) - len(missing)} reused) to {output_filepath}.")
         return output_filepath # Return the path on success
 
     # --- Specific Error Handling ---
@@ -186,12 +441,14 @@ def generate_and_save_audio_if_not_exists(lesson_number: int, text: str, languag
         log.error(f"Lesson {lesson_number}: Unexpected error during TTS synthesis: {e}", exc_info=True) # Log full traceback for unexpected errors
 
     # --- Cleanup and Return None on Error ---
+    # 已完成的句子片段保留在缓存中，下次可直接复用；只清理本次的临时文件
     log.error(f"Lesson {lesson_number}: Synthesis failed.")
-    if os.path.exists(output_filepath): # Attempt to clean up potentially corrupted/empty file
-        try:
-            os.remove(output_filepath)
-            log.debug(f"Lesson {lesson_number}: Removed potentially corrupted file after error: {output_filepath}")
-        except OSError as remove_err:
-             log.error(f"Lesson {lesson_number}: Could not remove file {output_filepath} after error: {remove_err}")
+    for _, clip_path in missing:
+        tmp_clip_path = _tmp_clip_path(clip_path)
+        if os.path.exists(tmp_clip_path):
+            try:
+                os.remove(tmp_clip_path)
+            except OSError as remove_err:
+                log.error(f"Lesson {lesson_number}: Could not remove temp file {tmp_clip_path} after error: {remove_err}")
     return None # Return None to indicate failure
-# --- End of function ---
\ No newline at end of file
+# --- End of function ---
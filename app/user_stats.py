@@ -0,0 +1,76 @@
+# app/user_stats.py
+# 从明细表重新计算预聚合统计 (UserStats / UserLessonStats)。
+# 平时统计在提交测验、保存跟读评分的事务中增量维护 (见 models.UserStats.record_*)；
+# 直接修改数据库、导入历史数据或新部署统计表后，用 `flask stats rebuild` 按相同口径全量重建。
+from datetime import datetime
+
+from . import db
+from .models import QuizAttempt, PronunciationScore, UserStats, UserLessonStats, parse_lessons_attempted
+
+
+def _empty_quiz_totals():
+    return {'quiz_count': 0, 'questions_answered': 0, 'correct_answers': 0, 'last_quiz_at': None}
+
+
+def _add_attempt(totals, score, total_questions, timestamp):
+    totals['quiz_count'] += 1
+    totals['questions_answered'] += total_questions or 0
+    totals['correct_answers'] += score or 0
+    if timestamp and (totals['last_quiz_at'] is None or timestamp > totals['last_quiz_at']):
+        totals['last_quiz_at'] = timestamp
+
+
+def rebuild_user_stats(user_id=None, batch_size=1000):
+    """
+    重新计算全部用户 (或指定用户) 的统计并替换现有行，在一个事务中完成 (读者不会看到半成品)。
+    返回 (用户数, 用户 × 课程行数)。
+    """
+    users, lessons = {}, {}
+    attempts = db.session.query(QuizAttempt.user_id, QuizAttempt.lessons_attempted, QuizAttempt.score,
+                                QuizAttempt.total_questions, QuizAttempt.timestamp)
+    scores = db.session.query(PronunciationScore.user_id, PronunciationScore.lesson_number,
+                              PronunciationScore.final_score)
+    if user_id is not None:
+        attempts = attempts.filter(QuizAttempt.user_id == user_id)
+        scores = scores.filter(PronunciationScore.user_id == user_id)
+
+    # 测验记录逐批流式读取，按用户与课号在内存中累加
+    for attempt_user, lessons_attempted, score, total_questions, timestamp in attempts.yield_per(batch_size):
+        _add_attempt(users.setdefault(attempt_user, _empty_quiz_totals()), score, total_questions, timestamp)
+        for lesson_number in parse_lessons_attempted(lessons_attempted):
+            _add_attempt(lessons.setdefault((attempt_user, lesson_number), _empty_quiz_totals()),
+                         score, total_questions, timestamp)
+
+    pronunciation = {}
+    for score_user, lesson_number, final_score in scores:
+        lesson_row = lessons.setdefault((score_user, lesson_number), _empty_quiz_totals())
+        lesson_row['pronunciation_score'] = final_score
+        users.setdefault(score_user, _empty_quiz_totals())
+        if final_score is not None:
+            count, total = pronunciation.get(score_user, (0, 0.0))
+            pronunciation[score_user] = (count + 1, total + final_score)
+
+    now = datetime.utcnow()
+    user_rows = [dict(totals, user_id=uid, pronunciation_lessons=pronunciation.get(uid, (0, 0.0))[0],
+                      pronunciation_score_sum=pronunciation.get(uid, (0, 0.0))[1], updated_at=now)
+                 for uid, totals in sorted(users.items())]
+    lesson_rows = [dict({'pronunciation_score': None}, **totals, user_id=uid, lesson_number=lesson_number)
+                   for (uid, lesson_number), totals in sorted(lessons.items())]
+
+    try:
+        delete_users = db.delete(UserStats)
+        delete_lessons = db.delete(UserLessonStats)
+        if user_id is not None:
+            delete_users = delete_users.where(UserStats.user_id == user_id)
+            delete_lessons = delete_lessons.where(UserLessonStats.user_id == user_id)
+        db.session.execute(delete_users)
+        db.session.execute(delete_lessons)
+        if user_rows:
+            db.session.execute(db.insert(UserStats), user_rows)
+        if lesson_rows:
+            db.session.execute(db.insert(UserLessonStats), lesson_rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(user_rows), len(lesson_rows)
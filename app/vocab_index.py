@@ -0,0 +1,264 @@
+# app/vocab_index.py
+# 只读的内存词汇索引：按课程保存 id / 单词 / 词性 / 释义 的紧凑数组，
+# /api/quiz 直接从索引中抽题，不再每次请求把所选课程的全部词汇加载成 ORM 对象。
+# 构建时同时为每个词条预先生成两个方向的可接受答案集合 (app/answer_matching.py)，提交测验时只做集合查找。
+#
+# 失效机制:
+#   - 本进程内通过 ORM 增删改 Vocabulary 并提交后，索引立即失效，并重写 instance/vocab_index.stamp；
+#   - 其他进程最多每 VOCAB_INDEX_CHECK_SECONDS 秒检查一次该文件，发现变化后在下次使用时重建；
+#   - 绕过 ORM 直接改表 (SQL 导入等) 后请运行 `flask vocab reindex`。
+import os
+import time
+import hashlib
+import uuid
+import bisect
+import random
+import itertools
+import threading
+from array import array
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import Vocabulary
+from .answer_matching import build_answer_key
+from .weighted_sampling import AliasTable, weighted_sample_without_replacement
+
+VocabEntry = namedtuple('VocabEntry', ['id', 'lesson_number', 'english_word', 'part_of_speech', 'chinese_translation'])
+
+STAMP_FILENAME = 'vocab_index.stamp'
+
+_index = None
+_index_stamp = None      # 构建索引时 stamp 文件的 (inode, mtime_ns)
+_last_check = 0.0
+_index_lock = threading.Lock()
+
+
+class LessonVocab:
+    """一课的词汇，按 id 排序存放在平行数组中。"""
+    __slots__ = ('lesson_number', 'ids', 'words', 'parts_of_speech', 'translations', 'english_keys', 'chinese_keys')
+
+    def __init__(self, lesson_number):
+        self.lesson_number = lesson_number
+        self.ids = array('l')
+        self.words = []
+        self.parts_of_speech = []
+        self.translations = []
+        self.english_keys = () # 答英文 (cn_to_en) 时的 AnswerKey
+        self.chinese_keys = () # 答中文 (en_to_cn) 时的 AnswerKey
+
+    def entry(self, offset):
+        return VocabEntry(self.ids[offset], self.lesson_number, self.words[offset],
+                          self.parts_of_speech[offset], self.translations[offset])
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class VocabularyIndex:
+    """
+    词汇的只读快照。rows 为按 (lesson_number, id) 排序的 (id, lesson, word, pos, translation)。
+    fuzzy_english: 英文答案是否接受编辑距离 1 的拼写。
+    """
+
+    def __init__(self, rows, fuzzy_english=False):
+        self.fuzzy_english = fuzzy_english
+        self.lessons = {}    # {lesson_number: LessonVocab}
+        self._by_id = {}     # {vocab_id: (lesson_number, offset)}
+        digest = hashlib.sha1()
+        for vocab_id, lesson_number, word, pos, translation in rows:
+            digest.update(repr((vocab_id, lesson_number, word, pos, translation)).encode('utf-8'))
+            lesson = self.lessons.get(lesson_number)
+            if lesson is None:
+                lesson = self.lessons[lesson_number] = LessonVocab(lesson_number)
+            self._by_id[vocab_id] = (lesson_number, len(lesson.ids))
+            lesson.ids.append(vocab_id)
+            lesson.words.append(word)
+            lesson.parts_of_speech.append(pos)
+            lesson.translations.append(translation)
+        self.signature = digest.hexdigest() # 词汇内容签名，用于判断派生索引 (如干扰项索引) 是否过期
+        for lesson in self.lessons.values():
+            lesson.words = tuple(lesson.words)
+            lesson.parts_of_speech = tuple(lesson.parts_of_speech)
+            lesson.translations = tuple(lesson.translations)
+            lesson.english_keys = tuple(build_answer_key(word, 'en', fuzzy_english) for word in lesson.words)
+            lesson.chinese_keys = tuple(build_answer_key(translation, 'cn') for translation in lesson.translations)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, vocab_id):
+        """按 id 取词条，不存在时返回 None。"""
+        location = self._by_id.get(vocab_id)
+        if location is None:
+            return None
+        return self.lessons[location[0]].entry(location[1])
+
+    def answer_key(self, vocab_id, answer_language, expected_answer):
+        """
+        返回预先构建的 AnswerKey。expected_answer 为出题时的正确答案文本：
+        若词条已被删除或修改 (与索引中的文本不同)，按 expected_answer 临时构建，保证按出题时的答案评分。
+        """
+        location = self._by_id.get(vocab_id)
+        if location is not None:
+            lesson, offset = self.lessons[location[0]], location[1]
+            if answer_language == 'en' and lesson.words[offset] == expected_answer:
+                return lesson.english_keys[offset]
+            if answer_language == 'cn' and lesson.translations[offset] == expected_answer:
+                return lesson.chinese_keys[offset]
+        return build_answer_key(expected_answer, answer_language, self.fuzzy_english)
+
+    def count(self, lesson_numbers):
+        return sum(len(self.lessons[n]) for n in dict.fromkeys(lesson_numbers) if n in self.lessons)
+
+    def sample(self, lesson_numbers, k, rng=random):
+        """
+        从给定课程的词汇中无放回地随机抽取 k 个 (不足 k 个时全部返回，顺序随机)。
+        只生成被抽中的词条：先在 [0, 总数) 中抽下标，再用前缀和二分定位到课程，O(k log L)。
+        """
+        lessons = [self.lessons[n] for n in dict.fromkeys(lesson_numbers) if n in self.lessons]
+        bounds = []
+        total = 0
+        for lesson in lessons:
+            total += len(lesson)
+            bounds.append(total)
+        if total == 0:
+            return []
+        picks = rng.sample(range(total), min(k, total))
+        entries = []
+        for position in picks:
+            slot = bisect.bisect_right(bounds, position)
+            offset = position - (bounds[slot - 1] if slot else 0)
+            entries.append(lessons[slot].entry(offset))
+        return entries
+
+    def weighted_sample(self, lesson_numbers, k, weights, rng=random):
+        """
+        按权重无放回抽取 k 个词：weights 为 {vocab_id: 权重}，未列出的词权重为 1。
+        每次抽取先按质量选 "薄弱词" (别名表) 或 "普通词" (均匀抽下标，落到薄弱词上时重抽下标)，已抽中的词被拒绝后整次重抽；
+        薄弱词数 m 远小于总词数 n 时整体 O(m + k)。k 或 m 超过一半词数时 (拒绝率过高) 改用 O(n log k) 的 A-Res。
+        """
+        selected = sorted(set(n for n in lesson_numbers if n in self.lessons))
+        weak = {vocab_id: w for vocab_id, w in weights.items()
+                if w > 0 and vocab_id in self._by_id and self._by_id[vocab_id][0] in selected}
+        total = self.count(selected)
+        if not weak:
+            return self.sample(lesson_numbers, k, rng=rng)
+        k = min(k, total)
+        if k * 2 > total or len(weak) * 2 > total:
+            ids = [vocab_id for n in selected for vocab_id in self.lessons[n].ids]
+            picked = weighted_sample_without_replacement(ids, [weak.get(vocab_id, 1.0) for vocab_id in ids], k, rng=rng)
+            return [self.get(vocab_id) for vocab_id in picked]
+
+        lessons = [self.lessons[n] for n in selected]
+        bounds = list(itertools.accumulate(len(lesson) for lesson in lessons))
+        alias = AliasTable(list(weak), list(weak.values()))
+        weak_mass = sum(weak.values())
+        uniform_mass = total - len(weak) # 每个普通词权重 1
+        picked, entries = set(), []
+        while len(entries) < k:
+            if rng.random() * (weak_mass + uniform_mass) < weak_mass:
+                vocab_id = alias.draw(rng)
+                if vocab_id in picked:
+                    continue
+                entry = self.get(vocab_id)
+            else:
+                while True: # 在普通词中均匀抽取：落到薄弱词上只重抽下标 (不能重新选组，否则会偏向薄弱词)
+                    position = rng.randrange(total)
+                    slot = bisect.bisect_right(bounds, position)
+                    entry = lessons[slot].entry(position - (bounds[slot - 1] if slot else 0))
+                    if entry.id not in weak:
+                        break
+                if entry.id in picked:
+                    continue
+            picked.add(entry.id)
+            entries.append(entry)
+        return entries
+
+
+def build_vocab_index():
+    """只查询需要的列 (不构造 ORM 对象) 并构建索引。"""
+    started = time.perf_counter()
+    rows = db.session.query(
+        Vocabulary.id, Vocabulary.lesson_number, Vocabulary.english_word,
+        Vocabulary.part_of_speech, Vocabulary.chinese_translation
+    ).order_by(Vocabulary.lesson_number, Vocabulary.id).all()
+    index = VocabularyIndex(rows, fuzzy_english=current_app.config.get('ANSWER_FUZZY_ENGLISH', False))
+    current_app.logger.info(f"Vocabulary index built: {len(index)} words in {len(index.lessons)} lessons "
+                            f"({(time.perf_counter() - started) * 1000:.1f} ms).")
+    return index
+
+
+# --- 跨进程失效标记 ---
+
+def _stamp_path():
+    return os.path.join(current_app.instance_path, STAMP_FILENAME)
+
+
+def _read_stamp():
+    try:
+        st = os.stat(_stamp_path())
+        return st.st_ino, st.st_mtime_ns
+    except OSError:
+        return None
+
+
+def invalidate_vocab_index():
+    """丢弃本进程的索引，并通知其他进程 (重写 stamp 文件)。"""
+    global _index
+    with _index_lock:
+        _index = None
+    path = _stamp_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, path) # 新 inode，其他进程据此发现变化
+    except OSError as e:
+        current_app.logger.warning(f"Could not update vocabulary index stamp {path}: {e}")
+
+
+def get_vocab_index():
+    """返回当前的词汇索引，必要时 (首次使用或已失效) 重建。"""
+    global _index, _index_stamp, _last_check
+    check_interval = current_app.config.get('VOCAB_INDEX_CHECK_SECONDS', 2)
+    with _index_lock:
+        now = time.monotonic()
+        if _index is not None and now - _last_check >= check_interval:
+            _last_check = now
+            if _read_stamp() != _index_stamp:
+                _index = None
+        if _index is None:
+            _index_stamp = _read_stamp() # 先读标记再查询，构建期间的修改会在下次检查时发现
+            _index = build_vocab_index()
+            _last_check = now
+        return _index
+
+
+# --- ORM 事件：Vocabulary 有增删改并提交后使索引失效 ---
+_CHANGED_KEY = 'vocab_index_changed'
+
+
+def _mark_session_changed(mapper, connection, target):
+    session = sa_inspect(target).session
+    if session is not None:
+        session.info[_CHANGED_KEY] = True
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Vocabulary, _event_name, _mark_session_changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop(_CHANGED_KEY, False):
+        invalidate_vocab_index()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_after_rollback(session):
+    session.info.pop(_CHANGED_KEY, None)
@@ -0,0 +1,135 @@
+# app/vocab_packs.py
+# 静态词汇包：每课一个紧凑的 JSON 文件 + 一个清单 (manifest.json)，浏览器在本地组卷练习，只在提交时访问服务器。
+#
+# - 词汇包文件名包含内容哈希 (lesson-<课号>.<sha256 前 16 位>.json)：内容不变文件名就不变，
+#   以 public, max-age=1 年, immutable 发送，浏览器缓存后不再请求；内容变化时清单指向新文件名。
+# - manifest.json 文件名固定，以 no-cache + ETag 发送 (未变化时 304)。
+# - 清单记录构建时的词汇内容签名 (VocabularyIndex.signature)：词汇被修改 (索引重建) 后，
+#   下一次请求清单时自动重新构建；PDF 导入和 `flask vocab reindex` / `flask vocab build-packs` 也会立即重建。
+import os
+import json
+import time
+import hashlib
+import threading
+
+from flask import current_app
+
+from . import db
+from .models import Lesson
+from .vocab_index import get_vocab_index
+
+MANIFEST_FILENAME = 'manifest.json'
+PACK_FIELDS = ['id', 'english_word', 'part_of_speech', 'chinese_translation']
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def vocab_pack_dir():
+    pack_dir = current_app.config.get('VOCAB_PACK_DIR', 'vocab_packs')
+    if not os.path.isabs(pack_dir):
+        pack_dir = os.path.join(current_app.instance_path, pack_dir)
+    return pack_dir
+
+
+def is_pack_filename(filename):
+    """只接受 lesson-<课号>.<16 位十六进制>.json 形式的文件名。"""
+    parts = filename.split('.')
+    return (len(parts) == 3 and parts[2] == 'json' and parts[0].startswith('lesson-') and parts[0][7:].isdigit()
+            and len(parts[1]) == 16 and all(c in '0123456789abcdef' for c in parts[1]))
+
+
+def _atomic_write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _lesson_titles():
+    """{课号: (英文标题, 中文标题)}，同一课号有多本书时取第一条。"""
+    titles = {}
+    for lesson_number, title_en, title_cn in db.session.query(
+            Lesson.lesson_number, Lesson.title_en, Lesson.title_cn).order_by(Lesson.source_book, Lesson.lesson_number):
+        titles.setdefault(lesson_number, (title_en, title_cn))
+    return titles
+
+
+def _read_manifest(pack_dir):
+    try:
+        with open(os.path.join(pack_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_vocab_packs():
+    """
+    从词汇索引 (不再查询 Vocabulary) 和 Lesson 标题生成全部词汇包与清单，返回清单。
+    内容未变的课程沿用原文件；新旧两代清单都不再引用的旧词汇包被删除。
+    """
+    started = time.perf_counter()
+    vocab_index = get_vocab_index()
+    titles = _lesson_titles()
+    pack_dir = vocab_pack_dir()
+    os.makedirs(pack_dir, exist_ok=True)
+    previous = _read_manifest(pack_dir) or {}
+
+    lessons, written = {}, 0
+    for lesson_number in sorted(vocab_index.lessons):
+        lesson = vocab_index.lessons[lesson_number]
+        title_en, title_cn = titles.get(lesson_number, (None, None))
+        pack = {
+            'lesson': lesson_number, 'title_en': title_en, 'title_cn': title_cn, 'fields': PACK_FIELDS,
+            'words': [[lesson.ids[i], lesson.words[i], lesson.parts_of_speech[i], lesson.translations[i]]
+                      for i in range(len(lesson))],
+        }
+        data = json.dumps(pack, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        filename = f"lesson-{lesson_number}.{hashlib.sha256(data).hexdigest()[:16]}.json"
+        path = os.path.join(pack_dir, filename)
+        if not os.path.exists(path):
+            _atomic_write(path, data)
+            written += 1
+        lessons[str(lesson_number)] = {'file': filename, 'count': len(lesson), 'title_en': title_en, 'title_cn': title_cn}
+
+    manifest = {
+        'version': hashlib.sha256(json.dumps(lessons, sort_keys=True).encode('utf-8')).hexdigest()[:16],
+        'signature': vocab_index.signature,
+        'generated_at': int(time.time()),
+        'lessons': lessons,
+    }
+    _atomic_write(os.path.join(pack_dir, MANIFEST_FILENAME),
+                  json.dumps(manifest, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    # 仍持有上一版清单的页面可能还会请求旧文件，保留上一代
+    keep = {entry['file'] for entry in lessons.values()}
+    keep.update(entry.get('file') for entry in previous.get('lessons', {}).values())
+    removed = 0
+    for filename in os.listdir(pack_dir):
+        if is_pack_filename(filename) and filename not in keep:
+            try:
+                os.remove(os.path.join(pack_dir, filename))
+                removed += 1
+            except OSError:
+                pass
+
+    global _manifest
+    with _manifest_lock:
+        _manifest = manifest
+    current_app.logger.info(f"Vocabulary packs built: {len(lessons)} lessons, {written} file(s) written, "
+                            f"{removed} stale file(s) removed ({(time.perf_counter() - started) * 1000:.0f} ms).")
+    return manifest
+
+
+def ensure_vocab_packs():
+    """返回与当前词汇一致的清单：签名不一致 (词汇已修改) 或清单不存在时重新构建。"""
+    global _manifest
+    signature = get_vocab_index().signature
+    with _manifest_lock:
+        if _manifest is not None and _manifest.get('signature') == signature:
+            return _manifest
+        manifest = _read_manifest(vocab_pack_dir())
+        if manifest is not None and manifest.get('signature') == signature:
+            _manifest = manifest
+            return manifest
+    return build_vocab_packs()
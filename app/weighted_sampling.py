@@ -0,0 +1,107 @@
+# app/weighted_sampling.py
+# 偏向 "薄弱词" 的加权抽题。
+#
+# - weak_word_weights: 一条聚合查询 (错题 UNION ALL 收藏，按词汇分组) 得到当前用户每个薄弱词的权重；
+#   普通词权重为 1，错得越多、越近答错、被收藏的词权重越高，bias (0-1) 控制偏向程度。
+# - 薄弱词通常只占全书的一小部分：只为它们建 Vose 别名表 (AliasTable)，其余词仍用词汇索引均匀抽样，
+#   每次抽取 O(1)，整次请求 O(薄弱词数 + k)，与全书词汇量无关 (见 VocabularyIndex.weighted_sample)。
+import math
+import random
+import heapq
+from datetime import datetime
+
+from sqlalchemy import literal, union_all
+
+from . import db
+from .models import WrongAnswer, UserFavoriteVocabulary
+
+WEAK_SCALE = 4.0          # bias=1 时薄弱程度到权重的放大倍数
+RECENCY_HALF_LIFE = 14.0  # 天：答错时间的影响每 14 天减半
+RECENCY_FLOOR = 0.25      # 很久以前答错的词仍保留的最低影响
+FAVORITE_BONUS = 1.0      # 收藏词额外的薄弱程度
+
+
+class AliasTable:
+    """Vose 别名法：O(n) 构建，之后每次按权重抽取一个元素 O(1) (有放回)。"""
+    __slots__ = ('items', 'probabilities', 'aliases')
+
+    def __init__(self, items, weights):
+        n = len(items)
+        self.items = list(items)
+        self.probabilities = [0.0] * n
+        self.aliases = [0] * n
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            return
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.probabilities[s] = scaled[s]
+            self.aliases[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large: # 浮点误差剩下的都按 1 处理
+            self.probabilities[i] = 1.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def draw(self, rng=random):
+        column = rng.randrange(len(self.items))
+        return self.items[column] if rng.random() < self.probabilities[column] else self.items[self.aliases[column]]
+
+
+def weighted_sample_without_replacement(items, weights, k, rng=random):
+    """Efraimidis-Spirakis (A-Res)：按权重无放回抽取 k 个，O(n log k)。k 接近 n 时使用。"""
+    keyed = ((rng.random() ** (1.0 / w), item) for item, w in zip(items, weights) if w > 0)
+    return [item for _, item in heapq.nlargest(k, keyed, key=lambda pair: pair[0])]
+
+
+def weakness(incorrect_count, last_wrong, is_favorite, now):
+    """薄弱程度 (>= 0)：log(1 + 错误次数) × 时间衰减 + 收藏加成。"""
+    score = 0.0
+    if incorrect_count:
+        days = max(0.0, (now - last_wrong).total_seconds() / 86400) if last_wrong else RECENCY_HALF_LIFE * 4
+        recency = max(RECENCY_FLOOR, 0.5 ** (days / RECENCY_HALF_LIFE))
+        score += math.log1p(incorrect_count) * recency
+    if is_favorite:
+        score += FAVORITE_BONUS
+    return score
+
+
+def weak_word_weights(user_id, bias, now=None):
+    """
+    返回 {vocabulary_id: 权重}，只包含权重 > 1 的词 (其余词权重为 1)。
+    错题与收藏合并为一条 UNION ALL + GROUP BY 查询。
+    """
+    if bias <= 0:
+        return {}
+    now = now or datetime.utcnow()
+    wrongs = db.select(
+        WrongAnswer.vocabulary_id.label('vocabulary_id'),
+        WrongAnswer.incorrect_count.label('incorrect_count'),
+        WrongAnswer.timestamp_last_wrong.label('last_wrong'),
+        literal(0).label('favorite'),
+    ).where(WrongAnswer.user_id == user_id)
+    favorites = db.select(
+        UserFavoriteVocabulary.vocabulary_id,
+        literal(0), literal(None, type_=db.DateTime), literal(1),
+    ).where(UserFavoriteVocabulary.user_id == user_id)
+    combined = union_all(wrongs, favorites).subquery()
+    rows = db.session.execute(db.select(
+        combined.c.vocabulary_id,
+        db.func.max(combined.c.incorrect_count),
+        db.func.max(combined.c.last_wrong),
+        db.func.max(combined.c.favorite),
+    ).group_by(combined.c.vocabulary_id)).all()
+
+    weights = {}
+    for vocab_id, incorrect_count, last_wrong, favorite in rows:
+        if isinstance(last_wrong, str): # SQLite 对 UNION 结果的 MAX() 返回字符串
+            last_wrong = datetime.fromisoformat(last_wrong)
+        score = weakness(incorrect_count or 0, last_wrong, bool(favorite), now)
+        if score > 0:
+            weights[vocab_id] = 1.0 + bias * WEAK_SCALE * score
+    return weights
@@ -33,8 +33,36 @@ class Config:
     # 禁止 SQLAlchemy 发出修改跟踪信号，可以提高性能，通常不需要开启
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # --- 数据库引擎 / 连接池 (见 app/db_engine.py) ---
+    # 每个 worker 进程的连接池：常驻连接数应不小于每进程的线程数，溢出连接在高峰时临时创建
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)  # 秒，等待空闲连接的上限
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)  # 秒，仅服务器型数据库
+    # SQLite 连接参数：WAL 让读不等待写，busy_timeout 让写者排队等待而不是报 "database is locked"
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', 'true').lower() in ['true', 'on', '1']
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'  # WAL 下 NORMAL 安全且少 fsync
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)  # 字节
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB') or 64 * 1024)  # 每个连接的页缓存
+    # 每个请求的 SQL 查询统计 (app/query_stats.py)：响应头默认只在 DEBUG 模式下返回；
+    # 单个请求查询数超过阈值时记录 WARNING，便于发现 N+1 查询
+    SQL_QUERY_STATS = os.environ.get('SQL_QUERY_STATS', 'true').lower() in ['true', 'on', '1']
+    SQL_QUERY_HEADERS = (os.environ.get('SQL_QUERY_HEADERS').lower() in ['true', 'on', '1']
+                         if os.environ.get('SQL_QUERY_HEADERS') else None)  # None: 跟随 DEBUG
+    SQL_QUERY_WARN_THRESHOLD = int(os.environ.get('SQL_QUERY_WARN_THRESHOLD') or 30)
+
     # 分页设置
     POSTS_PER_PAGE = int(os.environ.get('POSTS_PER_PAGE') or 10)
+    # 测试历史 / 错题本 / 收藏列表：游标分页，每次 "加载更多" 的行数及客户端可请求的上限
+    LIST_PAGE_SIZE = int(os.environ.get('LIST_PAGE_SIZE') or 50)
+    LIST_MAX_PAGE_SIZE = int(os.environ.get('LIST_MAX_PAGE_SIZE') or 200)
+    # 收藏状态：每个 worker 进程缓存最近 FAVORITES_CACHE_SIZE 个用户的收藏 id 集合 (0 关闭，改为按页 IN 查询)；
+    # 其他设备上的修改最多 FAVORITES_CACHE_TTL 秒后可见。FAVORITES_BATCH_MAX 为批量接口单次最多处理的词数
+    FAVORITES_CACHE_SIZE = int(os.environ.get('FAVORITES_CACHE_SIZE') or 1024)
+    FAVORITES_CACHE_TTL = int(os.environ.get('FAVORITES_CACHE_TTL') or 300)
+    FAVORITES_BATCH_MAX = int(os.environ.get('FAVORITES_BATCH_MAX') or 500)
 
     # --- 用户权限/角色相关配置 ---
     # 指定管理员用户名，从环境变量读取，默认为 'root'
@@ -54,6 +82,9 @@ class Config:
     print(f"Using TTS Model: {TTS_MODEL}")
     print(f"Attempt to use CUDA: {TTS_USE_CUDA}")
     print(f"TTS Audio Cache Directory (relative to instance path): {TTS_AUDIO_CACHE_DIR}")
+    # 同一课的按需合成只由一个请求/进程执行 (每课一个锁文件)，其余请求最多等待这么久，超时返回 202 让客户端稍后重试
+    TTS_SINGLE_FLIGHT_WAIT = float(os.environ.get('TTS_SINGLE_FLIGHT_WAIT') or 20)  # 秒
+    TTS_LOCK_STALE_SECONDS = int(os.environ.get('TTS_LOCK_STALE_SECONDS') or 600)  # 锁文件超过此时间未刷新视为持有者已崩溃
     # --- 结束 TTS 配置 ---
 
     # --- 修改：预生成课程音频配置 ---
@@ -63,8 +94,16 @@ class Config:
     # 音频文件的命名模板 (保持不变或根据实际情况调整)
     PREGENERATED_AUDIO_FILENAME_TEMPLATE = os.environ.get(
         'PREGENERATED_AUDIO_FILENAME_TEMPLATE') or 'lesson_{lesson_number}.{ext}'
-    # 尝试查找的音频文件扩展名列表 (确认你的文件都是 .wav)
-    PREGENERATED_AUDIO_EXTENSIONS = ['.wav']  # 如果确定只有 wav，就只留这个
+    # --- 压缩音频变体 (后台用 ffmpeg 从 wav 转码，写在 wav 旁边) ---
+    # 按优先级排序；可选 .opus (Ogg Opus) 与 .mp3，设为空字符串则不转码
+    AUDIO_VARIANT_EXTENSIONS = [ext.strip() for ext in (os.environ.get('AUDIO_VARIANT_EXTENSIONS') or '.opus,.mp3').split(',') if ext.strip()]
+    AUDIO_TRANSCODE_ENABLED = os.environ.get('AUDIO_TRANSCODE_ENABLED', 'true').lower() == 'true'
+    AUDIO_TRANSCODE_WORKERS = int(os.environ.get('AUDIO_TRANSCODE_WORKERS') or 1)  # 后台转码线程数
+    AUDIO_TRANSCODE_TIMEOUT = int(os.environ.get('AUDIO_TRANSCODE_TIMEOUT') or 300)  # 秒，单个文件转码上限
+    FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY') or 'ffmpeg'
+    print(f"Audio variants: {AUDIO_VARIANT_EXTENSIONS or '(none)'}, transcoding enabled: {AUDIO_TRANSCODE_ENABLED}")
+    # 尝试查找的音频文件扩展名列表：原始 wav + 压缩变体
+    PREGENERATED_AUDIO_EXTENSIONS = ['.wav'] + AUDIO_VARIANT_EXTENSIONS
     # ----------------------------------
     # --- 新增：用户录音保存文件夹 ---
     # 放在 instance 文件夹下比较合适，因为它属于运行时生成的数据，且不应提交到 Git
@@ -73,6 +112,74 @@ class Config:
     USER_RECORDINGS_BASE_FOLDER = os.environ.get('USER_RECORDINGS_BASE_FOLDER') or os.path.join(basedir, 'instance', 'user_recordings')
     # 打印确认路径
     print(f"Configured USER_RECORDINGS_BASE_FOLDER: {USER_RECORDINGS_BASE_FOLDER}")
+    # --- 音频文件发送 (app/media_serving.py) ---
+    # 带版本号 (?v=) 的预生成音频的缓存时长；其余音频用 ETag 重新验证
+    MEDIA_IMMUTABLE_MAX_AGE = int(os.environ.get('MEDIA_IMMUTABLE_MAX_AGE') or 365 * 24 * 3600)
+    # 把文件传输交给前端代理: 'x-sendfile' (Apache/lighttpd) 或 'x-accel-redirect' (nginx)；留空由 Flask 自己发送
+    MEDIA_SENDFILE_MODE = os.environ.get('MEDIA_SENDFILE_MODE') or None
+    # x-accel-redirect 的路径映射，格式 "文件系统前缀=内部location前缀;..."，例如 "/srv/autoenglish/instance=/_protected"
+    MEDIA_ACCEL_REDIRECT_MAP = [tuple(item.split('=', 1)) for item in (os.environ.get('MEDIA_ACCEL_REDIRECT_MAP') or '').split(';') if '=' in item]
+    print(f"Media sendfile mode: {MEDIA_SENDFILE_MODE or '(served by Flask)'}")
+    # 媒体索引 (预生成音频 + 用户录音) 的后台重扫间隔，用于发现其他 worker 进程写入的文件
+    MEDIA_INDEX_REFRESH_SECONDS = int(os.environ.get('MEDIA_INDEX_REFRESH_SECONDS') or 300)
+
+    # --- Whisper 语音识别配置 ---
+    WHISPER_MODEL_SIZE = os.environ.get('WHISPER_MODEL_SIZE') or 'small'
+    # 是否在 create_app 时预加载 Whisper；默认关闭，首次评分时懒加载 (flask db upgrade 等命令可秒级启动)
+    WHISPER_PRELOAD = os.environ.get('WHISPER_PRELOAD', 'false').lower() in ['true', 'on', '1']
+    print(f"Whisper model: {WHISPER_MODEL_SIZE}, preload at startup: {WHISPER_PRELOAD}")
+
+    # --- 跟读评分异步任务配置 ---
+    # 评分 (Whisper 转写) 在后台线程池中执行，请求线程只负责入队并返回 job id
+    SCORING_JOB_WORKERS = int(os.environ.get('SCORING_JOB_WORKERS') or 1)  # 同时执行的评分任务数
+    SCORING_JOB_QUEUE_MAX = int(os.environ.get('SCORING_JOB_QUEUE_MAX') or 16)  # 排队+执行中的任务上限，超出返回 503
+    SCORING_JOB_TIMEOUT = int(os.environ.get('SCORING_JOB_TIMEOUT') or 600)  # 秒，超过此时间仍未完成的任务视为失败
+    print(f"Scoring job workers: {SCORING_JOB_WORKERS}, queue max: {SCORING_JOB_QUEUE_MAX}")
+
+    # --- 转写结果缓存 ---
+    # 以音频内容哈希 + 模型 + 解码参数为键缓存 Whisper 结果，重复评分同一录音时跳过推理
+    TRANSCRIPTION_CACHE_ENABLED = os.environ.get('TRANSCRIPTION_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    TRANSCRIPTION_CACHE_DIR = 'transcription_cache'  # 相对于 instance 文件夹
+    TRANSCRIPTION_CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPTION_CACHE_MAX_BYTES') or 50 * 1024 * 1024)  # 超出后按 LRU 淘汰
+
+    # --- 可选：共享模型服务 (sidecar) ---
+    # 设置后由 `flask model-server` 启动的单个进程持有 Whisper/TTS 模型，各 Web worker 通过 Unix socket 调用
+    MODEL_SERVER_SOCKET = os.environ.get('MODEL_SERVER_SOCKET') or None  # 例如 /run/autoenglish/models.sock
+    MODEL_SERVER_AUTHKEY = os.environ.get('MODEL_SERVER_AUTHKEY') or None  # 默认复用 SECRET_KEY
+    MODEL_SERVER_TIMEOUT = int(os.environ.get('MODEL_SERVER_TIMEOUT') or 300)  # 秒，单次请求等待上限
+    print(f"Model server socket: {MODEL_SERVER_SOCKET or '(disabled, models load in-process)'}")
+
+    # --- 词汇索引 ---
+    # 其他进程修改词汇后，本进程最多延迟这么多秒发现并重建内存词汇索引
+    VOCAB_INDEX_CHECK_SECONDS = float(os.environ.get('VOCAB_INDEX_CHECK_SECONDS') or 2)
+
+    # --- 静态词汇包 ---
+    # 每课一个带内容哈希文件名的 JSON 词汇包 + manifest.json，浏览器本地组卷 (相对路径相对于 instance 目录)
+    VOCAB_PACK_DIR = os.environ.get('VOCAB_PACK_DIR') or 'vocab_packs'
+    # 本地组卷的测验提交时最多接受的题目数
+    QUIZ_LOCAL_MAX_QUESTIONS = int(os.environ.get('QUIZ_LOCAL_MAX_QUESTIONS') or 100)
+
+    # --- 离线测验同步 (/api/sync) ---
+    # 单次同步最多接受的测验数，以及可接受的最早作答时间 (天)
+    SYNC_MAX_BATCH_SIZE = int(os.environ.get('SYNC_MAX_BATCH_SIZE') or 50)
+    SYNC_MAX_AGE_DAYS = int(os.environ.get('SYNC_MAX_AGE_DAYS') or 30)
+
+    # --- 测验会话 ---
+    # /api/quiz 生成的题目与正确答案保存在服务端，提交时按 quiz_id 评分 (相对路径相对于 instance 目录)
+    QUIZ_SESSION_DIR = os.environ.get('QUIZ_SESSION_DIR') or 'quiz_sessions'
+    # 测验会话有效期 (秒)，超时未提交的测验需要重新开始
+    QUIZ_SESSION_TTL = int(os.environ.get('QUIZ_SESSION_TTL') or 2 * 3600)
+    # 提交测验时按此比例抽样记录逐题的 DEBUG 日志 (0 关闭；需要日志级别为 DEBUG 才会输出)
+    QUIZ_DEBUG_LOG_SAMPLE_RATE = float(os.environ.get('QUIZ_DEBUG_LOG_SAMPLE_RATE') or 0.01)
+    # 中译英测验 (作答为英文) 是否接受编辑距离为 1 的拼写 (漏/多/错一个字母)；默认关闭，拼写必须完全正确
+    ANSWER_FUZZY_ENGLISH = os.environ.get('ANSWER_FUZZY_ENGLISH', 'false').lower() in ['true', 'on', '1']
+    # /api/quiz 未指定 bias 参数时的默认值 (0-1)：已登录用户按错题次数、最近答错时间与收藏加权抽题，0 为均匀抽样
+    QUIZ_DEFAULT_BIAS = float(os.environ.get('QUIZ_DEFAULT_BIAS') or 0)
+
+    # --- 错题复习 (间隔重复) ---
+    # /api/review 默认每次返回的到期项目数，以及单次请求 (取题/提交评分) 的上限
+    REVIEW_BATCH_SIZE = int(os.environ.get('REVIEW_BATCH_SIZE') or 20)
+    REVIEW_MAX_BATCH_SIZE = int(os.environ.get('REVIEW_MAX_BATCH_SIZE') or 100)
 
     # --- PDF 路径配置 ---
     # NCE 课程 PDF 文件的路径，从环境变量读取，提供默认路径
@@ -0,0 +1,45 @@
+"""Unique (user_id, vocabulary_id) on wrong_answer for upserts
+
+Revision ID: b7d4e19c3a52
+Revises: a3c91f7e2b10
+Create Date: 2026-10-17 23:48:05.512730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d4e19c3a52'
+down_revision = 'a3c91f7e2b10'
+branch_labels = None
+depends_on = None
+
+
+def _merge_duplicate_wrong_answers(bind):
+    """旧代码没有唯一约束，可能存在同一用户同一词汇的多条错题：合并到 id 最小的那条。"""
+    duplicates = bind.execute(sa.text(
+        "SELECT user_id, vocabulary_id, MIN(id), SUM(COALESCE(incorrect_count, 1)), "
+        "MIN(timestamp_first_wrong), MAX(timestamp_last_wrong), MAX(CASE WHEN is_marked THEN 1 ELSE 0 END) "
+        "FROM wrong_answer GROUP BY user_id, vocabulary_id HAVING COUNT(*) > 1"
+    )).fetchall()
+    for user_id, vocabulary_id, keep_id, total, first_wrong, last_wrong, marked in duplicates:
+        bind.execute(sa.text(
+            "UPDATE wrong_answer SET incorrect_count = :total, timestamp_first_wrong = :first_wrong, "
+            "timestamp_last_wrong = :last_wrong, is_marked = :marked WHERE id = :keep_id"
+        ), {'total': total, 'first_wrong': first_wrong, 'last_wrong': last_wrong,
+            'marked': bool(marked), 'keep_id': keep_id})
+        bind.execute(sa.text(
+            "DELETE FROM wrong_answer WHERE user_id = :user_id AND vocabulary_id = :vocabulary_id AND id <> :keep_id"
+        ), {'user_id': user_id, 'vocabulary_id': vocabulary_id, 'keep_id': keep_id})
+
+
+def upgrade():
+    _merge_duplicate_wrong_answers(op.get_bind())
+    with op.batch_alter_table('wrong_answer', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_user_vocab_wrong_answer', ['user_id', 'vocabulary_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('wrong_answer', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_vocab_wrong_answer', type_='unique')
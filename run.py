@@ -1,10 +1,13 @@
 # run.py
+import os
+import time
 import click
 from flask.cli import with_appcontext
 from app import create_app, db
 from app.models import User, Lesson # 导入 Lesson
-from app.tts_utils import generate_and_save_audio_if_not_exists, get_audio_filename
-import concurrent.futures # (并行处理保持注释，优先串行)
+from app.tts_utils import generate_and_save_audio_if_not_exists, get_audio_filename, is_lesson_audio_stale
+from app.tts_batch import run_parallel, threads_per_worker # --workers N 时的进程池并行合成
+from app.audio_transcode import schedule_transcode, transcode_file, transcoding_available, wait_for_transcodes
 
 # Create the Flask app instance using the factory
 # It will load configuration based on config.py and environment variables
@@ -86,14 +89,16 @@ def audio():
 @click.option('--lesson', '-l', type=int, default=None, help='Generate audio for a specific lesson number.')
 @click.option('--force', '-f', is_flag=True, default=False, help='Force regeneration even if audio file exists.')
 @click.option('--lang', default='en', help='Language code for TTS (e.g., en).')
+@click.option('--workers', '-w', type=int, default=1, show_default=True, help='Number of parallel TTS worker processes.')
+@click.option('--dry-run', is_flag=True, default=False, help='Only list lessons whose audio is missing or out of date with the text, generate nothing.')
 @with_appcontext
-def generate_audio_command(lesson, force, lang):
+def generate_audio_command(lesson, force, lang, workers, dry_run):
     """Generates TTS audio for specified or all lessons using configured model."""
     click.echo("Starting TTS audio generation...")
     click.echo(f"Using Model: {app.config.get('TTS_MODEL')}")
     if app.config.get('TTS_VOCODER_MODEL'): # Only show if Vocoder is configured
         click.echo(f"Using Vocoder: {app.config.get('TTS_VOCODER_MODEL')}")
-    click.echo(f"Language: {lang}, Force Regeneration: {force}")
+    click.echo(f"Language: {lang}, Force Regeneration: {force}, Workers: {workers}")
 
     lessons_to_process = []
     if lesson is not None:
@@ -108,47 +113,175 @@ def generate_audio_command(lesson, force, lang):
 
     if not lessons_to_process: click.echo("No lessons to process."); return
 
+    # --- 1. 找出需要生成的课程 (无音频文件或 --force) ---
     total_lessons = len(lessons_to_process)
-    processed_count = 0; success_count = 0; error_count = 0; skipped_no_text = 0
-
-    click.echo("Processing lessons sequentially...")
+    stale_jobs = []  # [(lesson_number, text), ...]
+    skipped_no_text = 0; up_to_date = 0
     for lesson_obj in lessons_to_process:
-        processed_count += 1
-        click.echo(f"[{processed_count}/{total_lessons}] Processing Lesson {lesson_obj.lesson_number}...")
-
         text_to_use = None
         if lang == 'en' and hasattr(lesson_obj, 'text_en'): text_to_use = lesson_obj.text_en
         elif lang == 'zh-cn' and hasattr(lesson_obj, 'text_cn'): text_to_use = lesson_obj.text_cn
         # Add more languages if needed
 
         if not text_to_use or not text_to_use.strip():
-            click.echo(f"  Skipping: No text found for language '{lang}'.")
+            click.echo(f"  Lesson {lesson_obj.lesson_number}: Skipping, no text found for language '{lang}'.")
             skipped_no_text += 1
             continue
 
-        # --- generate_and_save_audio_if_not_exists 现在内部处理 force ---
-        result_path = generate_and_save_audio_if_not_exists(
-            lesson_number=lesson_obj.lesson_number,
-            text=text_to_use,
-            language=lang, # 传递 language, 函数内部会判断是否使用
-            force=force    # 传递 force 标志
-        )
+        if not force and not is_lesson_audio_stale(lesson_obj.lesson_number, text_to_use, lang):
+            up_to_date += 1
+            continue
+        stale_jobs.append((lesson_obj.lesson_number, text_to_use))
+
+    click.echo(f"{len(stale_jobs)} lesson(s) need audio, {up_to_date} already up to date.")
+    if dry_run:
+        for lesson_number, text in stale_jobs:
+            click.echo(f"  [stale] Lesson {lesson_number} ({len(text)} chars) -> {get_audio_filename(lesson_number)}")
+        click.echo("Dry run: nothing generated.")
+        return
+
+    # --- 2. 生成 (串行或进程池并行)，实时输出进度 ---
+    success_count = 0; error_count = 0; done_count = 0
+    started_at = time.time()
 
+    def report(lesson_number, result_path, elapsed, error):
+        nonlocal success_count, error_count, done_count
+        done_count += 1
+        wall = time.time() - started_at
+        eta = wall / done_count * (len(stale_jobs) - done_count)
+        prefix = f"[{done_count}/{len(stale_jobs)}] Lesson {lesson_number}"
         if result_path:
-             # 函数内部会打印是跳过还是生成，这里只记录成功与否
-             click.echo(f"  => OK (Path: {result_path})")
-             success_count += 1
+            success_count += 1
+            schedule_transcode(result_path) # 压缩变体在后台线程中转码，不阻塞后续合成
+            click.echo(f"{prefix} => OK in {elapsed:.1f}s (Path: {result_path}) | ok={success_count} err={error_count} ETA {eta:.0f}s")
         else:
-            click.echo(f"  => Error: Failed.", err=True)
             error_count += 1
+            click.echo(f"{prefix} => Error: {error or 'Failed.'} | ok={success_count} err={error_count} ETA {eta:.0f}s", err=True)
+
+    if workers > 1 and len(stale_jobs) > 1:
+        workers = min(workers, len(stale_jobs))
+        click.echo(f"Processing lessons with {workers} worker processes ({threads_per_worker(workers)} torch thread(s) each)...")
+        run_parallel(stale_jobs, workers, lang, force, report)
+    else:
+        click.echo("Processing lessons sequentially...")
+        for lesson_number, text_to_use in stale_jobs:
+            lesson_started = time.time()
+            # --- generate_and_save_audio_if_not_exists 现在内部处理 force ---
+            try:
+                result_path = generate_and_save_audio_if_not_exists(
+                    lesson_number=lesson_number,
+                    text=text_to_use,
+                    language=lang, # 传递 language, 函数内部会判断是否使用
+                    force=force    # 传递 force 标志
+                )
+                report(lesson_number, result_path, time.time() - lesson_started, None)
+            except Exception as e:
+                report(lesson_number, None, time.time() - lesson_started, str(e))
+
+    if success_count and transcoding_available():
+        click.echo("Waiting for background transcodes (Opus/MP3) to finish...")
+        wait_for_transcodes()
 
     click.echo("\n--- Generation Summary ---")
     click.echo(f"Total Lessons Targetted: {total_lessons}")
-    click.echo(f"Success/Exists: {success_count}")
+    click.echo(f"Generated: {success_count}")
+    click.echo(f"Already Up To Date: {up_to_date}")
     click.echo(f"Skipped (No Text): {skipped_no_text}")
     click.echo(f"Errors Encountered: {error_count}")
+    click.echo(f"Wall Time: {time.time() - started_at:.1f}s")
     click.echo("--------------------------")
 
 
+@audio.command('transcode')
+@click.option('--lesson', '-l', type=int, default=None, help='Transcode a specific lesson number only.')
+@click.option('--force', '-f', is_flag=True, default=False, help='Re-encode even if up-to-date variants exist.')
+@with_appcontext
+def transcode_audio_command(lesson, force):
+    """Writes compressed variants (AUDIO_VARIANT_EXTENSIONS) next to existing lesson wav files."""
+    if not transcoding_available():
+        click.echo("Error: transcoding is disabled, no variants are configured or ffmpeg was not found.", err=True)
+        return
+    lesson_numbers = [lesson] if lesson is not None else [l.lesson_number for l in Lesson.query.order_by(Lesson.lesson_number).all()]
+    produced = 0; missing = 0
+    for lesson_number in lesson_numbers:
+        wav_path = get_audio_filename(lesson_number)
+        if not wav_path or not os.path.exists(wav_path):
+            missing += 1
+            continue
+        new_files = transcode_file(wav_path, force=force)
+        produced += len(new_files)
+        if new_files:
+            click.echo(f"  Lesson {lesson_number}: {', '.join(os.path.basename(p) for p in new_files)}")
+    click.echo(f"Done. {produced} variant file(s) written, {missing} lesson(s) without wav skipped.")
+
+
+@app.cli.group()
+def vocab():
+    """Vocabulary related commands."""
+    pass
+
+@vocab.command('reindex')
+@with_appcontext
+def vocab_reindex_command():
+    """Invalidates the in-memory vocabulary index in all running processes (after editing the table outside the ORM) and rebuilds the distractor index and vocabulary packs."""
+    from app.vocab_index import invalidate_vocab_index, get_vocab_index
+    from app.distractor_index import build_distractor_index, save_distractor_index
+    invalidate_vocab_index()
+    index = get_vocab_index()
+    click.echo(f"Vocabulary index rebuilt: {len(index)} words in {len(index.lessons)} lessons. Web workers will reload it shortly.")
+    distractors = build_distractor_index(index)
+    save_distractor_index(distractors)
+    click.echo(f"Distractor index rebuilt for {len(distractors)} words.")
+    from app.vocab_packs import build_vocab_packs
+    manifest = build_vocab_packs()
+    click.echo(f"Vocabulary packs rebuilt for {len(manifest['lessons'])} lessons (version {manifest['version']}).")
+
+
+@vocab.command('build-packs')
+@with_appcontext
+def vocab_build_packs_command():
+    """Writes the per-lesson static vocabulary packs and their manifest (served under /vocab-packs/)."""
+    from app.vocab_packs import build_vocab_packs, vocab_pack_dir
+    manifest = build_vocab_packs()
+    click.echo(f"Wrote {len(manifest['lessons'])} lesson pack(s), version {manifest['version']}, to {vocab_pack_dir()}.")
+
+
+@app.cli.group()
+def stats():
+    """Pre-aggregated user statistics commands."""
+    pass
+
+@stats.command('rebuild')
+@click.option('--user', 'username', default=None, help='Rebuild statistics for a single user only.')
+@with_appcontext
+def stats_rebuild_command(username):
+    """Recomputes user_stats / user_lesson_stats from quiz attempts and pronunciation scores."""
+    from app.user_stats import rebuild_user_stats
+    user_id = None
+    if username:
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            click.echo(f"Error: User '{username}' not found.", err=True)
+            return
+        user_id = user.id
+    started_at = time.time()
+    user_count, lesson_count = rebuild_user_stats(user_id=user_id)
+    click.echo(f"Rebuilt statistics for {user_count} user(s), {lesson_count} user/lesson row(s) "
+               f"in {time.time() - started_at:.2f}s.")
+
+@app.cli.command('model-server')
+@click.option('--socket', 'socket_path', default=None, help='Unix socket path (defaults to MODEL_SERVER_SOCKET).')
+@click.option('--preload-tts', is_flag=True, default=False, help='Load the TTS engine at startup instead of on first request.')
+@with_appcontext
+def model_server_command(socket_path, preload_tts):
+    """Runs the shared Whisper/TTS model server on a Unix socket."""
+    from app.model_server import serve
+    socket_path = socket_path or app.config.get('MODEL_SERVER_SOCKET')
+    if not socket_path:
+        click.echo("Error: no socket path given and MODEL_SERVER_SOCKET is not set.", err=True)
+        return
+    click.echo(f"Starting model server on {socket_path} (Whisper: {app.config.get('WHISPER_MODEL_SIZE', 'small')}, TTS: {app.config.get('TTS_MODEL')})")
+    serve(socket_path, preload_tts=preload_tts)
+
 if __name__ == '__main__':
     app.run(debug=app.config.get('DEBUG', True)) # Read debug from config or default to True
\ No newline at end of file
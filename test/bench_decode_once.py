@@ -0,0 +1,97 @@
+# test/bench_decode_once.py
+# 对比 "每阶段各自解码" 与 "解码一次、共享数组" 两种评分流水线的耗时。
+# 用法 (项目根目录): python test/bench_decode_once.py [--repeat 5] [--with-model]
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import librosa
+import whisper
+from flask import Flask
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app import scoring_utils  # noqa: E402
+
+AUDIO_FILE = os.path.join(os.path.dirname(__file__), 'data', 'lesson_13.wav')
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_legacy(audio_path, text, with_model):
+    """旧流水线：Whisper、语速、流畅度各自解码一次文件 (共 3 次)。"""
+    timings = {}
+    if with_model:
+        _, timings['transcribe'] = timed(scoring_utils.transcribe_audio, audio_path)
+    else:
+        # 不跑模型时，只计 Whisper 内部的 ffmpeg 解码部分
+        _, timings['transcribe'] = timed(whisper.load_audio, audio_path)
+
+    def legacy_speech_rate():
+        y, sr = librosa.load(audio_path, sr=scoring_utils.SAMPLE_RATE)
+        duration = librosa.get_duration(y=y, sr=sr)
+        return len(text.split()) / duration if duration > 0 else 0
+    _, timings['speech_rate'] = timed(legacy_speech_rate)
+
+    def legacy_fluency():
+        y, _ = librosa.load(audio_path, sr=scoring_utils.SAMPLE_RATE)
+        return scoring_utils.calculate_fluency_score(y)
+    _, timings['fluency'] = timed(legacy_fluency)
+    return timings
+
+
+def run_shared(audio_path, text, with_model):
+    """新流水线：load_audio 解码一次，各阶段共享数组。"""
+    timings = {}
+    audio, timings['decode'] = timed(scoring_utils.load_audio, audio_path)
+    if with_model:
+        _, timings['transcribe'] = timed(scoring_utils.transcribe_audio, audio)
+    else:
+        timings['transcribe'] = 0.0
+    _, timings['speech_rate'] = timed(scoring_utils.calculate_speech_rate_wps, audio, text)
+    _, timings['fluency'] = timed(scoring_utils.calculate_fluency_score, audio)
+    return timings
+
+
+def summarize(runs):
+    keys = runs[0].keys()
+    return {k: statistics.median(r[k] for r in runs) for k in keys}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode-once scoring pipeline benchmark')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--with-model', action='store_true', help='同时计入 Whisper 推理时间 (需要加载模型)')
+    parser.add_argument('--model', default='small')
+    parser.add_argument('--audio', default=AUDIO_FILE)
+    args = parser.parse_args()
+
+    bench_app = Flask(__name__)
+    with bench_app.app_context():
+        if args.with_model:
+            scoring_utils.load_whisper_model(args.model)
+        # 预热 (ffmpeg / numba 首次调用开销不计入)
+        scoring_utils.calculate_fluency_score(scoring_utils.load_audio(args.audio))
+
+        text = "they will be arriving here tomorrow"
+        legacy = summarize([run_legacy(args.audio, text, args.with_model) for _ in range(args.repeat)])
+        shared = summarize([run_shared(args.audio, text, args.with_model) for _ in range(args.repeat)])
+
+    print(f"Audio: {args.audio}  (median of {args.repeat} runs, seconds)")
+    print(f"{'stage':<14}{'legacy':>10}{'shared':>10}{'saved':>10}")
+    for stage in ('decode', 'transcribe', 'speech_rate', 'fluency'):
+        old = legacy.get(stage, 0.0)
+        new = shared.get(stage, 0.0)
+        print(f"{stage:<14}{old:>10.4f}{new:>10.4f}{old - new:>10.4f}")
+    total_old = sum(legacy.values())
+    total_new = sum(shared.values())
+    print(f"{'total':<14}{total_old:>10.4f}{total_new:>10.4f}{total_old - total_new:>10.4f}")
+
+
+if __name__ == '__main__':
+    main()
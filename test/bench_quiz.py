@@ -0,0 +1,88 @@
+# test/bench_quiz.py
+# 测量 /api/quiz 在 1 / 10 / 96 课范围内的延迟：当前实现 (内存词汇索引) 对比旧实现 (查询全部 ORM 对象再 random.sample)。
+# 使用临时 SQLite 数据库、临时 instance 目录和合成词汇，不影响开发数据库，也不在项目 instance/ 下留下文件。
+# 用法 (项目根目录): python test/bench_quiz.py [--words-per-lesson 30] [--count 10] [--repeat 200]
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+_tmp_dir = tempfile.mkdtemp(prefix='bench_quiz_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+# 这两个目录在导入 config 时即确定为 <项目>/instance/...，须在导入前指向临时目录
+os.environ['USER_RECORDINGS_BASE_FOLDER'] = os.path.join(_tmp_dir, 'user_recordings')
+os.environ['PREGENERATED_AUDIO_FOLDER'] = os.path.join(_tmp_dir, 'tts_cache')
+
+from app import create_app, db  # noqa: E402
+from app.models import User, Vocabulary  # noqa: E402
+
+LESSON_SCOPES = (1, 10, 96)
+
+
+def seed(words_per_lesson):
+    for lesson_number in range(1, 97):
+        db.session.add_all(Vocabulary(lesson_number=lesson_number, english_word=f"word{lesson_number}_{i}",
+                                      part_of_speech='n.', chinese_translation=f"释义{lesson_number}-{i}", source_book=2)
+                           for i in range(words_per_lesson))
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.commit()
+
+
+def legacy_quiz(lesson_numbers, count):
+    """旧实现：加载所选课程全部词汇为 ORM 对象后抽样。"""
+    all_vocab = Vocabulary.query.filter(Vocabulary.lesson_number.in_(lesson_numbers)).all()
+    selected = random.sample(all_vocab, min(count, len(all_vocab)))
+    result = [{"id": v.id, "question": v.chinese_translation, "correct_answer": v.english_word} for v in selected]
+    db.session.remove()
+    return result
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='/api/quiz latency benchmark')
+    parser.add_argument('--words-per-lesson', type=int, default=30)
+    parser.add_argument('--count', type=int, default=10, help='每次测验的题目数')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app(instance_path=_tmp_dir)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        seed(args.words_per_lesson)
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+    client.get('/api/quiz?lessons=1&count=1') # 预热：首次请求构建索引
+
+    print(f"{args.words_per_lesson} words/lesson, {args.count} questions, {args.repeat} runs (median / p95, ms)")
+    print(f"{'lessons':>8} | {'/api/quiz (index)':>20} | {'legacy ORM query':>20}")
+    for scope in LESSON_SCOPES:
+        lessons = list(range(1, scope + 1))
+        url = f"/api/quiz?lessons={','.join(map(str, lessons))}&count={args.count}"
+        endpoint = measure(lambda: client.get(url), args.repeat)
+        with app.app_context():
+            legacy = measure(lambda: legacy_quiz(lessons, args.count), args.repeat)
+        print(f"{scope:>8} | {endpoint[0]:>9.2f} / {endpoint[1]:>8.2f} | {legacy[0]:>9.2f} / {legacy[1]:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
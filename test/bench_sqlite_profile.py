@@ -0,0 +1,142 @@
+# test/bench_sqlite_profile.py
+# SQLite 引擎配置 (app/db_engine.py) 前后对比：多个 worker 进程同时发出混合流量
+#   - 写：GET /api/quiz 出题 + POST /api/submit_quiz 提交 (QuizAttempt + 错题 upsert + 复习计划 upsert)
+#   - 读：GET /history (分页查询测验记录并渲染页面)
+# 分别在 SQLITE_TUNING=false (SQLite 默认：DELETE 日志、synchronous=FULL) 与默认配置 (WAL 等) 下运行，
+# 每种配置使用一个新的数据库文件 (WAL 模式会持久保存在文件中)。
+# 输出每秒完成的请求数、读/写延迟 (median / p95) 与失败数 ("database is locked" 等)。
+# 需要支持 fork 的平台 (Linux / macOS)。数据库默认放在系统临时目录；若其为 tmpfs (fsync 几乎无开销)，
+# 用 --dir 指定磁盘上的目录可以看到 synchronous 设置的真实影响。
+# 用法 (项目根目录): python test/bench_sqlite_profile.py [--workers 8] [--seconds 5] [--write-ratio 0.3] [--dir PATH]
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+import statistics
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+os.environ.setdefault('SECRET_KEY', 'bench')
+
+from config import Config  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User, Vocabulary, QuizAttempt  # noqa: E402
+
+LESSONS = list(range(1, 11))
+
+
+def make_config(db_path, session_dir, tuned):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        QUIZ_SESSION_DIR = session_dir
+        SQLITE_TUNING = tuned
+        WTF_CSRF_ENABLED = False
+        QUIZ_DEBUG_LOG_SAMPLE_RATE = 0.0
+    return BenchConfig
+
+
+def seed(workers, words_per_lesson, history_rows):
+    db.session.add_all(Vocabulary(lesson_number=n, english_word=f"word{n}_{i}", part_of_speech='n.',
+                                  chinese_translation=f"释义{n}-{i}", source_book=2)
+                       for n in LESSONS for i in range(words_per_lesson))
+    users = []
+    for n in range(workers):
+        user = User(username=f"student{n}", email=f"student{n}@example.com")
+        user.set_password('x')
+        users.append(user)
+    db.session.add_all(users)
+    db.session.commit()
+    # 每个用户已有一些历史记录，/history 的查询不是空表
+    db.session.execute(db.insert(QuizAttempt), [
+        {'user_id': user.id, 'lessons_attempted': '1', 'score': i % 10, 'total_questions': 10, 'quiz_type': 'cn_to_en'}
+        for user in users for i in range(history_rows)])
+    db.session.commit()
+
+
+def _worker(app, worker_number, seconds, write_ratio, barrier, results):
+    with app.app_context():
+        db.engine.dispose(close=False) # 不复用父进程的连接
+    rng = random.Random(worker_number)
+    client = app.test_client()
+    client.post('/login', data={'username': f"student{worker_number}", 'password': 'x'})
+    lessons = ','.join(map(str, LESSONS))
+    reads, writes, errors = [], [], 0
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        if rng.random() < write_ratio:
+            quiz = client.get(f'/api/quiz?lessons={lessons}&count=10').get_json() or {}
+            answers = {str(q['id']): rng.choice(['', 'wrong', q['question']]) for q in quiz.get('questions', [])}
+            response = client.post('/api/submit_quiz', json={'answers': answers, 'quiz_context': {
+                'quiz_id': quiz.get('quiz_id'), 'lesson_ids': LESSONS, 'quiz_type': 'cn_to_en'}})
+            (writes if response.status_code == 200 else []).append((time.perf_counter() - started) * 1000)
+        else:
+            response = client.get('/history')
+            (reads if response.status_code == 200 else []).append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            errors += 1
+    results.put((reads, writes, errors))
+
+
+def run_phase(name, tuned, args, base_dir):
+    phase_dir = tempfile.mkdtemp(prefix=f'{name}_', dir=base_dir)
+    app = create_app(make_config(os.path.join(phase_dir, 'bench.db'), os.path.join(phase_dir, 'sessions'), tuned))
+    with app.app_context():
+        db.create_all()
+        seed(args.workers, args.words_per_lesson, args.history_rows)
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+        db.session.remove()
+        db.engine.dispose()
+
+    ctx = multiprocessing.get_context('fork')
+    barrier = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_worker, args=(app, n, args.seconds, args.write_ratio, barrier, results))
+               for n in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    collected = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    reads = sorted(ms for r, _, _ in collected for ms in r)
+    writes = sorted(ms for _, w, _ in collected for ms in w)
+    errors = sum(e for _, _, e in collected)
+
+    def stats(samples):
+        if not samples:
+            return '-'
+        return f"{statistics.median(samples):7.1f} / {samples[max(0, int(len(samples) * 0.95) - 1)]:7.1f}"
+
+    throughput = (len(reads) + len(writes)) / args.seconds
+    print(f"{name:>8} ({journal_mode:>6}) | {throughput:8.1f} | {len(reads):6d} {stats(reads):>17} | "
+          f"{len(writes):6d} {stats(writes):>17} | {errors:6d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mixed read/write benchmark: SQLite defaults vs. engine profile')
+    parser.add_argument('--workers', type=int, default=8, help='并发 worker 进程数 (每个进程一个用户)')
+    parser.add_argument('--seconds', type=float, default=5.0, help='每种配置的运行时间')
+    parser.add_argument('--write-ratio', type=float, default=0.3, help='写请求 (出题 + 提交) 所占比例')
+    parser.add_argument('--words-per-lesson', type=int, default=30)
+    parser.add_argument('--history-rows', type=int, default=200, help='每个用户预置的测验记录数')
+    parser.add_argument('--dir', default=None, help='数据库所在目录 (默认系统临时目录)')
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp(prefix='bench_sqlite_profile_', dir=args.dir)
+    print(f"{args.workers} workers, {args.seconds:.0f}s per profile, write ratio {args.write_ratio:.0%}, databases in {base_dir}")
+    print(f"{'profile':>17} | {'req/s':>8} | {'reads':>6} {'median / p95 ms':>17} | {'writes':>6} {'median / p95 ms':>17} | {'errors':>6}")
+    # routes 在首次导入时注册到当时的 app 上，每种配置在单独的进程中创建 app
+    ctx = multiprocessing.get_context('fork')
+    for name, tuned in (('default', False), ('tuned', True)):
+        phase = ctx.Process(target=run_phase, args=(name, tuned, args, base_dir))
+        phase.start()
+        phase.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# test/bench_startup.py
+# 测量 Web 进程启动开销：import app + create_app 的耗时、峰值 RSS，以及是否误导入了重量级 ML 库。
+# 每次测量都在全新的子进程中进行，避免模块缓存影响结果。
+# 用法 (项目根目录): python test/bench_startup.py [--repeat 5] [--preload]
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+CHILD_SCRIPT = r'''
+import json, resource, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+application = app.create_app()
+t2 = time.perf_counter()
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss_kb //= 1024  # macOS 返回字节
+heavy = [m for m in ('torch', 'whisper', 'librosa', 'TTS', 'TTS.api') if m in sys.modules]
+print('BENCH_RESULT ' + json.dumps({
+    'import_s': t1 - t0,
+    'create_app_s': t2 - t1,
+    'max_rss_mb': rss_kb / 1024.0,
+    'heavy_modules': heavy,
+}))
+'''
+
+
+def run_once(preload):
+    env = dict(os.environ)
+    env['WHISPER_PRELOAD'] = 'true' if preload else 'false'
+    proc = subprocess.run([sys.executable, '-c', CHILD_SCRIPT], cwd=PROJECT_ROOT, env=env,
+                          capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith('BENCH_RESULT '):
+            return json.loads(line[len('BENCH_RESULT '):])
+    raise RuntimeError(f"Child process failed (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Web process startup time / RSS benchmark')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--preload', action='store_true', help='同时测量 WHISPER_PRELOAD=true 的启动开销作为对照')
+    args = parser.parse_args()
+
+    modes = [False, True] if args.preload else [False]
+    for preload in modes:
+        runs = [run_once(preload) for _ in range(args.repeat)]
+        label = 'WHISPER_PRELOAD=true' if preload else 'lazy (default)'
+        print(f"--- {label}: median of {args.repeat} runs ---")
+        print(f"  import app   : {statistics.median(r['import_s'] for r in runs):.3f} s")
+        print(f"  create_app() : {statistics.median(r['create_app_s'] for r in runs):.3f} s")
+        print(f"  total        : {statistics.median(r['import_s'] + r['create_app_s'] for r in runs):.3f} s")
+        print(f"  max RSS      : {statistics.median(r['max_rss_mb'] for r in runs):.1f} MB")
+        print(f"  heavy modules imported: {runs[-1]['heavy_modules'] or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# test/bench_submit_quiz.py
+# 模拟一个班级同时提交测验：N 个用户并发写入 QuizAttempt + WrongAnswer，
+# 对比旧写法 (先查已有错题，再逐条 ORM 修改/新增) 与当前的 WrongAnswer.record_wrong_answers (一条 ON CONFLICT 语句)。
+# 统计每个事务的 SQLite 写锁持有时间 (第一条写语句 -> COMMIT 完成) 以及提交总耗时。
+# 使用临时 SQLite 数据库，不影响开发数据库。
+# 需要支持 fork 的平台 (Linux / macOS)。
+# 用法 (项目根目录): python test/bench_submit_quiz.py [--users 40] [--wrong 15] [--rounds 5]
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import multiprocessing
+import statistics
+from datetime import datetime
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+_tmp_dir = tempfile.mkdtemp(prefix='bench_submit_quiz_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import User, Vocabulary, QuizAttempt, WrongAnswer  # noqa: E402
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+_timer = threading.local() # 每次提交一个事务：记录第一条写语句完成的时间
+
+
+def install_lock_timer(engine):
+    """SQLite 在第一条写语句执行成功时已持有写锁 (之前的等待不计入)，直到 COMMIT 才释放。"""
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _first_write(conn, cursor, statement, parameters, context, executemany):
+        if getattr(_timer, 'write_started', None) is None and statement.lstrip().upper().startswith(WRITE_PREFIXES):
+            _timer.write_started = time.perf_counter()
+
+
+def seed(users, words):
+    vocab = [Vocabulary(lesson_number=1 + i // 30, english_word=f"word{i}", part_of_speech='n.',
+                        chinese_translation=f"释义{i}", source_book=2) for i in range(words)]
+    db.session.add_all(vocab)
+    user_objs = []
+    for n in range(users):
+        user = User(username=f"student{n}", email=f"student{n}@example.com")
+        user.set_password('x')
+        user_objs.append(user)
+    db.session.add_all(user_objs)
+    db.session.commit()
+    return [u.id for u in user_objs], [v.id for v in vocab]
+
+
+def legacy_write(user_id, wrong_ids):
+    """旧写法：attempt 入会话后查询已有错题 (autoflush 先写入 attempt，已持有写锁)，再逐条修改/新增。"""
+    db.session.add(QuizAttempt(user_id=user_id, lessons_attempted="1", score=0,
+                               total_questions=len(wrong_ids), quiz_type='cn_to_en'))
+    now = datetime.utcnow()
+    existing = {w.vocabulary_id: w for w in WrongAnswer.query.filter(
+        WrongAnswer.user_id == user_id, WrongAnswer.vocabulary_id.in_(wrong_ids)).all()}
+    for vocab_id in wrong_ids:
+        if vocab_id in existing:
+            wrong = existing[vocab_id]
+            wrong.timestamp_last_wrong = now
+            wrong.incorrect_count = (wrong.incorrect_count or 0) + 1
+            db.session.add(wrong)
+        else:
+            db.session.add(WrongAnswer(user_id=user_id, vocabulary_id=vocab_id, timestamp_last_wrong=now, incorrect_count=1))
+
+
+def upsert_write(user_id, wrong_ids):
+    db.session.add(QuizAttempt(user_id=user_id, lessons_attempted="1", score=0,
+                               total_questions=len(wrong_ids), quiz_type='cn_to_en'))
+    WrongAnswer.record_wrong_answers(user_id, wrong_ids)
+
+
+def _submit_worker(app, writer, user_id, wrong_ids, barrier, results):
+    with app.app_context():
+        db.engine.dispose(close=False) # 不复用父进程的连接
+        barrier.wait()
+        started = time.perf_counter()
+        _timer.write_started = None
+        writer(user_id, wrong_ids)
+        db.session.commit()
+        finished = time.perf_counter()
+        write_started = _timer.write_started or finished
+        db.session.remove()
+    results.put(((finished - write_started) * 1000, (finished - started) * 1000))
+
+
+def run_round(app, writer, user_ids, vocab_ids, wrong_per_user):
+    """每个用户一个进程 (与多 worker 部署相同，不受 GIL 干扰)，同时开始提交，返回每次提交的 (锁持有时间 ms, 总耗时 ms)。"""
+    ctx = multiprocessing.get_context('fork')
+    barrier = ctx.Barrier(len(user_ids))
+    results = ctx.Queue()
+    workers = []
+    for user_id in user_ids:
+        wrong_ids = random.Random(user_id + len(workers)).sample(vocab_ids, wrong_per_user)
+        workers.append(ctx.Process(target=_submit_worker, args=(app, writer, user_id, wrong_ids, barrier, results)))
+    for worker in workers:
+        worker.start()
+    samples = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return samples
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.99) - 1)], sum(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent submit_quiz write benchmark')
+    parser.add_argument('--users', type=int, default=40, help='同时提交的用户数')
+    parser.add_argument('--words', type=int, default=300, help='词汇总数')
+    parser.add_argument('--wrong', type=int, default=15, help='每次提交答错的词数')
+    parser.add_argument('--rounds', type=int, default=5, help='每种写法的提交轮数 (后几轮多为更新已有错题)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user_ids, vocab_ids = seed(args.users, args.words)
+        install_lock_timer(db.engine)
+
+    print(f"{args.users} concurrent users, {args.wrong} wrong answers each, {args.rounds} rounds")
+    print(f"{'writer':>8} | {'lock hold median / p99 / total (ms)':>36} | {'submit median / p99 (ms)':>26}")
+    for name, writer in (('legacy', legacy_write), ('upsert', upsert_write)):
+        with app.app_context():
+            WrongAnswer.query.delete()
+            QuizAttempt.query.delete()
+            db.session.commit()
+        hold, latency = [], []
+        for _ in range(args.rounds):
+            for hold_ms, total_ms in run_round(app, writer, user_ids, vocab_ids, args.wrong):
+                hold.append(hold_ms)
+                latency.append(total_ms)
+        h, l = summarize(hold), summarize(latency)
+        print(f"{name:>8} | {h[0]:>9.2f} / {h[1]:>8.2f} / {h[2]:>10.1f} | {l[0]:>11.2f} / {l[1]:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
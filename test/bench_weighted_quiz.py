@@ -0,0 +1,116 @@
+# test/bench_weighted_quiz.py
+# 偏向薄弱词的加权抽题：
+#   1. 全书 (96 课) 范围内 /api/quiz 的延迟，bias=0 (均匀) 对比 bias=1 (一条聚合查询 + 别名表)；
+#   2. 用固定 seed 检查抽样分布：k=1 时每个词被抽中的概率应为 权重 / 总权重，
+#      比较 "薄弱词组" 与若干单个词的经验频率和理论值，并确认相同 seed 结果相同。
+# 使用临时 SQLite 数据库，不影响开发数据库。
+# 用法 (项目根目录): python test/bench_weighted_quiz.py [--weak 300] [--favorites 50] [--trials 20000]
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+_tmp_dir = tempfile.mkdtemp(prefix='bench_weighted_quiz_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+
+from app import create_app, db  # noqa: E402
+from app.models import User, Vocabulary, WrongAnswer, UserFavoriteVocabulary  # noqa: E402
+from app.vocab_index import get_vocab_index  # noqa: E402
+from app.weighted_sampling import weak_word_weights  # noqa: E402
+
+LESSONS = list(range(1, 97))
+
+
+def seed_data(words_per_lesson, weak, favorites):
+    rng = random.Random(0)
+    for lesson_number in LESSONS:
+        db.session.add_all(Vocabulary(lesson_number=lesson_number, english_word=f"word{lesson_number}_{i}",
+                                      part_of_speech='n.', chinese_translation=f"释义{lesson_number}-{i}", source_book=2)
+                           for i in range(words_per_lesson))
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.commit()
+    vocab_ids = [v.id for v in Vocabulary.query.with_entities(Vocabulary.id)]
+    now = datetime.utcnow()
+    for vocab_id in rng.sample(vocab_ids, weak):
+        db.session.add(WrongAnswer(user_id=user.id, vocabulary_id=vocab_id, incorrect_count=rng.randint(1, 6),
+                                   timestamp_last_wrong=now - timedelta(days=rng.uniform(0, 60))))
+    for vocab_id in rng.sample(vocab_ids, favorites):
+        db.session.add(UserFavoriteVocabulary(user_id=user.id, vocabulary_id=vocab_id))
+    db.session.commit()
+    return user.id
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Weighted quiz sampling benchmark and distribution check')
+    parser.add_argument('--words-per-lesson', type=int, default=30)
+    parser.add_argument('--weak', type=int, default=300, help='有错题记录的词数')
+    parser.add_argument('--favorites', type=int, default=50)
+    parser.add_argument('--count', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--trials', type=int, default=20000, help='分布检查的抽样次数')
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        user_id = seed_data(args.words_per_lesson, args.weak, args.favorites)
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+    lessons_param = ','.join(map(str, LESSONS))
+    client.get(f'/api/quiz?lessons=1&count=1') # 预热索引
+
+    print(f"--- /api/quiz latency, whole book ({len(LESSONS)} lessons), {args.count} questions (median / p95, ms) ---")
+    for bias in (0, 1):
+        url = f'/api/quiz?lessons={lessons_param}&count={args.count}&bias={bias}'
+        median, p95 = measure(lambda: client.get(url), args.repeat)
+        print(f"bias={bias}: {median:.2f} / {p95:.2f}")
+
+    with app.app_context():
+        index = get_vocab_index()
+        weights = weak_word_weights(user_id, 1.0)
+        total_words = index.count(LESSONS)
+        total_mass = sum(weights.values()) + (total_words - len(weights))
+        print(f"--- Distribution check: {len(weights)} weighted words of {total_words}, {args.trials} draws with k=1 ---")
+        counts = {}
+        for trial in range(args.trials):
+            entry = index.weighted_sample(LESSONS, 1, weights, rng=random.Random(trial))[0]
+            counts[entry.id] = counts.get(entry.id, 0) + 1
+        expected_weak = sum(weights.values()) / total_mass
+        observed_weak = sum(counts.get(vocab_id, 0) for vocab_id in weights) / args.trials
+        print(f"weak-word share: expected {expected_weak:.4f}, observed {observed_weak:.4f}")
+        for vocab_id in sorted(weights, key=weights.get, reverse=True)[:3]:
+            print(f"vocab {vocab_id} (weight {weights[vocab_id]:.2f}): expected {weights[vocab_id] / total_mass:.5f}, "
+                  f"observed {counts.get(vocab_id, 0) / args.trials:.5f}")
+        first = [e.id for e in index.weighted_sample(LESSONS, args.count, weights, rng=random.Random(42))]
+        again = [e.id for e in index.weighted_sample(LESSONS, args.count, weights, rng=random.Random(42))]
+        print(f"same seed, same result: {first == again}; distinct items: {len(set(first)) == len(first)}")
+
+    a = client.get(f'/api/quiz?lessons={lessons_param}&count={args.count}&bias=1&seed=7').get_json()
+    b = client.get(f'/api/quiz?lessons={lessons_param}&count={args.count}&bias=1&seed=7').get_json()
+    print(f"/api/quiz seed=7 repeatable: {[q['id'] for q in a['questions']] == [q['id'] for q in b['questions']]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# test/check_query_budget.py
+# 页面/接口的 SQL 查询数预算检查 (app/query_stats.py 的 assert_query_budget)。
+# 在临时 SQLite 数据库中准备两个用户：一个只有几条记录，一个有几百条错题/收藏/测验记录，
+# 依次请求各路由并断言查询数不超过预算；两个用户的查询数还必须相同，否则说明查询数随数据量增长 (N+1)。
+# 超出预算时打印全部 SQL 语句，以非零状态退出，可放进 CI。数据库与 instance 目录均为临时目录，不在项目中留下文件。
+# 用法 (项目根目录): python test/check_query_budget.py [--rows 300]
+import os
+import sys
+import argparse
+import tempfile
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+_tmp_dir = tempfile.mkdtemp(prefix='check_query_budget_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp_dir, 'budget.db')
+os.environ.setdefault('SECRET_KEY', 'budget')
+os.environ.setdefault('ROOT_ADMIN_USERNAME', 'root')
+# 这两个目录在导入 config 时即确定为 <项目>/instance/...，须在导入前指向临时目录
+os.environ['USER_RECORDINGS_BASE_FOLDER'] = os.path.join(_tmp_dir, 'user_recordings')
+os.environ['PREGENERATED_AUDIO_FOLDER'] = os.path.join(_tmp_dir, 'tts_cache')
+
+from app import create_app, db  # noqa: E402
+from app.models import (User, Vocabulary, Lesson, QuizAttempt, WrongAnswer,  # noqa: E402
+                        UserFavoriteVocabulary, ReviewSchedule)
+from app.query_stats import assert_query_budget  # noqa: E402
+from app.user_stats import rebuild_user_stats  # noqa: E402
+
+# (路径, 查询数上限)。登录用户的加载 (Flask-Login user_loader) 计为 1 条。
+BUDGETS = [
+    ('/', 2),
+    ('/lessons', 2),
+    ('/lesson/1', 3),                 # 用户 + 课文 + 跟读评分
+    ('/history', 4),                  # 用户 + 第一页记录 + user_stats + user_lesson_stats
+    ('/api/history', 2),
+    ('/wrong_answers', 3),            # 用户 + 错题 (joinedload 词汇) + 收藏 id 集合 (app/favorites.py，按用户缓存)
+    ('/api/wrong_answers', 3),
+    ('/favorites', 2),
+    ('/api/favorites', 2),
+    ('/api/favorites/status?ids=1,2,3', 2),
+    ('/api/review', 3),               # 用户 + 到期复习项 + 词汇
+]
+ADMIN_BUDGETS = [
+    ('/admin/users', 2),              # 根管理员 + 用户列表 (joinedload user_stats)
+]
+
+
+def seed(rows):
+    lessons = max(1, rows // 30 + 1)
+    db.session.add_all(Lesson(lesson_number=n, source_book=2, title_en=f"Lesson {n}", text_en="Text.")
+                       for n in range(1, lessons + 1))
+    db.session.add_all(Vocabulary(lesson_number=n, english_word=f"word{n}_{i}", part_of_speech='n.',
+                                  chinese_translation=f"释义{n}-{i}", source_book=2)
+                       for n in range(1, lessons + 1) for i in range(30))
+    users = {}
+    for name in ('small', 'large', 'root'):
+        user = User(username=name, email=f"{name}@example.com", is_admin=(name == 'root'))
+        user.set_password('x')
+        users[name] = user
+    db.session.add_all(users.values())
+    db.session.commit()
+
+    vocab_ids = [vocab_id for (vocab_id,) in db.session.query(Vocabulary.id).order_by(Vocabulary.id)]
+    for name, count in (('small', 3), ('large', rows)):
+        user_id = users[name].id
+        ids = vocab_ids[:count]
+        db.session.execute(db.insert(WrongAnswer), [
+            {'user_id': user_id, 'vocabulary_id': vocab_id, 'incorrect_count': 1, 'is_marked': False} for vocab_id in ids])
+        db.session.execute(db.insert(UserFavoriteVocabulary), [
+            {'user_id': user_id, 'vocabulary_id': vocab_id} for vocab_id in ids[::2]])
+        db.session.execute(db.insert(ReviewSchedule), [
+            {'user_id': user_id, 'vocabulary_id': vocab_id} for vocab_id in ids])
+        db.session.execute(db.insert(QuizAttempt), [
+            {'user_id': user_id, 'lessons_attempted': str(i % lessons + 1), 'score': i % 10, 'total_questions': 10,
+             'quiz_type': 'cn_to_en'} for i in range(count)])
+    db.session.commit()
+    rebuild_user_stats()
+
+
+def check(app, username, budgets):
+    """返回 {路径: 查询数}；超出预算的路由打印语句并记为 None。"""
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': 'x'})
+    counts = {}
+    for path, budget in budgets:
+        try:
+            response, stats = assert_query_budget(client, path, budget)
+        except AssertionError as e:
+            print(f"FAIL [{username}] {e}")
+            counts[path] = None
+            continue
+        if response.status_code != 200:
+            print(f"FAIL [{username}] GET {path} returned {response.status_code}")
+            counts[path] = None
+            continue
+        counts[path] = stats.count
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Assert per-route SQL query budgets')
+    parser.add_argument('--rows', type=int, default=300, help='"large" 用户的错题/收藏/测验记录数')
+    args = parser.parse_args()
+
+    app = create_app(instance_path=_tmp_dir)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        seed(args.rows)
+
+    small = check(app, 'small', BUDGETS)
+    large = check(app, 'large', BUDGETS)
+    admin = check(app, 'root', ADMIN_BUDGETS)
+
+    failures = 0
+    print(f"{'route':<34} {'budget':>6} {'small':>6} {'large':>6}")
+    for path, budget in BUDGETS + ADMIN_BUDGETS:
+        small_count = small.get(path, admin.get(path))
+        large_count = large.get(path, small_count)
+        status = 'ok'
+        if small_count is None or large_count is None:
+            status = 'FAILED'
+        elif small_count != large_count:
+            status = 'GROWS WITH ROWS (N+1?)'
+        failures += status != 'ok'
+        print(f"{path:<34} {budget:>6} {str(small_count):>6} {str(large_count):>6}  {status}")
+
+    if failures:
+        print(f"{failures} route(s) failed the query budget.")
+        sys.exit(1)
+    print("All routes within their query budgets.")
+
+
+if __name__ == '__main__':
+    main()